@@ -15,21 +15,26 @@
 
 # Basic workflow of the Assembler is as follows:
 #   * Command line interface checks provided program's ISA and passes code to the actual Assembler
-#   * Assembler loads instructions for the provided ISA from instructions.json and preprocesses the code
+#   * Assembler takes the instructions for the provided ISA from the ISA registry (modules/isa.py,
+#       built from instructions.json) and preprocesses the code
 #   * Translate instructions line by line:
 #       * Separate instruction itself from operands
-#       * Find correct encoding of that instruction, considering special case of 5-bit opcodes
-#       * Check if the operand provided is of the type needed, if yes, encode and add it to the current line
+#       * Tokenize the operands: figure out the shape of every operand (register, memory location, number, label...)
+#           with the patterns precompiled for the ISA, only once for the line
+#       * Find correct encoding of that instruction: the first one whose operand types accept the shapes
+#           of the operands and whose values fit, considering special case of 5-bit opcodes
 #           (more about work with instructions.json below)
 #   * Return a complete binary code of the program
 
 # Encoding operands with information from instructions.json:
-#   * Check if valid operands for that instruction were provided and if they are written correctly
-#   * Add "reg" or "fr" ("memreg" or "simdreg") operands names to the binary line (or register byte for CISC)
+#   * Check if valid operands for that instruction were provided: the shape of the operand has to be accepted
+#       by the operand type (see OPERAND_SHAPES), labels have to exist and be allowed for the instruction
+#   * Add "reg" ("memreg" or "simdreg") operands names to the binary line (or register byte for CISC)
 #   * Encode register (or memregs) with offset and add its encoded value to immediate_bytes
 #   * Encode immediate value:
 #       * Decode the label if it's mentioned, otherwise read the number from the assembly instruction
 #   * For CISC left adjust register byte and add it to the binary line with immediate bytes
+#   * If the value does not fit, the next encoding of the instruction is tried
 
 # Decoding directives:
 #   * Search for a correct pattern in the line
@@ -38,17 +43,44 @@
 
 # Resulting binary code is provided to the processor and executed
 
+# Assembled programs are remembered by the AssemblerCache, by the ISA and the hash of the source code,
+# so the same program (e.g. the example programs of the website) is only assembled once
+
 # TODO: There is more though, instructions.json is pretty inconsistent between different
 #  architectures as it was all done on the go, and is under-documented
 
 
 import os
 import re
-import json
+import hashlib
 import argparse
-from collections import defaultdict
+import threading
+from collections import namedtuple, OrderedDict
 
 from modules.functions import twos_complement
+from modules.isa import ISA_TABLES
+from modules.object_file import ObjectFile, ObjectFileError, DEFAULT_ENTRY_POINT
+
+# Shapes of the operands accepted by the types of the operands from instructions.json
+# reg - %reg, memreg - [%reg], regoff - %reg+$num, memregoff - [%reg+$num], memreglabel - [%reg+.label],
+# number - $num, label - .label, labelindex - .label+$num (the number is the index of the value of the label)
+OPERAND_SHAPES = {"reg": ("reg",), "memreg": ("memreg",), "simdreg": ("memreg",), "regoff": ("regoff",),
+                  "memregoff": ("memregoff", "memreglabel"), "imm": ("number", "label", "labelindex")}
+
+# Numbers are written the way Python reads them, labels are the same as in the label declarations
+NUMBER_PATTERN = r"[+-]?\d+(?:_\d+)*"
+LABEL_PATTERN = r"\w+"
+
+# Number of the different operands the grammar remembers the tokens of,
+# and of the different lines of the program the assembler remembers the encodings of
+TOKENS_CACHE_SIZE = 4096
+LINES_CACHE_SIZE = 4096
+
+# Number of the assembled programs the cache of the assembler keeps in memory
+ASSEMBLER_CACHE_SIZE = 256
+
+# Grammars of the instructions for every ISA, built by the first Assembler of the ISA
+grammars = dict()
 
 
 class AssemblerCLI:
@@ -66,6 +98,12 @@ class AssemblerCLI:
         parser.add_argument("--isa", help="specify the ISA architecture: RISC1 (Stack), "
                                           "RISC2 (Accumulator), RISC3 (Register), CISC (Register)")
         parser.add_argument("-o", "--output", help="Specify the output file")
+        parser.add_argument("--format", choices=["text", "object"], default="text",
+                            help="Specify the format of the output: text of the binary code (default), "
+                                 "or the object file")
+        parser.add_argument("--strip", action="store_true", help="Leave the symbols out of the object file")
+        parser.add_argument("--cache", help="Specify the directory of the assembled programs, so that the same "
+                                            "program is not assembled twice (the program is read into memory then)")
 
         # Parsing the command line arguments
         args = parser.parse_args()
@@ -79,12 +117,6 @@ class AssemblerCLI:
         if not args.isa or args.isa.lower() not in valid_isa:
             raise AssemblerError("Specify the valid instruction set architecture")
 
-        # Read the program text
-        with open(args.file, "r") as file:
-            program_text = file.read()
-
-        binary_program = Assembler(args.isa.lower(), program_text).binary_code
-
         # If there was an output path provided, save the binary code there
         if args.output:
             output_path = args.output
@@ -92,11 +124,31 @@ class AssemblerCLI:
         # If there was no output path provided, save the binary code in the
         # same folder as the assembly program with a different file extension
         else:
+            extension = ".o" if args.format == "object" else ".bin"
             output_path = os.path.join(os.path.dirname(args.file),
-                                       os.path.splitext(os.path.basename(args.file))[0] + ".bin")
+                                       os.path.splitext(os.path.basename(args.file))[0] + extension)
 
-        with open(output_path, "w") as file:
-            file.write(binary_program)
+        # The program is read and written line by line, so it does not matter how big it is
+        if not args.cache:
+            Assembler(args.isa.lower()).assemble_file(args.file, output_path, object_file=(args.format == "object"),
+                                                      strip=args.strip)
+            return
+
+        # The whole program is needed to find it in the cache
+        with open(args.file, "r") as file:
+            program = AssemblerCache(directory=args.cache).assemble(args.isa.lower(), file.read())
+        temporary_path = output_path + ".part"
+        try:
+            if args.format == "object":
+                with open(temporary_path, "wb") as output_file:
+                    output_file.write((program.strip() if args.strip else program).to_bytes())
+            else:
+                with open(temporary_path, "w") as output_file:
+                    output_file.write(program.text())
+            os.replace(temporary_path, output_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
 
 
 class Assembler:
@@ -105,112 +157,187 @@ class Assembler:
     an input, and translates to binary code
     """
 
-    def __init__(self, isa, program_text):
+    def __init__(self, isa, program_text=None):
         """
         Initializes the assembler, outputs the binary code file
         The actual encoded binary text is in self.binary_code
+        If there is no program text, the program can be assembled from a file or any other lines later,
+        with assemble_file or assemble_lines
         """
         self.isa = isa
 
-        # Open the list of instructions for this architecture and reformat it for our purposes
-        # DefaultDict allows to have several values for the same key all pushed into type specified - we use list
-        # This is useful since we might have the same assembly instruction encoded differently depending on the operands
-        with open(os.path.join("modules", "instructions.json"), "r") as file:
-            self.instructions = defaultdict(list)
-            for opcode, details in json.load(file)[isa].items():
-                self.instructions[details[0]].append([opcode, details[-1]])
+        # The encodings of the instructions for this architecture, by the assembly instruction
+        # We might have the same assembly instruction encoded differently depending on the operands
+        isa_tables = ISA_TABLES[isa]
+        self.instructions = isa_tables.mnemonics
+
+        # The encodings of the registers for this architecture, by their names
+        self.register_names = isa_tables.register_codes
 
-        # Open the list of registers for this architecture and format it properly
-        with open(os.path.join("modules", "registers.json"), "r") as file:
-            registers = json.load(file)[isa]
-            self.register_names = {register[0]: register[2] for register in registers}
+        # Patterns of the operands and the encodings accepting them, they are the same for every program
+        if (grammar := grammars.get(isa)) is None:
+            grammar = grammars[isa] = Grammar(self.instructions, self.register_names)
+        self.grammar = grammar
 
         # Determining the size of the instructions to read
-        instruction_sizes = {"risc1": (6, 6), "risc2": (8, 8), "risc3": (16, 6), "cisc": (8, 8)}
-        self.instruction_size = instruction_sizes[isa]
-        self.jump_label_allowed = ["jmp", "call", "je", "jne", "jl", "jle", "jg", "jge", "jc"]
-        self.mov_label_allowed = ["mov", "load", "store", "push", "mov_low", "mov_high", "cmp", "cmpe", "cmpb", "mul",
-                                  "div"]
+        self.instruction_size = isa_tables.instruction_size[:2]
+        self.jump_label_allowed = frozenset(["jmp", "call", "je", "jne", "jl", "jle", "jg", "jge", "jc"])
+        self.mov_label_allowed = frozenset(["mov", "load", "store", "push", "mov_low", "mov_high", "cmp", "cmpe",
+                                            "cmpb", "mul", "div"])
 
-        self.binary_code = self.translate(program_text)
+        # Immediate constant length is undefined for Risc-Register architecture, and thus is set for every instruction
+        # RISC-Stack has to divide the number into two 6-bit bytes
+        # RISC-Accumulator and CISC have to divide the number into two 8-bit bytes
+        self.immediate_length = {"risc1": 12, "risc2": 16, "risc3": None, "cisc": 16}[isa]
+
+        self.binary_code = None if program_text is None else self.translate(program_text)
 
     def translate(self, text):
         """
         Translates the assembly code into binary code
         :param text: str - assembly code
         """
-        # TODO: Possible consideration of assembly using regex pattern matching,
-        #  we are basically doing almost that already
-        #  This would eliminate the need to check the validity of the operands separately,
-        #  as they are going to be a part of the pattern. Can be precompiled and is super fast too
-        #  We basically won't need registers dict for decoding part of the assembly,
-        #  but still will need that for the actual translation and decoding processes
-        binary_code = ""
+        lines = text.split("\n")
+        return "".join(self.assemble_lines(lambda: lines))
 
-        # Preprocess the text, delete the comments and empty lines, remember labels and directives
-        text = self.preprocess(text)
+    def assemble_lines(self, read_lines):
+        """
+        Translates the assembly code into binary code in two passes over its lines, so that the program
+        never has to be in memory all at once: the first pass remembers the labels and directives,
+        the second one encodes the instructions
 
-        # Divide the program into lines
-        for index, line in enumerate(text):
-            line = line.rstrip(" ")
-            # Check if its an empty line or a comment line, skip if yes
-            if line.strip(" ").startswith("#") or line.isspace() or not line:
-                continue
-            self.line = line
-
-            # Split instruction name and operands
-            binary_line = ""
-            arguments = line.split()
-            assembly_instruction, operands = arguments[0], ''.join(arguments[1:]).split(',')
-            if len(operands) == 1 and operands[0] == '':
-                operands = []
-
-            # Check if the instruction actually exists for this architecture
-            if assembly_instruction not in self.instructions:
-                raise AssemblerError(f"Not valid assembly instruction: {assembly_instruction}")
-
-            # Get the list of encodings for this assembly instruction
-            instructions_info = self.instructions[assembly_instruction]
-
-            # If this assembly instruction has a few different opcodes depending on the type of operands
-            # we check every possible option until we find the one we needed
-            for instruction_info in instructions_info:
-                try:
-
-                    # Low and High byte moves have 5-bit opcodes, a special case
-                    if assembly_instruction in ["mov_low", "mov_high"] and len(instruction_info[0]) != 5:
-                        instruction_info[0] = instruction_info[0][:-1]
-
-                    binary_line = self.__encode_operands(operands, instruction_info, assembly_instruction, index)
-                    break
-                except AssemblerError:
-                    continue
+        :param read_lines: function() -> iterable of str - gives the lines of the assembly code from the start,
+            every time it is called (once for each pass)
+        :return: generator of str - lines of the binary code, each ending with a newline
+        """
+        # Remembering all instances and values of labels of two types
+        self.jump_labels = dict()
+        self.mov_labels = dict()
+        for _ in self.__instruction_lines(read_lines(), remember_labels=True):
+            pass
+
+        # Lines of the program already encoded, the same line is encoded the same way unless it mentions a label
+        # (jumps to the label depend on where the instruction is)
+        encoded_lines = dict()
 
-            # If all of the opcode options were wrong, raise the error
-            if not binary_line:
-                raise AssemblerError(f"Provide valid operands for this instruction: {line}")
+        for index, line in enumerate(self.__instruction_lines(read_lines(), remember_labels=False)):
+            if (binary_line := encoded_lines.get(line)) is None:
+                binary_line = self.__translate_line(line, index) + "\n"
+                if "." not in line and len(encoded_lines) < LINES_CACHE_SIZE:
+                    encoded_lines[line] = binary_line
+            yield binary_line
 
-            binary_code += binary_line + "\n"
+    def assemble_file(self, input_path, output_path, object_file=False, strip=False):
+        """
+        Translates the assembly program from the file into the binary code file, line by line
+        The binary code file is only replaced if the whole program was translated
 
-        return binary_code
+        :param input_path: str - path to the assembly program
+        :param output_path: str - path to the binary code file
+        :param object_file: bool - whether to write the object file instead of the text of the binary code
+        :param strip: bool - whether to leave the symbols out of the object file
+        """
+        def read_lines():
+            with open(input_path, "r") as input_file:
+                for line in input_file:
+                    yield line.rstrip("\n")
+
+        temporary_path = output_path + ".part"
+        try:
+            if object_file:
+                program = self.object_file(self.assemble_lines(read_lines), symbols=not strip)
+                with open(temporary_path, "wb") as output_file:
+                    output_file.write(program.to_bytes())
+            else:
+                with open(temporary_path, "w") as output_file:
+                    output_file.writelines(self.assemble_lines(read_lines))
+            os.replace(temporary_path, output_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def object_file(self, binary_lines=None, entry_point=DEFAULT_ENTRY_POINT, symbols=True):
+        """
+        Puts the assembled program into the object file
+        :param binary_lines: iterable of str - lines of the binary code (like the ones from assemble_lines),
+            the program translated when creating the assembler is taken if None
+        :param entry_point: int - address the program is meant to start at
+        :param symbols: bool - whether to put the jump labels into the object file
+        :return: ObjectFile
+        """
+        if binary_lines is None:
+            binary_lines = self.binary_code.split("\n")
+
+        # The labels are only known after the lines are translated
+        binary_lines = list(binary_lines)
+        return ObjectFile.from_lines(self.isa, binary_lines, self.mov_labels, self.jump_labels if symbols else None,
+                                     entry_point)
+
+    def __translate_line(self, line, index):
+        """
+        Translates one instruction of the assembly code
+        :param line: str - the instruction, without a comment
+        :param index: int - index of the instruction in the program
+        :return: str - the binary code of the instruction
+        """
+        # Split instruction name and operands
+        binary_line = None
+        arguments = line.split()
+        assembly_instruction, operands = arguments[0], ''.join(arguments[1:]).split(',')
+        if len(operands) == 1 and operands[0] == '':
+            operands = []
+
+        # Check if the instruction actually exists for this architecture
+        if assembly_instruction not in self.instructions:
+            raise AssemblerError(f"Not valid assembly instruction: {assembly_instruction}")
+
+        # Get the list of encodings for this assembly instruction, which accept operands of such shapes
+        tokens = [self.grammar.tokenize(operand) for operand in operands]
+        instructions_info = self.grammar.encodings(assembly_instruction, tuple(token.shape for token in tokens))
+
+        # If this assembly instruction has a few different opcodes depending on the type of operands
+        # we take the first option whose values fit
+        # Low and High byte moves have 5-bit opcodes, a special case, which the ISA registry takes care of
+        for instruction_info in instructions_info:
+            if (binary_line := self.__encode_operands(tokens, instruction_info, assembly_instruction,
+                                                      index)) is not None:
+                break
+
+        # If all of the opcode options were wrong, raise the error
+        if binary_line is None:
+            raise AssemblerError(f"Provide valid operands for this instruction: {line}")
+        return binary_line
 
     def preprocess(self, text):
         """
         Preprocesses the assembly code, finds any directives and collects the needed info on them
 
         :param text: str - the text of the assembly program
+        :return: list - lines of the program with the instructions
         """
-        result_text = []
-
         # Remembering all instances and values of labels of two types
         self.jump_labels = dict()
         self.mov_labels = dict()
+        return list(self.__instruction_lines(text.split("\n"), remember_labels=True))
+
+    def __instruction_lines(self, lines, remember_labels):
+        """
+        Goes through the lines of the assembly code, skipping the comments and empty lines,
+        and the labels and directives, collecting the needed info on them
 
-        for line in text.split("\n"):
+        :param lines: iterable of str - lines of the assembly program
+        :param remember_labels: bool - whether to remember the labels, or they were remembered on the previous pass
+        :return: generator of str - lines of the program with the instructions
+        """
+        instructions_number = 0
+
+        for line in lines:
             line = line.rstrip(" ")
 
             # Check if its an empty line or a comment line, skip it if yes
             if line.strip(" ").startswith("."):
+                if not remember_labels:
+                    continue
 
                 line = line.strip(" ")[1:]
 
@@ -222,7 +349,7 @@ class Assembler:
 
                 # If only the label is mentioned, it specifies a jump location and points to the next instruction
                 if len(words) == 1:
-                    self.jump_labels[line] = len(result_text)
+                    self.jump_labels[line] = instructions_number
 
                 # If the label is mentioned with directive specification and its value, we have to encode it into memory
                 elif len(words) == 3:
@@ -239,9 +366,8 @@ class Assembler:
                         "Provide a valid assembly directive: either just '.label' or '.label db|dw value")
 
             elif not (line.strip(" ").startswith("#") or line.isspace() or not line):
-                result_text.append(line)
-
-        return result_text
+                instructions_number += 1
+                yield line
 
     @staticmethod
     def __decode_directive(is_byte, value):
@@ -293,245 +419,99 @@ class Assembler:
 
         raise AssemblerError("Provide a valid assembly directive operand")
 
-    def __encode_operands(self, operands, instruction_info, instruction_name, instruction_index):
+    def __encode_operands(self, tokens, instruction_info, instruction_name, instruction_index):
         """
         Encodes the operands given an opcode and operands types
-        :param operands: list - list of operands-strings
-        :param instruction_info: list - of instruction encoding and operand types
+        :param tokens: list - of the operands, as the grammar has read them, of the shapes the operand types accept
+        :param instruction_info: tuple - of instruction encoding and operand types
         :param instruction_name: str - a name of the assembly instruction
         :param instruction_index: int - index of the current instruction
+        :return: str - the encoded instruction, or None if the values of the operands do not fit this encoding
         """
+        # Processor-only information is already eliminated from the type lists by the ISA registry
         binary_line = instruction_info[0]
         types = instruction_info[1]
 
-        # Eliminate processor-only information in type lists
-        if "one" in types:
-            types.remove("one")
-
-        instruction_length = self.instruction_size[0]
-        if self.isa == "cisc":
-            register_byte = ""
-            immediate_bytes = ""
-
-        if len(operands) != len(types):
-            raise AssemblerError(f"Provide valid operands for this instruction: {self.line}")
+        register_byte = ""
+        immediate_bytes = ""
 
-        # TODO: This probably could be moved to a separate function to allow for normal recursion calls
-
-        # Check if the operand provided is of the type needed, if yes, encode and add it to the current line
-        for index, operand in enumerate(operands):
-            if self.__valid_type(operand, op_type := types[index], instruction_name):
-
-                # Encode the operand properly and add it to the line
-                if op_type == "reg" or op_type == "fr":
-                    if self.isa == "cisc":
-                        register_byte += self.register_names[operand[1:]]
-                    else:
-                        binary_line += self.register_names[operand[1:]]
+        # Encode every operand and add it to the current line
+        for token, op_type in zip(tokens, types):
+            # Encode the register of the operand, if there is one
+            if token.register is not None:
+                if self.isa == "cisc":
+                    register_byte += token.register
+                else:
+                    binary_line += token.register
 
-                elif op_type == "regoff":
+            # Encode the offset of the register, it always takes 16 bits
+            if op_type in ["regoff", "memregoff"]:
+                if token.shape == "memreglabel":
+                    offset = self.__label_value(token, instruction_name)
+                else:
+                    offset = token.number
 
-                    operand = operand.replace(" ", "")
-                    if (index := operand.find("+")) != -1:
-                        operand_sign = "+"
-                    elif (index := operand.find("-")) != -1:
-                        operand_sign = "-"
+                # Check if the size of the number is valid
+                if offset is None or not (-1 * 2 ** 15 < offset < 2 ** 15):
+                    return None
 
-                    reg_op = operand[:index]
-                    offset_op = int(operand[index + 2:])
-                    register_byte += self.register_names[reg_op[1:]]
+                immediate_bytes += self.__encode_number(-offset if token.sign == "-" else offset, 16)
 
-                    # Check if the size of the number is valid
-                    if not (-1 * 2 ** 15 < offset_op < 2 ** 15):
-                        raise AssemblerError(f"Immediate constant provided too big: {self.line}")
+            # Encode the immediate constant, or the value of the label
+            elif op_type.startswith("imm"):
+                if token.shape == "number":
+                    num = token.number
+                else:
+                    num = self.__label_value(token, instruction_name, instruction_index)
 
-                    if operand_sign == "-":
-                        offset_op = -1 * offset_op
+                bit_len = self.immediate_length or int(op_type[3:])
 
-                    encoded_number = self.__encode_number(offset_op, 16)
-                    immediate_bytes += encoded_number
+                # Check if the size of the number is valid
+                if num is None or not (-1 * 2 ** (bit_len - 1) < num < 2 ** (bit_len - 1)):
+                    return None
 
-                elif op_type in ["memreg", "simdreg"]:
-                    if self.isa == "cisc":
-                        register_byte += self.register_names[operand[2:-1]]
-                    else:
-                        binary_line += self.register_names[operand[2:-1]]
-
-                elif op_type == "memregoff":
-
-                    operand = operand.replace(" ", "")
-                    num_start = operand.find("$")
-
-                    if (index := operand.find("+")) != -1:
-                        operand_sign = "+"
-                    elif (index := operand.find("-")) != -1:
-                        operand_sign = "-"
-
-                    reg_op = operand[1:index]
-                    try:
-                        offset_op = int(operand[index + 2:-1])
-                    except ValueError:
-                        label_check = operand[index + 2:-1]
-                        if label_check in self.mov_labels:
-                            value = self.mov_labels[label_check]
-                            if isinstance(value, int):
-                                if num_start != -1:
-                                    raise AssemblerError("Provide valid assembly directives")
-                                offset_op = value
-                            elif isinstance(value, list):
-                                if num_start == -1:
-                                    offset_op = value[0]
-                                else:
-                                    mov_index = int(operand[num_start + 1:])
-                                    if not (0 <= mov_index < len(value)):
-                                        raise AssemblerError("Provide a valid assembly directive offset")
-                                    num = value[mov_index]
-                        else:
-                            raise AssemblerError("Provide valid assembly directives")
-                    register_byte += self.register_names[reg_op[1:]]
-
-                    # Check if the size of the number is valid
-                    if not (-1 * 2 ** 15 < offset_op < 2 ** 15):
-                        raise AssemblerError(f"Immediate constant provided too big: {self.line}")
-
-                    if operand_sign == "-":
-                        offset_op = -1 * offset_op
-
-                    encoded_number = self.__encode_number(offset_op, 16)
+                encoded_number = self.__encode_number(num, bit_len)
+                if self.isa == "cisc":
                     immediate_bytes += encoded_number
-
-                elif op_type.startswith("imm"):
-                    operand = operand.replace(" ", "")
-                    num_start = operand.find("$")
-                    label_check = operand[1:] if num_start == -1 else operand[1:num_start - 1]
-
-                    # Decode the label if it's mentioned, otherwise read the number from the assembly instruction
-                    # There are two possible types of labels:
-                    # * one specifies the instruction to jump to, in that case we figure out the offset and encode it
-                    # * the other references a location in memory, and might also include offsets, we encode bytes or words
-                    if instruction_name in self.jump_label_allowed and operand.startswith(
-                            ".") and label_check in self.jump_labels:
-                        num = (self.jump_labels[label_check] - instruction_index)
-                    elif instruction_name in self.mov_label_allowed and operand.startswith(
-                            ".") and label_check in self.mov_labels:
-                        value = self.mov_labels[label_check]
-                        if isinstance(value, int):
-                            if num_start != -1:
-                                raise AssemblerError("Provide valid assembly directives")
-                            num = value
-                        elif isinstance(value, list):
-                            if num_start == -1:
-                                num = value[0]
-                            else:
-                                mov_index = int(operand[num_start + 1:])
-                                if not (0 <= mov_index < len(value)):
-                                    raise AssemblerError("Provide a valid assembly directive offset")
-                                num = value[mov_index]
-                    else:
-                        num = int(operand[1:])
-
-                    # RISC-Stack has to divide the number into two 6-bit bytes
-                    # RISC-Accumulator and CISC have to divide the number into two 8-bit bytes
-                    # Immediate constant length is undefined for Risc-Register architecture,
-                    # and thus is set for every instruction
-                    bit_lengths = {"risc1": "12", "risc2": "16", "risc3": op_type[3:], "cisc": "16"}
-                    bit_len = int(bit_lengths[self.isa])
-
-                    # Check if the size of the number is valid
-                    if not (-1 * 2 ** (bit_len - 1) < num < 2 ** (bit_len - 1)):
-                        raise AssemblerError(f"Immediate constant provided too big: {self.line}")
-
-                    encoded_number = self.__encode_number(num, bit_len)
-
-                    if self.isa == "cisc":
-                        immediate_bytes += encoded_number
-                    else:
-                        binary_line += encoded_number
-
-            else:
-                raise AssemblerError(f"Provide valid operands for this instruction: {self.line}")
+                else:
+                    binary_line += encoded_number
 
         if self.isa == "cisc":
             if register_byte:
                 register_byte = register_byte.ljust(8, '0')
             binary_line += register_byte + immediate_bytes
 
-        return binary_line.ljust(instruction_length, '0')
+        return binary_line.ljust(self.instruction_size[0], '0')
 
-    def __valid_type(self, assembly_op, op_type, instruction_name, recursive=False):
+    def __label_value(self, token, instruction_name, instruction_index=None):
         """
-        Checks if the operand provided in assembly code is of valid type for this instruction
-        :param assembly_op: str - assembly operand
-        :param op_type: str - keyword with operand type
+        Decodes the label mentioned in the operand
+        There are two possible types of labels:
+            * one specifies the instruction to jump to, in that case we figure out the offset to it
+            * the other references a location in memory, and might also include offsets, we take bytes or words
+
+        :param token: Operand - the operand with the label
         :param instruction_name: str - a name of the assembly instruction
-        :return: bool - whether the operand is validly encoded
-        """
-        # If the operand signifies a register, it should start
-        # with a '%' sign and the name should exist in this architecture
-        if op_type == "reg":
-            return ((assembly_op.startswith("%") and assembly_op[1:] in self.register_names) or
-                    (instruction_name in self.mov_label_allowed and assembly_op[1:] in self.mov_labels and recursive))
-
-        elif op_type == "regoff":
-            index_plus = assembly_op.find("+")
-            index_minus = assembly_op.find("-")
-            index_num = assembly_op.find("$")
-
-            if ((index_plus == -1 and index_minus == -1) or
-                    (index_plus != -1 and index_minus != -1 and (max(index_plus, index_minus) < index_num))):
-                return False
-
-            if -1 < index_minus < index_num:
-                index = index_minus
-            elif -1 < index_plus < index_num:
-                index = index_plus
-
-            reg_op = assembly_op[:index].rstrip(" ")
-            offset_op = assembly_op[index + 1:].lstrip(" ")
-            return ((self.__valid_type(reg_op, "reg", instruction_name)
-                     and self.__valid_type(offset_op, "imm", instruction_name)) or
-                    (recursive and self.__valid_type(reg_op, "reg", instruction_name, recursive=True)
-                     and self.__valid_type(offset_op, "imm", instruction_name)))
-
-        # If the operand is a memory location addressed by a register, it should look like [%reg]
-        elif op_type in ["memreg", "simdreg"]:
-            return (assembly_op.startswith("[") and assembly_op.endswith("]")
-                    and self.__valid_type(assembly_op[1:-1], "reg", instruction_name))
-
-        # If the operand provided is a memory location with an immediate constant offset - [%reg\s+\+\s+$off]
-        elif op_type == "memregoff":
-            index_plus = assembly_op.find("+")
-            index_minus = assembly_op.find("-")
-            index_num = max(assembly_op.find("$"), assembly_op.find("."))
-
-            if ((index_plus == -1 and index_minus == -1) or
-                    (index_plus != -1 and index_minus != -1 and (max(index_plus, index_minus) < index_num))):
-                return False
-
-            if -1 < index_minus < index_num:
-                index = index_minus
-            elif -1 < index_plus < index_num:
-                index = index_plus
-
-            memreg_op = assembly_op[1:index].rstrip(" ")
-            offset_op = assembly_op[index + 1:-1].lstrip(" ")
-            return (assembly_op.startswith("[") and assembly_op.endswith("]")
-                    and self.__valid_type(memreg_op, "reg", instruction_name) and
-                    self.__valid_type(offset_op, "imm", instruction_name))
-
-        # If the operand is an immediate constant, it should start with a '$' sign and contain numbers only
-        # Valid labels are also allowed, they should appear anywhere in the program and start with a '.'
-        # Labels are of two types: specifying the jump offset, or some value from the macro value in memory
-        elif op_type.startswith("imm"):
-            result = [assembly_op.startswith("$") and self.__is_number(assembly_op[1:])]
-            if instruction_name in self.jump_label_allowed:
-                result.append(assembly_op.startswith(".") and assembly_op[1:] in self.jump_labels)
-            if instruction_name in self.mov_label_allowed:
-                result.append(assembly_op.startswith(".") and
-                              (assembly_op[1:] in self.mov_labels or self.__valid_type(assembly_op, "regoff",
-                                                                                       instruction_name,
-                                                                                       recursive=True)))
-            return any(result)
+        :param instruction_index: int - index of the current instruction, None if it can not jump
+        :return: int - the value to encode, or None if the label can not be used here
+        """
+        label = token.label
+        if (instruction_index is not None and token.shape == "label" and instruction_name in self.jump_label_allowed
+                and label in self.jump_labels):
+            return self.jump_labels[label] - instruction_index
+
+        if instruction_name not in self.mov_label_allowed or label not in self.mov_labels:
+            return None
+
+        value = self.mov_labels[label]
+        if isinstance(value, int):
+            # Single numbers can not be indexed
+            return value if token.shape != "labelindex" else None
+        if token.shape != "labelindex":
+            return value[0]
+        if not (0 <= token.number < len(value)):
+            return None
+        return value[token.number]
 
     @staticmethod
     def __encode_number(number, length):
@@ -543,18 +523,221 @@ class Assembler:
         """
         return bin(twos_complement(number, length))[2:].rjust(length, '0')
 
-    @staticmethod
-    def __is_number(n):
+
+class Grammar:
+    """
+    Grammar of the assembly instructions of the architecture
+    Reads the operands, figuring out their shape and the values in them with the precompiled patterns,
+    and finds the encodings of the instructions accepting the operands of such shapes
+    """
+
+    def __init__(self, instructions, register_names):
+        """
+        Compiles the patterns of the operands
+        :param instructions: dict - encodings of the assembly instructions, by their names
+        :param register_names: dict - encodings of the registers of the architecture, by their names
+        """
+        self.instructions = instructions
+        self.register_names = register_names
+
+        # Operands already read, and the encodings found for the instructions by their names and shapes of the operands
+        self.tokens = dict()
+        self.encodings_cache = dict()
+
+        register = "|".join(sorted(map(re.escape, register_names), key=len, reverse=True))
+        offset = rf"(?P<sign>[+-])\$(?P<number>{NUMBER_PATTERN})"
+        label_offset = rf"(?P<sign>[+-])\.(?P<label>{LABEL_PATTERN})"
+
+        # Patterns by the first character of the operand, in the order they are checked in
+        self.patterns = {
+            "%": [("reg", re.compile(rf"%(?P<register>{register})")),
+                  ("regoff", re.compile(rf"%(?P<register>{register}){offset}"))],
+            "[": [("memreg", re.compile(rf"\[%(?P<register>{register})\]")),
+                  ("memregoff", re.compile(rf"\[%(?P<register>{register}){offset}\]")),
+                  ("memreglabel", re.compile(rf"\[%(?P<register>{register}){label_offset}\]"))],
+            "$": [("number", re.compile(rf"\$(?P<number>{NUMBER_PATTERN})"))],
+            ".": [("label", re.compile(rf"\.(?P<label>{LABEL_PATTERN})")),
+                  ("labelindex", re.compile(rf"\.(?P<label>{LABEL_PATTERN}){offset}"))]
+        }
+
+    def tokenize(self, operand):
+        """
+        Figures out the shape of the operand, and reads the register, number and label in it
+        :param operand: str - assembly operand, without any spaces
+        :return: Operand - with None as the shape if the operand is not written correctly
+        """
+        if (token := self.tokens.get(operand)) is not None:
+            return token
+
+        token = Operand(None, None, None, None, None)
+        for shape, pattern in self.patterns.get(operand[:1], ()):
+            if (match := pattern.fullmatch(operand)) is not None:
+                groups = match.groupdict()
+                register, number = groups.get("register"), groups.get("number")
+                token = Operand(shape, None if register is None else self.register_names[register],
+                                groups.get("sign"), None if number is None else int(number), groups.get("label"))
+                break
+
+        if len(self.tokens) < TOKENS_CACHE_SIZE:
+            self.tokens[operand] = token
+        return token
+
+    def encodings(self, instruction_name, shapes):
+        """
+        Finds the encodings of the instruction whose operand types accept the operands of the shapes provided
+        :param instruction_name: str - a name of the assembly instruction
+        :param shapes: tuple - shapes of the operands
+        :return: tuple - of (opcode, operand types), in the order they are in the instruction set
+        """
+        if (encodings := self.encodings_cache.get((instruction_name, shapes))) is None:
+            encodings = self.encodings_cache[(instruction_name, shapes)] = tuple(
+                (opcode, types) for opcode, types in self.instructions[instruction_name]
+                if len(types) == len(shapes) and all(
+                    shape in OPERAND_SHAPES.get("imm" if op_type.startswith("imm") else op_type, ())
+                    for shape, op_type in zip(shapes, types)))
+        return encodings
+
+
+class Operand(namedtuple("Operand", ["shape", "register", "sign", "number", "label"])):
+    """
+    Operand of the assembly instruction, as the grammar has read it
+    shape - one of the shapes from OPERAND_SHAPES (None if it is not valid), register - encoding of the register,
+    sign - '+' or '-' before the offset, number - the number written, label - name of the label mentioned
+    """
+    __slots__ = ()
+
+
+class AssemblerCache:
+    """
+    Cache of the assembled programs, by the ISA and the hash of the source code
+    The programs used least recently are forgotten first, when there are too many of them
+    If there is a directory for the cache, the programs are also saved there as object files,
+    so they are remembered by other processes and after the restart
+    """
+
+    def __init__(self, max_size=ASSEMBLER_CACHE_SIZE, directory=None):
+        """
+        Creates a new cache of the assembled programs
+        :param max_size: int - the number of the programs to keep in memory
+        :param directory: str - directory to save the object files of the programs to, or None to keep them in memory
+        :return: NoneType
+        """
+        if max_size <= 0:
+            raise ValueError("Assembler cache size should be positive")
+        self.max_size = max_size
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        # Programs by their keys, from the least to the most recently used
+        self.programs = OrderedDict()
+        self.hits = self.misses = 0
+
+        # The web server assembles the programs of the users in different threads
+        self.lock = threading.Lock()
+
+        # Hashes of the tables of the ISAs, so that the saved programs are not used if the instruction set changes
+        self.tables_hashes = dict()
+
+    def assemble(self, isa, program_text):
+        """
+        Gives the assembled program, assembling it only if it is not in the cache
+        Programs with errors are not remembered, the AssemblerError is raised every time
+        :param isa: str - name of the ISA
+        :param program_text: str - text of the assembly program
+        :return: ObjectFile - the assembled program, text of its binary code is program.text()
         """
-        Checks if the number string provided is valid
-        :param n: str
-        :return: bool
+        key = self.key(isa, program_text)
+        with self.lock:
+            program = self.programs.get(key)
+            if program is not None:
+                self.programs.move_to_end(key)
+                self.hits += 1
+                return program
+
+        program = self.__load(key)
+        if program is None:
+            program = Assembler(isa, program_text).object_file()
+            self.__save(key, program)
+
+        with self.lock:
+            self.misses += 1
+            self.programs[key] = program
+            self.programs.move_to_end(key)
+            while len(self.programs) > self.max_size:
+                self.programs.popitem(last=False)
+        return program
+
+    def key(self, isa, program_text):
         """
+        Hashes the program, ignoring what the assembler ignores too: empty and comment lines,
+        and spaces around the lines
+        :param isa: str - name of the ISA
+        :param program_text: str - text of the assembly program
+        :return: (str, str) - the ISA and the hash of the program
+        """
+        if (tables_hash := self.tables_hashes.get(isa)) is None:
+            tables = ISA_TABLES[isa]
+            tables_hash = self.tables_hashes[isa] = hashlib.sha256(
+                repr((tables.mnemonics, tables.register_codes)).encode("utf-8")).digest()
+
+        digest = hashlib.sha256(tables_hash)
+        for line in program_text.split("\n"):
+            line = line.strip(" ")
+            if line and not line.isspace() and not line.startswith("#"):
+                digest.update(line.encode("utf-8") + b"\n")
+        return isa, digest.hexdigest()
+
+    def __load(self, key):
+        """
+        Reads the program from the directory of the cache
+        :param key: (str, str) - the ISA and the hash of the program
+        :return: ObjectFile, or None if it was not saved (or can not be read)
+        """
+        if self.directory is None:
+            return None
         try:
-            int(n)
-            return True
-        except ValueError:
-            return False
+            with open(os.path.join(self.directory, "-".join(key) + ".o"), "rb") as file:
+                program = ObjectFile.from_bytes(file.read())
+        except (OSError, ObjectFileError):
+            return None
+        return program if program.isa == key[0] else None
+
+    def __save(self, key, program):
+        """
+        Saves the program into the directory of the cache, if there is one
+        :param key: (str, str) - the ISA and the hash of the program
+        :param program: ObjectFile - the assembled program
+        """
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, "-".join(key) + ".o")
+
+        # Other processes might be reading the same file, so it only appears when it is written completely
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(temporary_path, "wb") as file:
+                file.write(program.to_bytes())
+            os.replace(temporary_path, path)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def clear(self):
+        """
+        Forgets all the programs kept in memory (the saved ones stay in the directory)
+        """
+        with self.lock:
+            self.programs.clear()
+
+    def __len__(self):
+        return len(self.programs)
+
+
+# Cache of the assembled programs shared by the whole process
+assembler_cache = AssemblerCache()
 
 
 class AssemblerError(Exception):
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Batch runner: assembles and runs many programs at once, without any interface, on all the processors
+# of the machine (e.g. to grade the programs of the whole class)
+#
+# The jobs are read from the manifest, a JSON object per line:
+#   {"file": "student1.asm", "isa": "risc3", "architecture": "neumann", "io": "special",
+#    "input": "abc", "max_steps": 100000, "id": "student1"}
+# Only the file is required:
+#   * file - the assembly program (.asm), the text of the binary code or the object file, relative to the manifest
+#   * isa - the ISA of the program, object files know theirs
+#   * architecture, io - the data/program architecture and the I/O mode (neumann and special by default)
+#   * input - the characters the program gets when it asks for the input, one by one
+#   * max_steps - the maximum number of the instructions to execute, so an endless loop can't hold the runner
+#   * id - any id of the job, to find it in the results (the path of the file by default)
+#
+# The results are written as a JSON object per line, in the same order as the jobs (see JobResult)
+#
+# Usage: python -m modules.batch manifest.jsonl -o results.jsonl [--workers N]
+
+import os
+import sys
+import json
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.assembler import assembler_cache
+from modules.object_file import ObjectFile, is_object_file
+from modules.processor import CPU
+
+# The instructions executed by one job if the manifest does not say otherwise
+DEFAULT_MAX_STEPS = 100000
+
+# Number of the jobs sent to a worker process at once for each of the workers,
+# fewer trips between the processes for many short jobs
+JOBS_PER_CHUNK = 16
+
+
+class BatchCLI:
+    """
+    Command-Line interface for the batch runner
+    """
+
+    def __init__(self):
+        """
+        Checks the validity of the arguments and runs the jobs of the manifest
+        """
+        parser = argparse.ArgumentParser()
+        parser.add_argument("manifest", help="provide the manifest of the jobs, a JSON object per line")
+        parser.add_argument("-o", "--output", help="specify the results file (default: standard output)")
+        parser.add_argument("--workers", type=int,
+                            help="specify the number of the worker processes (default: the number of processors)")
+        args = parser.parse_args()
+
+        if not os.path.isfile(args.manifest):
+            raise BatchError("Provide a valid manifest file path")
+        if args.workers is not None and args.workers <= 0:
+            raise BatchError("Provide a positive number of the worker processes")
+
+        jobs = read_manifest(args.manifest)
+        if args.output:
+            with open(args.output, "w") as output_file:
+                write_results(run_batch(jobs, args.workers), output_file)
+        else:
+            write_results(run_batch(jobs, args.workers), sys.stdout)
+
+
+class BatchJob(namedtuple("BatchJob", ["id", "file", "isa", "architecture", "io", "input", "max_steps"])):
+    """
+    Program to assemble and run
+    id - id of the job, file - path to the program, isa - ISA of the program (None for object files),
+    architecture - data/program architecture, io - I/O mode, input - characters given to the program,
+    max_steps - the maximum number of the instructions to execute
+    """
+    __slots__ = ()
+
+
+class JobResult(namedtuple("JobResult", ["id", "halt_reason", "steps", "output", "registers", "error"])):
+    """
+    Result of the job
+    id - id of the job, halt_reason - why the program stopped: one of the RunResult reasons ('halt', 'input'
+    when the program asked for more input than there was, 'max_steps') or 'error', steps - number of the
+    instructions executed, output - contents of the shell, registers - values of the registers by name,
+    error - the error message if the program could not be assembled or run, or if its output could not be read
+    (the program ran anyway, so the rest is kept), None otherwise
+    The steps, output and registers of the program which failed while running are the ones it reached
+    (the steps of the failed run itself are not counted)
+    """
+    __slots__ = ()
+
+
+def read_manifest(path):
+    """
+    Reads the jobs from the manifest
+    :param path: str - path to the manifest, the paths of the programs are relative to it
+    :return: list of BatchJob
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, "r") as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError:
+                raise BatchError(f"Line {number} of the manifest is not valid JSON")
+            if not isinstance(job, dict) or not isinstance(job.get("file"), str):
+                raise BatchError(f"Provide the program file on line {number} of the manifest")
+
+            isa = job.get("isa")
+            jobs.append(BatchJob(str(job.get("id", job["file"])), os.path.join(directory, job["file"]),
+                                 isa.lower() if isa else None, job.get("architecture", "neumann").lower(),
+                                 job.get("io", "special").lower(), job.get("input", ""),
+                                 int(job.get("max_steps", DEFAULT_MAX_STEPS))))
+    return jobs
+
+
+def run_job(job):
+    """
+    Assembles and runs the program of the job, any error of the program is the result of the job
+    :param job: BatchJob
+    :return: JobResult
+    """
+    try:
+        program = load_program(job)
+        cpu = CPU(program.isa, job.architecture, job.io, program, program.entry_point, debug_mode=False)
+    except Exception as error:
+        return JobResult(job.id, "error", 0, "", {}, describe_error(error))
+
+    runs = []
+    try:
+        halt_reason, error = run_with_input(cpu, job.input, job.max_steps, runs.append).halt_reason, None
+    except Exception as run_error:
+        halt_reason, error = "error", describe_error(run_error)
+    registers = {name: register.value for name, register in cpu.registers.items()}
+
+    try:
+        output = " ".join(str(device) for device in cpu.ports_dictionary.values())
+    except Exception as output_error:
+        output = ""
+        error = error or f"Output: {describe_error(output_error)}"
+    return JobResult(job.id, halt_reason, sum(run.steps for run in runs), output, registers, error)
+
+
+def describe_error(error):
+    """
+    Describes the error for the results
+    :param error: Exception
+    :return: str - the type of the error and its message
+    """
+    return f"{type(error).__name__}: {error}"
+
+
+def run_with_input(cpu, characters, max_steps, on_run=None):
+    """
+    Runs the program, giving it the characters of the input one by one, every time it waits for the input
+    :param cpu: CPU - with the program loaded
+    :param characters: str - the input of the program
+    :param max_steps: int - the maximum number of the instructions to execute
+    :param on_run: callable taking the RunResult of every run between the inputs, or None
+        (e.g. to know the steps executed before the program failed)
+    :return: RunResult - with the steps executed in all
+    """
+    steps = 0
+    characters = iter(characters)
+    while True:
+        result = cpu.run(max_steps=max_steps - steps)
+        if on_run is not None:
+            on_run(result)
+        steps += result.steps
+        if result.halt_reason != "input" or (character := next(characters, None)) is None:
+            return result._replace(steps=steps)
+        cpu.input_finish(bin(ord(character))[2:])
+
+
+def load_program(job):
+    """
+    Reads the program of the job, assembling it if it is written in the assembly
+    :param job: BatchJob
+    :return: ObjectFile
+    """
+    with open(job.file, "rb") as file:
+        blob = file.read()
+
+    if is_object_file(blob):
+        program = ObjectFile.from_bytes(blob)
+        if job.isa and job.isa != program.isa:
+            raise BatchError(f"The program was assembled for {program.isa}, not {job.isa}")
+        return program
+
+    if not job.isa:
+        raise BatchError("Provide the ISA of the program")
+    text = blob.decode("utf-8")
+    if job.file.endswith(".asm"):
+        return assembler_cache.assemble(job.isa, text)
+    return ObjectFile.from_text(job.isa, text)
+
+
+def run_batch(jobs, workers=None):
+    """
+    Runs the jobs in the worker processes
+    :param jobs: list of BatchJob
+    :param workers: int - the number of the worker processes (the number of processors if None),
+        1 runs the jobs in this process
+    :return: generator of JobResult - in the same order as the jobs
+    """
+    jobs = list(jobs)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        yield from map(run_job, jobs)
+        return
+
+    workers = min(workers, len(jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(run_job, jobs, chunksize=max(1, min(JOBS_PER_CHUNK, len(jobs) // workers)))
+
+
+def write_results(results, file):
+    """
+    Writes the results as a JSON object per line, as soon as they are ready
+    :param results: iterable of JobResult
+    :param file: file object open for writing
+    """
+    for result in results:
+        file.write(json.dumps(result._asdict()) + "\n")
+
+
+class BatchError(Exception):
+    """ Error raised by the batch runner """
+
+
+if __name__ == '__main__':
+    batch = BatchCLI()
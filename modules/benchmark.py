@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Benchmark suite of the assembler and the simulator, to check any change of the engine before deploying it
+#
+# Every program of modules/demos and modules/program_examples is assembled and run for every data/program
+# architecture, measuring:
+#   * instructions_per_second - instructions executed by CPU.run (the CPU is reset before every run)
+#   * cpu_construction_seconds - time it takes to create the CPU with the program loaded
+#   * peak_memory_bytes - memory allocated for one CPU while it is created and runs the program (tracemalloc)
+#   * lines_per_second - lines of the assembly program translated by the assembler (once per program)
+# The ISA of the program is the name of its directory (demos) or is in its name, otherwise it is the first ISA
+# that assembles it; programs no ISA assembles are skipped, and errors while running are recorded instead of
+# the measurements
+#
+# The results are saved as JSON, and compared with the results of another run (the baseline): every
+# measurement worse than in the baseline by more than the threshold (a fraction, 0.2 - 20% worse) is
+# a regression, and the benchmark fails (exits with code 1) if there are any
+#
+# Usage: python -m modules.benchmark -o results.json [--baseline old_results.json] [--threshold 0.2]
+
+import gc
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+from modules.assembler import Assembler, AssemblerError
+from modules.batch import run_with_input
+from modules.isa import ISA_NAMES
+from modules.processor import CPU
+
+BENCHMARK_VERSION = 1
+
+# Directories with the benchmarked programs, relative to this module
+BENCHMARK_DIRECTORIES = ("demos", "program_examples")
+BENCHMARK_ARCHITECTURES = ("neumann", "harvard", "harvardm")
+
+# The measurement is repeated for at least this many seconds, so that the short programs are timed precisely,
+# in this many rounds, the best one is taken
+MIN_TIME = 0.1
+ROUNDS = 5
+
+# The instructions executed by one run of the program, and the input it gets when it asks for it
+MAX_STEPS = 20000
+BENCHMARK_INPUT = "benchmark"
+
+# Measurements, and whether the bigger value is the better one
+METRICS = {"instructions_per_second": True, "lines_per_second": True, "cpu_construction_seconds": False,
+           "peak_memory_bytes": False}
+
+# Regression threshold if nothing else was asked for, the measurements of the same code differ by up to ~10%
+DEFAULT_THRESHOLD = 0.2
+
+
+class BenchmarkCLI:
+    """
+    Command-Line interface for the benchmark suite
+    """
+
+    def __init__(self):
+        """
+        Runs the benchmarks, saves the results and compares them with the baseline
+        """
+        parser = argparse.ArgumentParser()
+        parser.add_argument("-o", "--output", help="specify the file to save the results to")
+        parser.add_argument("--baseline", help="provide the results of the previous run to compare with")
+        parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                            help=f"specify how much worse (as a fraction) a measurement can be than in the baseline "
+                                 f"(default: {DEFAULT_THRESHOLD})")
+        parser.add_argument("--min_time", type=float, default=MIN_TIME,
+                            help=f"specify for how many seconds every measurement is repeated (default: {MIN_TIME})")
+        parser.add_argument("--filter", default="",
+                            help="only run the programs with this text in their names (like 'risc3/')")
+        args = parser.parse_args()
+
+        if args.threshold < 0:
+            raise BenchmarkError("Provide a non-negative regression threshold")
+        baseline = None
+        if args.baseline:
+            if not os.path.isfile(args.baseline):
+                raise BenchmarkError("Provide a valid baseline file path")
+            with open(args.baseline, "r") as file:
+                baseline = json.load(file)
+
+        programs = [program for program in find_programs() if args.filter in program[0]]
+        results = run_benchmarks(programs, min_time=args.min_time, log=sys.stderr)
+        print(format_summary(results))
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(results, file, indent=2)
+
+        if baseline is not None:
+            regressions = compare(results, baseline, args.threshold)
+            for regression in regressions:
+                print(f"REGRESSION: {regression}")
+            if regressions:
+                sys.exit(1)
+            print(f"No regressions over {args.threshold:.0%} compared with {args.baseline}")
+
+
+def find_programs(directories=None):
+    """
+    Finds the benchmarked programs and their ISAs
+    :param directories: list of str - directories to look for the .asm files in (with the subdirectories),
+        BENCHMARK_DIRECTORIES if None
+    :return: list of (name, ISA, path) - name is the path relative to the directory of the modules
+    """
+    base = os.path.dirname(os.path.abspath(__file__))
+    if directories is None:
+        directories = [os.path.join(base, directory) for directory in BENCHMARK_DIRECTORIES]
+
+    programs = []
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, "**", "*.asm"), recursive=True)):
+            name = os.path.relpath(path, base).replace(os.sep, "/")
+            with open(path, "r") as file:
+                program_text = file.read()
+            if (isa := program_isa(name, program_text)) is not None:
+                programs.append((name, isa, path))
+    return programs
+
+
+def program_isa(name, program_text):
+    """
+    Figures out the ISA of the program
+    :param name: str - path of the program
+    :param program_text: str - the assembly program
+    :return: str - the ISA, or None if no ISA assembles the program
+    """
+    parts = name.lower().replace(".", "_").replace("/", "_").split("_")
+    for isa in ISA_NAMES:
+        if isa in parts:
+            return isa
+    for isa in ISA_NAMES:
+        try:
+            Assembler(isa, program_text)
+            return isa
+        except AssemblerError:
+            pass
+    return None
+
+
+def run_benchmarks(programs, architectures=BENCHMARK_ARCHITECTURES, min_time=MIN_TIME, log=None):
+    """
+    Runs the benchmarks of the programs
+    :param programs: list of (name, ISA, path) - like the ones from find_programs
+    :param architectures: list of str - data/program architectures to run the programs in
+    :param min_time: float - seconds every measurement is repeated for
+    :param log: file object to report the progress to, or None
+    :return: dict - the results: "assembler" - lines_per_second by the name of the program,
+        "cpu" - the CPU measurements (or the error) by "name:architecture", "summary" - the measurements of
+        all the programs together
+    """
+    results = {"version": BENCHMARK_VERSION, "python": platform.python_version(), "min_time": min_time,
+               "assembler": dict(), "cpu": dict()}
+    total_lines = total_assembler_time = total_steps = total_run_time = 0
+
+    for name, isa, path in programs:
+        with open(path, "r") as file:
+            program_text = file.read()
+
+        lines_per_second, lines, seconds = measure_assembler(isa, program_text, min_time)
+        results["assembler"][name] = {"lines_per_second": lines_per_second}
+        total_lines, total_assembler_time = total_lines + lines, total_assembler_time + seconds
+        program = Assembler(isa, program_text).object_file()
+
+        for architecture in architectures:
+            try:
+                case = measure_cpu(program, architecture, min_time)
+            except Exception as error:
+                case = {"error": f"{type(error).__name__}: {error}"}
+            else:
+                total_steps, total_run_time = total_steps + case.pop("steps"), total_run_time + case.pop("seconds")
+            results["cpu"][f"{name}:{architecture}"] = case
+            if log is not None:
+                log.write(f"{name}:{architecture} {format_case(case)}\n")
+
+    results["summary"] = {"instructions_per_second": total_steps / total_run_time if total_run_time else 0,
+                          "lines_per_second": total_lines / total_assembler_time if total_assembler_time else 0}
+    return results
+
+
+def measure(function, min_time):
+    """
+    Calls the function again and again for at least min_time seconds, in several rounds, and takes the rate of
+    the best round, so that the other processes of the machine disturb the measurement less
+    :param function: function() -> (work done, seconds it took)
+    :param min_time: float - seconds to repeat for
+    :return: (float, int, float) - work per second in the best round, work done and seconds it took in all
+    """
+    best_rate, total_work, total_seconds = 0, 0, 0
+    for _ in range(ROUNDS):
+        calls = work = seconds = 0
+        while seconds < min_time / ROUNDS or not calls:
+            call_work, call_seconds = function()
+            calls, work, seconds = calls + 1, work + call_work, seconds + call_seconds
+        best_rate = max(best_rate, work / seconds if seconds else 0)
+        total_work, total_seconds = total_work + work, total_seconds + seconds
+    return best_rate, total_work, total_seconds
+
+
+def measure_assembler(isa, program_text, min_time):
+    """
+    Measures assembling the program
+    :param isa: str - the ISA of the program
+    :param program_text: str - the assembly program
+    :param min_time: float - seconds to repeat for
+    :return: (float, int, float) - lines per second, lines translated in all, and the seconds it took
+    """
+    lines_count = program_text.count("\n") + 1
+
+    def assemble():
+        start = time.perf_counter()
+        Assembler(isa, program_text)
+        return lines_count, time.perf_counter() - start
+
+    return measure(assemble, min_time)
+
+
+def measure_cpu(program, architecture, min_time):
+    """
+    Measures creating the CPU and running the program on it
+    :param program: ObjectFile - the assembled program
+    :param architecture: str - data/program architecture
+    :param min_time: float - seconds to repeat each of the measurements for
+    :return: dict - cpu_construction_seconds, instructions_per_second, peak_memory_bytes, and the number of
+        steps executed and the seconds it took in all (for the summary)
+    """
+    def create_cpu():
+        return CPU(program.isa, architecture, "special", program, program.entry_point, debug_mode=False)
+
+    # Memory of one CPU, measured apart, tracemalloc slows everything down
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run_with_input(create_cpu(), BENCHMARK_INPUT, MAX_STEPS)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    def construct():
+        start = time.perf_counter()
+        create_cpu()
+        return 1, time.perf_counter() - start
+
+    # The CPU is reset before every run, so every run starts from scratch, compiling the program blocks again
+    cpu = create_cpu()
+
+    def run():
+        cpu.reset()
+        start = time.perf_counter()
+        steps = run_with_input(cpu, BENCHMARK_INPUT, MAX_STEPS).steps
+        return steps, time.perf_counter() - start
+
+    cpus_per_second = measure(construct, min_time)[0]
+    instructions_per_second, steps, seconds = measure(run, min_time)
+    return {"instructions_per_second": instructions_per_second, "cpu_construction_seconds": 1 / cpus_per_second,
+            "peak_memory_bytes": peak_memory, "steps": steps, "seconds": seconds}
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Finds the measurements worse than in the baseline by more than the threshold
+    Programs and measurements missing from any of the results are not compared
+    :param results: dict - results of run_benchmarks
+    :param baseline: dict - results of the previous run
+    :param threshold: float - how much worse (as a fraction) a measurement can be
+    :return: list of str - descriptions of the regressions
+    """
+    regressions = []
+    for section in ("summary", "assembler", "cpu"):
+        current_section, baseline_section = results.get(section, dict()), baseline.get(section, dict())
+        cases = [(section, current_section, baseline_section)] if section == "summary" else \
+            [(name, current_section[name], baseline_section[name])
+             for name in current_section if name in baseline_section]
+
+        for name, current, previous in cases:
+            for metric, bigger_is_better in METRICS.items():
+                if not isinstance(current.get(metric), (int, float)) or not previous.get(metric):
+                    continue
+                change = current[metric] / previous[metric] - 1
+                if (-change if bigger_is_better else change) > threshold:
+                    regressions.append(f"{name} {metric}: {previous[metric]:.6g} -> {current[metric]:.6g} "
+                                       f"({change:+.1%})")
+    return regressions
+
+
+def format_case(case):
+    """
+    Describes the CPU measurements of the program in one line
+    :param case: dict - the measurements or the error
+    :return: str
+    """
+    if "error" in case:
+        return f"error: {case['error']}"
+    return (f"{case['instructions_per_second']:,.0f} instructions/s, "
+            f"CPU created in {case['cpu_construction_seconds'] * 1000:.2f} ms, "
+            f"peak memory {case['peak_memory_bytes'] / 1024:,.0f} KiB")
+
+
+def format_summary(results):
+    """
+    Describes the results of all the programs together
+    :param results: dict - results of run_benchmarks
+    :return: str
+    """
+    summary = results["summary"]
+    errors = sum("error" in case for case in results["cpu"].values())
+    return (f"{len(results['assembler'])} programs, {len(results['cpu'])} runs ({errors} with errors): "
+            f"{summary['instructions_per_second']:,.0f} instructions/s, "
+            f"assembler {summary['lines_per_second']:,.0f} lines/s")
+
+
+class BenchmarkError(Exception):
+    """ Error raised by the benchmark suite """
+
+
+if __name__ == '__main__':
+    benchmark = BenchmarkCLI()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# History of the program execution, to go back to the instructions executed before (see CPU.start_history,
+# CPU.step_back and CPU.goto_step)
+#
+# While the CPU records the history, it keeps:
+#   * an undo entry for every executed instruction - the values of the registers, the contents of the devices and
+#       the rest of the CPU state before the instruction, and the old contents of the memory the instruction (or
+#       the input after it) wrote over; only the last max_entries of them, in a ring
+#   * a full checkpoint (see CPU.checkpoint) every checkpoint_interval instructions, only the last max_checkpoints
+#       (CPU.run executes the compiled blocks from one checkpoint to the next without the undo entries)
+#   * the input the program got, by the step it got it at, so that going forward again gives it the same input
+# Going back over the undo entries takes as long as the instructions it goes back over, going back further than
+# the entries reach starts from the nearest checkpoint before, executing about checkpoint_interval instructions
+# at most (the checkpoints are taken between the compiled blocks, up to a block later)
+#
+# The memory it takes is bounded: the undo entries are a few words each, and the checkpoints only keep
+# the memory pages written after them (they share the rest of the pages with the memory)
+#
+# The steps are the numbers of the instructions executed since the CPU started recording (or was reset)
+
+from collections import namedtuple, deque
+
+# Undo entries, instructions between the checkpoints, and checkpoints kept if nothing else was asked for
+HISTORY_SIZE = 10000
+CHECKPOINT_INTERVAL = 1000
+MAX_CHECKPOINTS = 20
+
+
+class UndoEntry(namedtuple("UndoEntry", ["registers", "devices", "state", "memory_writes"])):
+    """
+    State of the CPU before the instruction
+    registers - tuple of the values of the registers, devices - contents of the devices by port,
+    state - the rest of the CPU attributes changing while the program runs (see CPUCheckpoint.attributes),
+    memory_writes - list of (memory, address, old bytes) of the writes of the instruction, in their order
+    """
+    __slots__ = ()
+
+
+class History:
+    """
+    Undo entries and checkpoints of the instructions executed by the CPU
+    """
+
+    def __init__(self, max_entries=HISTORY_SIZE, checkpoint_interval=CHECKPOINT_INTERVAL,
+                 max_checkpoints=MAX_CHECKPOINTS):
+        """
+        Creates a new empty history
+        :param max_entries: int - the number of the last instructions kept in the undo entries
+        :param checkpoint_interval: int - the number of the instructions between the checkpoints
+        :param max_checkpoints: int - the number of the last checkpoints kept
+        :return: NoneType
+        """
+        if min(max_entries, checkpoint_interval, max_checkpoints) <= 0:
+            raise ValueError("Sizes of the history should be positive")
+        self.checkpoint_interval = checkpoint_interval
+        self.entries = deque(maxlen=max_entries)
+        self.checkpoints = deque(maxlen=max_checkpoints)
+        self.inputs = dict()
+        self.step = 0
+
+    def clear(self):
+        """
+        Forgets everything, the next instruction is the step 0
+        """
+        self.entries.clear()
+        self.checkpoints.clear()
+        self.inputs.clear()
+        self.step = 0
+
+    @property
+    def earliest_step(self):
+        """
+        The earliest step it is possible to go back to
+        :return: int
+        """
+        earliest = self.step - len(self.entries)
+        if self.checkpoints:
+            earliest = min(earliest, self.checkpoints[0][0])
+        return earliest
+
+    def steps_to_checkpoint(self):
+        """
+        The number of the instructions before the next checkpoint is due
+        :return: int - 0 if it is due now
+        """
+        if not self.checkpoints:
+            return 0
+        return max(self.checkpoint_interval - (self.step - self.checkpoints[-1][0]), 0)
+
+    def add_checkpoint(self, checkpoint):
+        """
+        Remembers the checkpoint of the current step (instead of the one the CPU took there before going back),
+        and lets go of the inputs nothing can go back to anymore
+        :param checkpoint: CPUCheckpoint
+        """
+        self.forget_after(self.step - 1)
+        self.checkpoints.append((self.step, checkpoint))
+        earliest = self.earliest_step
+        for step in [step for step in self.inputs if step < earliest]:
+            del self.inputs[step]
+
+    def add_input(self, character):
+        """
+        Remembers the input the program got at the current step, the inputs after it are of another run now,
+        unless it is the same input as before
+        :param character: str - binary representation of the input
+        """
+        if self.inputs.get(self.step) != character:
+            for step in [step for step in self.inputs if step > self.step]:
+                del self.inputs[step]
+        self.inputs[self.step] = character
+
+    def checkpoint_before(self, step):
+        """
+        Finds the nearest checkpoint at or before the step
+        :param step: int
+        :return: (int, CPUCheckpoint) - the step of the checkpoint and the checkpoint, or None if there is none
+        """
+        for checkpoint_step, checkpoint in reversed(self.checkpoints):
+            if checkpoint_step <= step:
+                return checkpoint_step, checkpoint
+        return None
+
+    def forget_after(self, step):
+        """
+        Lets go of the checkpoints after the step, the program might go another way from there
+        :param step: int
+        """
+        while self.checkpoints and self.checkpoints[-1][0] > step:
+            self.checkpoints.pop()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Integer version of the ALU functions from functions.py, used by the CPU now that the registers and
+# the memory are integer-based. The operands are unsigned ints, and as the original functions depend on
+# the lengths of the bitarrays passed to them, the widths of the operands (in bits) are passed alongside
+#
+# The results are meant to be the same as the ones of the original functions bit for bit, including
+# their peculiarities, which the programs written for the simulator might rely on (see test_int_functions.py).
+# Where the original functions fail on a result they can't convert back into bits, these keep its lowest 16 bits
+
+from modules.functions import twos_complement
+
+# About Flag register:
+# Flags in the register are represented like  | 0 | 0 | 0 | 0 | 0 | 0 | 0 | 0 | 0 | 0 | 0 | 0 | CF | ZF | OF | SF |
+CARRY_FLAG = 0b1000
+ZERO_FLAG = 0b0100
+OVERFLOW_FLAG = 0b0010
+SIGN_FLAG = 0b0001
+
+
+def load_store(operands, widths, flag_register):
+    """
+    Loads value from memory to register
+    /
+    Stores value from register in the memory
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: value of the register/memory
+    """
+    return operands[-1]
+
+
+def mov_low(operands, widths, flag_register):
+    """
+    Writes immediate constant into the low byte of the register, setting high byte to all zeros
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: new value of the register
+    """
+    return operands[1]
+
+
+def mov_high(operands, widths, flag_register):
+    """
+    Writes immediate constant into the high byte of the register, does not affect the low byte
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: new value of the register
+    """
+    return ((operands[1] << 8) | (operands[0] & 0xFF)) & 0xFFFF
+
+
+def mov(operands, widths, flag_register):
+    """
+    Writes register value into another register
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: new value of the register
+    """
+    return operands[-1]
+
+
+def add(operands, widths, flag_register):
+    """
+    Performs addition of the last two operands
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    result, flags = wrap_result(twos_complement(operands[-2], widths[-2]) + twos_complement(operands[-1], widths[-1]),
+                                widths[-2])
+    flag_register.value = flags | change_flags(operands, widths, result)
+    return result
+
+
+def addc(operands, widths, flag_register):
+    """
+    Performs addition of the register and the carry flag
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    carry_flag = 1 if flag_register.value & CARRY_FLAG else 0
+    result, flags = wrap_result(twos_complement(operands[-1], 16) + carry_flag, widths[-1])
+    flag_register.value = flags | change_flags(operands, widths, result)
+    return result
+
+
+def sub(operands, widths, flag_register):
+    """
+    Performs subtraction of the last two operands
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    result, flags = wrap_result(twos_complement(operands[-2], widths[-2]) - twos_complement(operands[-1], widths[-1]),
+                                widths[-2])
+    flag_register.value = flags | change_flags(operands, widths, result, 1)
+    return result
+
+
+def mul(operands, widths, flag_register):
+    """
+    Performs multiplication of the last two operands
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    result, flags = wrap_result(twos_complement(operands[-2], widths[-2]) * twos_complement(operands[-1], widths[-1]),
+                                widths[-2])
+    flag_register.value = flags | change_flags(operands, widths, result)
+    return result
+
+
+def div(operands, widths, flag_register):
+    """
+    Performs division of the last two operands
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    result, flags = wrap_result(twos_complement(operands[-2], widths[-2]) // twos_complement(operands[-1], widths[-1]),
+                                widths[-2])
+    flag_register.value = flags | change_flags(operands, widths, result)
+    return result
+
+
+def bit_and(operands, widths, flag_register):
+    """
+    Performs bitwise and on the last two operands
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    result = abs(twos_complement(twos_complement(operands[-2], widths[-2]) & twos_complement(operands[-1], widths[-1]),
+                                 widths[-2]))
+    flag_register.value = change_flags(operands, widths, result)
+    return result
+
+
+def bit_or(operands, widths, flag_register):
+    """
+    Performs bitwise or on the last two operands
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    result = abs(twos_complement(twos_complement(operands[-2], widths[-2]) | twos_complement(operands[-1], widths[-1]),
+                                 widths[-2]))
+    flag_register.value = change_flags(operands, widths, result)
+    return result
+
+
+def bit_xor(operands, widths, flag_register):
+    """
+    Performs bitwise xor on the last two operands
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    result = abs(twos_complement(twos_complement(operands[-2], widths[-2]) ^ twos_complement(operands[-1], widths[-1]),
+                                 widths[-2]))
+    flag_register.value = change_flags(operands, widths, result)
+    return result
+
+
+def bit_not(operands, widths, flag_register):
+    """
+    Performs bitwise not on the last operand
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    width = widths[-1]
+    result = ~operands[-1] & ((1 << width) - 1)
+
+    # The highest bit always changes, so the overflow flag is always set
+    flags = OVERFLOW_FLAG
+    if result == 0 and width == 16:
+        flags |= ZERO_FLAG
+    if result >> (width - 1):
+        flags |= SIGN_FLAG
+    flag_register.value = flags
+    return result
+
+
+def lsh(operands, widths, flag_register):
+    """
+    Performs bitwise left shift of the second-to-last operand by the last one
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    coefficient = max(twos_complement(operands[-1], widths[-1]), 0)
+    result, length = operands[-2] << coefficient, widths[-2] + coefficient
+
+    flags = 0
+    if length > 16:
+        flags = CARRY_FLAG
+        result, length = result & 0xFFFF, 16
+    flag_register.value = flags | change_flags(operands, widths, result, length=length)
+    return result
+
+
+def rsh(operands, widths, flag_register):
+    """
+    Performs bitwise right shift of the second-to-last operand by the last one
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: result of the operation
+    """
+    coefficient = max(twos_complement(operands[-1], widths[-1]), 0)
+    result, length = operands[-2], widths[-2] + coefficient
+
+    flags = 0
+    if length > 16:
+        flags = CARRY_FLAG
+        result, length = result >> (length - 16), 16
+    flag_register.value = flags | change_flags(operands, widths, result, length=length)
+    return result
+
+
+def cmp(operands, widths, flag_register):
+    """
+    Compares two operands by subtraction of their values
+    Only affects flags
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: new value of the flag register
+    """
+    result, flags = wrap_result(twos_complement(operands[0], widths[0]) - twos_complement(operands[1], widths[1]),
+                                widths[0])
+    flag_register.value = flags | change_flags(operands, widths, result, 1)
+    return flag_register.value
+
+
+def cmpe(operands, widths, flag_register):
+    """
+    Compares whether two operands are equal and returns
+        0x0000 if not
+        0xFFFF if yes
+    """
+    equal = twos_complement(operands[0], widths[0]) == twos_complement(operands[1], widths[1])
+    return 0xFFFF if equal else 0
+
+
+def cmpb(operands, widths, flag_register):
+    """
+    Compares whether the first operand is bigger than the second and returns
+        0x0000 if not
+        0xFFFF if yes
+    """
+    bigger = twos_complement(operands[0], widths[0]) > twos_complement(operands[1], widths[1])
+    return 0xFFFF if bigger else 0
+
+
+def test(operands, widths, flag_register):
+    """
+    Compares two operands by performing bitwise "and" on their values
+    Only affects flags
+
+    :param operands: list of operands
+    :param widths: list of widths of the operands
+    :param flag_register: Flag register
+    :return: new value of the flag register
+    """
+    result, flags = wrap_result(twos_complement(operands[0], widths[0]) & twos_complement(operands[1], widths[1]),
+                                widths[1])
+
+    # The original function means to clear the overflow flag here, but actually sets it
+    flag_register.value = flags | change_flags(operands, widths, result) | OVERFLOW_FLAG
+    return flag_register.value
+
+
+def wrap_result(value, width):
+    """
+    Turns the result of the operation into the 16 bits it is saved as, the way the original functions do
+    (taking the magnitude of the value in two's complement of the width specified)
+
+    :param value: int - signed result of the operation
+    :param width: int - width of the operation
+    :return: tuple - the 16-bit result and the carry flag
+    """
+    result = abs(twos_complement(value, width))
+    if result <= 0xFFFF:
+        return result, 0
+    return abs(twos_complement(value, 18)) & 0xFFFF, CARRY_FLAG
+
+
+def change_flags(operands, widths, result, negative_operation=0, length=16):
+    """
+    Computes the zero, overflow and sign flags for the result of the operation and its first two operands
+
+    :param operands: operands, which participated in the operation
+    :param widths: widths of the operands
+    :param result: result of the operation
+    :param negative_operation: indicates, if that operation allows two positive operands to have a negative result
+    :param length: the length of the result in bits
+    :return: int - the flags
+    """
+    flags = 0
+    first_sign = operands[0] >> (widths[0] - 1)
+    second_sign = operands[1] >> (widths[1] - 1)
+    result_sign = result >> (length - 1)
+
+    if not negative_operation:
+        if first_sign == second_sign != result_sign:
+            flags |= OVERFLOW_FLAG
+    elif operands[0] > operands[1] and first_sign != result_sign:
+        flags |= OVERFLOW_FLAG
+    elif operands[0] < operands[1] and not result_sign:
+        flags |= OVERFLOW_FLAG
+
+    if result == 0 and length == 16:
+        flags |= ZERO_FLAG
+
+    if result_sign:
+        flags |= SIGN_FLAG
+
+    return flags
+
+
+int_functions_dictionary = {"load": load_store, "loadf": load_store, "loadi": load_store,
+                            "store": load_store, "storef": load_store, "storei": load_store,
+                            "dup": load_store, "dup2": load_store,
+                            "mov_low": mov_low, "mov_high": mov_high, "mov": mov,
+                            "add": add, "addc": addc, "sub": sub, "inc": add, "dec": sub,
+                            "mul": mul, "div": div,
+                            "and": bit_and, "or": bit_or,
+                            "xor": bit_xor, "not": bit_not,
+                            "cmp": cmp, "cmpe": cmpe, "cmpb": cmpb,
+                            "lsh": lsh, "rsh": rsh, "test": test}
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Registry of the instruction set architectures, shared by the Assembler and the CPU
+#
+# instructions.json and registers.json are read only once, when the module is imported, from the directory
+# of this module (so it does not matter where the simulator is started from), and all the tables the
+# Assembler and the CPU need are built from them right away for every ISA:
+#   * instructions - the instruction set by opcode, as it is in instructions.json
+#   * mnemonics - the encodings of every assembly instruction, with the opcode and the types of the operands
+#       the Assembler works with (5-bit opcodes of the low and high byte moves, no processor-only operands)
+#   * registers - the list of the registers, as it is in registers.json
+#   * register_codes - the encoding of every register by its name
+#
+# The tables are shared by every Assembler and CPU of the process, so they are made impossible to change,
+# and are not copied together with the CPU
+
+import os
+import json
+from collections import namedtuple
+
+# Names of the ISAs: RISC-Stack, RISC-Accumulator, RISC-Register and CISC-Register
+ISA_NAMES = ("risc1", "risc2", "risc3", "cisc")
+
+# Sizes of the instructions of the ISAs in bits: (size of the instruction, opcode size, byte size)
+INSTRUCTION_SIZES = {"risc1": (6, 6, 6), "risc2": (8, 8, 8), "risc3": (16, 6, 8), "cisc": (8, 8, 8)}
+
+
+class FrozenTable(dict):
+    """
+    Dictionary which can not be changed after it was created, so that it can be shared
+    """
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("The ISA tables are shared and can not be changed")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = __readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenTable, (dict(self),)
+
+
+class ISATables(namedtuple("ISATables", ["name", "instructions", "mnemonics", "registers", "register_codes",
+                                         "instruction_size"])):
+    """
+    Tables of the ISA built from instructions.json and registers.json
+    name - name of the ISA, instructions - instruction set by opcode, mnemonics - tuple of (opcode, operands types)
+    encodings by the name of the assembly instruction, registers - tuple of the registers (name, general purpose,
+    code, description), register_codes - code by the name of the register, instruction_size - (size of the
+    instruction, opcode size, byte size)
+    """
+    __slots__ = ()
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    """
+    Turns the lists of the JSON value into tuples, so that nothing in it could be changed
+    :param value: value read from the JSON file
+    :return: the same value with tuples instead of lists
+    """
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def build_isa_tables(isa, instructions, registers):
+    """
+    Builds all the tables of the ISA
+    :param isa: str - name of the ISA
+    :param instructions: dict - instruction set of the ISA from instructions.json
+    :param registers: list - registers of the ISA from registers.json
+    :return: ISATables
+    """
+    instructions = FrozenTable({opcode: freeze(details) for opcode, details in instructions.items()})
+
+    # The same assembly instruction might be encoded differently depending on the operands
+    mnemonics = dict()
+    for opcode, details in instructions.items():
+        name, operands_types = details[0], list(details[-1])
+
+        # Low and High byte moves have 5-bit opcodes, a special case
+        if name in ["mov_low", "mov_high"] and len(opcode) != 5:
+            opcode = opcode[:-1]
+
+        # Only the processor needs to know about this operand, it is not written in the assembly
+        if "one" in operands_types:
+            operands_types.remove("one")
+
+        mnemonics[name] = mnemonics.get(name, ()) + ((opcode, tuple(operands_types)),)
+
+    registers = freeze(registers)
+    return ISATables(isa, instructions, FrozenTable(mnemonics), registers,
+                     FrozenTable({register[0]: register[2] for register in registers}), INSTRUCTION_SIZES[isa])
+
+
+def load_isa_tables():
+    """
+    Reads instructions.json and registers.json and builds the tables of every ISA
+    :return: FrozenTable - {name of the ISA: ISATables}
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(directory, "instructions.json"), "r") as file:
+        instructions = json.load(file)
+    with open(os.path.join(directory, "registers.json"), "r") as file:
+        registers = json.load(file)
+
+    return FrozenTable({isa: build_isa_tables(isa, instructions[isa], registers[isa]) for isa in ISA_NAMES})
+
+
+# Tables of every ISA by its name
+ISA_TABLES = load_isa_tables()
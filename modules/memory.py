@@ -6,9 +6,31 @@
 
 # This is the main module of the virtual memory for the assembly hardware simulator
 # TODO: Is there any difference between registers and memory for us? Do we need two modules???
-# TODO: We might consider using the sparse representation of memory, especially for 64kib
 
-from bitarray import bitarray
+# The memory is addressed in bytes by the CPU (read_byte, read_word, ...), with 16-bit words
+# stored big-endian (high byte first), the same way they are laid out in bits.
+# The original bit-addressed interface (read_data and write_data) is still there for the parts
+# of the simulator working with bits, like the 6-bit bytes of RISC-Stack programs. The slots are not
+# the memory itself anymore: reading them makes a read-only copy of the whole memory (to look at it in
+# the tests), and the memory is only changed by assigning all of them at once
+#
+# The memory can be as big as 64KiB, but it is sparse: it is divided into pages of PAGE_SIZE bytes,
+# which are only allocated on the first write into them, while the rest of the memory reads as zeros
+#
+# Snapshots of the memory share the pages with it, and a shared page is only copied when it is written to
+#
+# While the memory has an undo log (a list, see CPU.start_history), every write first appends the old contents
+# of the bytes it writes over to it, as (memory, address, bytes)
+
+from bitarray import bitarray, frozenbitarray
+
+PAGE_SIZE = 256
+PAGE_BITS = 8
+PAGE_MASK = PAGE_SIZE - 1
+MAX_MEMORY_SIZE = 65536
+
+# Shared contents of all the pages that were never written to
+ZERO_PAGE = bytes(PAGE_SIZE)
 
 
 class Memory:
@@ -22,11 +44,185 @@ class Memory:
         """
         Creates a new memory structure.
 
-        :param memory_architecture: chosen program/data architecture.
+        :param size: int - size of the memory in bytes, up to 64KiB
         :return: NoneType
         """
+        if not 0 < size <= MAX_MEMORY_SIZE:
+            raise SimulatorMemoryError(f"Memory size should be between 1 byte and 64KiB (Memory Size:{size})")
+        self.size = size
         self.memory_size = size*8
-        self.slots = bitarray("0"*self.memory_size)
+
+        # Allocated pages by their number (address // PAGE_SIZE), and the numbers of the ones shared with snapshots
+        self.pages = dict()
+        self.shared_pages = set()
+
+        # Callables notified with the (start, end) bit range of every write, e.g. to invalidate decoded instructions
+        self.write_listeners = []
+
+        # List to save the old contents of the written bytes into, or None
+        self.undo_log = None
+
+    def read_byte(self, address):
+        """
+        Reads one byte from the memory
+        :param address: int - location of the byte
+        :return: int
+        """
+        if not 0 <= address < self.size:
+            raise SimulatorMemoryError(f"Memory overflow (Memory Size:{self.size}, Address: {address})")
+        if (page := self.pages.get(address >> PAGE_BITS)) is None:
+            return 0
+        return page[address & PAGE_MASK]
+
+    def write_byte(self, address, value):
+        """
+        Writes one byte into the memory
+        :param address: int - location of the byte
+        :param value: int - the value to be written, only the lowest 8 bits are kept
+        """
+        if not 0 <= address < self.size:
+            raise SimulatorMemoryError(f"Memory overflow (Memory Size:{self.size}, Address: {address})")
+        if self.undo_log is not None:
+            self.undo_log.append((self, address, self.read_bytes(address, address + 1)))
+        self.__page(address >> PAGE_BITS)[address & PAGE_MASK] = value & 0xFF
+        self.__notify(address * 8, address * 8 + 8)
+
+    def read_word(self, address):
+        """
+        Reads a 16-bit word from the memory (high byte first)
+        :param address: int - location of the high byte
+        :return: int
+        """
+        if not 0 <= address <= self.size - 2:
+            raise SimulatorMemoryError(f"Memory overflow (Memory Size:{self.size}, Address: {address})")
+
+        # Both of the bytes are in the same page most of the time
+        offset = address & PAGE_MASK
+        if offset != PAGE_MASK:
+            if (page := self.pages.get(address >> PAGE_BITS)) is None:
+                return 0
+            return (page[offset] << 8) | page[offset + 1]
+        return (self.read_byte(address) << 8) | self.read_byte(address + 1)
+
+    def write_word(self, address, value):
+        """
+        Writes a 16-bit word into the memory (high byte first)
+        :param address: int - location of the high byte
+        :param value: int - the value to be written, only the lowest 16 bits are kept
+        """
+        if not 0 <= address <= self.size - 2:
+            raise SimulatorMemoryError(f"Memory overflow (Memory Size:{self.size}, Address: {address})")
+        if self.undo_log is not None:
+            self.undo_log.append((self, address, self.read_bytes(address, address + 2)))
+
+        offset = address & PAGE_MASK
+        if offset != PAGE_MASK:
+            page = self.__page(address >> PAGE_BITS)
+            page[offset] = (value >> 8) & 0xFF
+            page[offset + 1] = value & 0xFF
+        else:
+            self.__page(address >> PAGE_BITS)[offset] = (value >> 8) & 0xFF
+            self.__page((address + 1) >> PAGE_BITS)[0] = value & 0xFF
+        self.__notify(address * 8, address * 8 + 16)
+
+    def read_bytes(self, start, end):
+        """
+        Reads the memory bytes [start:end]
+        :param start: int - starting address
+        :param end: int - end address (not included)
+        :return: bytes
+        """
+        if not 0 <= start <= end <= self.size:
+            raise SimulatorMemoryError(f"Memory overflow (Memory Size:{self.size}, Address: {end})")
+
+        chunks = []
+        address = start
+        while address < end:
+            page_number, offset = address >> PAGE_BITS, address & PAGE_MASK
+            chunk_end = min(end - address + offset, PAGE_SIZE)
+            chunks.append(self.pages.get(page_number, ZERO_PAGE)[offset:chunk_end])
+            address += chunk_end - offset
+        return b"".join(chunks)
+
+    def view(self, start, end):
+        """
+        Returns a read-only view of the memory bytes [start:end]
+        The bytes are not copied as long as they are in the same page, so the view is only meant to be read
+        before the next write into the memory
+
+        :param start: int - starting address
+        :param end: int - end address (not included)
+        :return: memoryview
+        """
+        if 0 <= start <= end <= self.size and (start >> PAGE_BITS) == ((end - 1) >> PAGE_BITS):
+            page = self.pages.get(start >> PAGE_BITS, ZERO_PAGE)
+            return memoryview(page)[start & PAGE_MASK:(start & PAGE_MASK) + end - start].toreadonly()
+        return memoryview(self.read_bytes(start, end))
+
+    def write_bytes(self, address, data):
+        """
+        Writes several bytes into the memory starting at address
+        :param address: int - location of the first byte
+        :param data: bytes-like object
+        """
+        if not 0 <= address <= self.size - len(data):
+            raise SimulatorMemoryError(f"Memory overflow (Memory Size:{self.size}, Address: {address})")
+        if self.undo_log is not None:
+            self.undo_log.append((self, address, self.read_bytes(address, address + len(data))))
+
+        data = memoryview(data)
+        position = 0
+        while position < len(data):
+            page_number, offset = (address + position) >> PAGE_BITS, (address + position) & PAGE_MASK
+            chunk = data[position:position + PAGE_SIZE - offset]
+
+            # Writing zeros into a page that was never allocated changes nothing
+            if page_number in self.pages or any(chunk):
+                self.__page(page_number)[offset:offset + len(chunk)] = chunk
+            position += len(chunk)
+
+        self.__notify(address * 8, (address + len(data)) * 8)
+
+    def touched_pages(self):
+        """
+        Lists the pages which were written to, the rest of the memory contains zeros
+        :return: list of (start address, read-only memoryview of the page contents), ordered by address
+        """
+        return [(page_number << PAGE_BITS, memoryview(self.pages[page_number]).toreadonly())
+                for page_number in sorted(self.pages)]
+
+    def snapshot(self):
+        """
+        Takes a snapshot of the memory contents, which does not copy anything until the memory is written to
+        :return: dict - the pages of the memory at the moment, not to be changed
+        """
+        self.shared_pages = set(self.pages)
+        return dict(self.pages)
+
+    def restore(self, snapshot):
+        """
+        Brings the memory contents back to the snapshot
+        :param snapshot: dict - the snapshot returned by the snapshot method
+        """
+        changed_pages = [page_number for page_number in self.pages.keys() | snapshot.keys()
+                         if self.pages.get(page_number) is not snapshot.get(page_number)]
+        self.pages = dict(snapshot)
+        self.shared_pages = set(snapshot)
+
+        # Only the pages which were written to after the snapshot could have changed
+        if changed_pages:
+            self.__notify(min(changed_pages) * PAGE_SIZE * 8,
+                          min((max(changed_pages) + 1) * PAGE_SIZE, self.size) * 8)
+
+    def clear(self):
+        """
+        Fills the whole memory with zeros, letting go of all the pages
+        """
+        had_pages = bool(self.pages)
+        self.pages = dict()
+        self.shared_pages = set()
+        if had_pages:
+            self.__notify(0, self.memory_size)
 
     def write_data(self, location, data):
         """
@@ -36,10 +232,19 @@ class Memory:
         :param data: data for writing into the memory
         :return: NoneType
         """
-        if len(data) > (self.memory_size - location):
+        if len(data) > (self.memory_size - location) or location < 0:
             raise SimulatorMemoryError(f"Memory overflow (Memory Size:{self.memory_size}, Location: {location})")
 
-        self.slots[location:location+len(data)] = data
+        end_location = location + len(data)
+        if not (location % 8 or end_location % 8):
+            self.write_bytes(location // 8, data.tobytes())
+        elif data:
+            # Bits which do not fill whole bytes are merged with the bytes already in the memory
+            start_byte, end_byte = location // 8, (end_location + 7) // 8
+            affected = bitarray()
+            affected.frombytes(self.read_bytes(start_byte, end_byte))
+            affected[location - start_byte * 8:end_location - start_byte * 8] = data
+            self.write_bytes(start_byte, affected.tobytes())
 
     def read_data(self, start_location, end_location):
         """
@@ -48,12 +253,77 @@ class Memory:
         :param start_location: int - starting location in bits
         :param end_location: int - end location in bits
         """
-        return self.slots[start_location:end_location]
+        result = bitarray()
+        if 0 <= start_location <= end_location <= self.memory_size:
+            start_byte, end_byte = start_location // 8, (end_location + 7) // 8
+            result.frombytes(self.read_bytes(start_byte, end_byte))
+            if start_location % 8 or end_location % 8:
+                result = result[start_location - start_byte * 8:end_location - start_byte * 8]
+            return result
+
+        # Anything outside of the memory bounds is read the same way a bitarray would be sliced
+        return bitarray(self.slots[start_location:end_location])
+
+    @property
+    def slots(self):
+        """
+        Read-only copy of the whole memory contents, changing its slices raises TypeError instead of
+        changing the memory (use write_data for that, and read_data or read_bytes to read a part of the memory
+        without copying the rest of it)
+        :return: frozenbitarray
+        """
+        result = bitarray()
+        result.frombytes(self.read_bytes(0, self.size))
+        return frozenbitarray(result)
+
+    @slots.setter
+    def slots(self, value):
+        """ Replaces the whole memory contents with the bitarray provided """
+        self.write_data(0, value)
+
+    def __page(self, page_number):
+        """
+        Returns the page for writing into it, allocating it on the first access,
+        or copying it if it is shared with a snapshot
+        :param page_number: int - number of the page (address // PAGE_SIZE)
+        :return: bytearray
+        """
+        if (page := self.pages.get(page_number)) is None:
+            page = self.pages[page_number] = bytearray(PAGE_SIZE)
+        elif self.shared_pages and page_number in self.shared_pages:
+            page = self.pages[page_number] = bytearray(page)
+            self.shared_pages.discard(page_number)
+        return page
+
+    def __notify(self, start_location, end_location):
+        """
+        Lets the listeners know about the write into memory
+        :param start_location: int - start of the written range, in bits
+        :param end_location: int - end of the written range, in bits
+        """
+        for listener in self.write_listeners:
+            listener(start_location, end_location)
 
     def __str__(self):
         """ Returns a representation of its contents in bitarray"""
         return self.slots
 
 
+def merge_ranges(ranges):
+    """
+    Merges the overlapping and adjacent ranges together
+    :param ranges: iterable of (start, end) tuples, end not included
+    :return: list of (start, end) tuples, ordered by start
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
 class SimulatorMemoryError(Exception):
     """ Exception raised in the memory class modules """
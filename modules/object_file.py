@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Object files are the compact binary form of the assembled programs, which the simulator loads without parsing
+# the text of '0' and '1' characters (which is 8 times bigger than the machine code itself)
+#
+# Everything is big-endian, the file consists of:
+#   * header - magic number, version of the format, ISA, entry point (the address the program is meant to start at),
+#       number of the instructions, length of the code in bits, number of the data labels and of the symbols
+#   * instruction boundary table - size of every instruction in the bytes of the ISA (6 bits for RISC-Stack),
+#       one byte each
+#   * code - bits of the instructions one after another, padded with zeros to whole bytes
+#   * data section - values of the labels declared with db/dw directives: length of the name, name in UTF-8,
+#       whether it is a single number or a string, number of the values and the values as 32-bit integers
+#       The assembler writes these values right into the instructions, so they are only there for the tools
+#       (like disassemblers or graders) and are not loaded into the memory
+#   * symbol table (optional) - jump labels: length of the name, name in UTF-8 and the number of the instruction
+#
+# The text of '0' and '1' characters, one instruction per line, can still be exported from the object file
+
+import struct
+from collections import namedtuple
+from bitarray import bitarray
+
+from modules.isa import ISA_NAMES, ISA_TABLES
+
+OBJECT_MAGIC = b"HSAO"
+OBJECT_VERSION = 1
+
+# The address the program starts at, if nothing else was asked for
+DEFAULT_ENTRY_POINT = 512
+
+HEADER = struct.Struct(">4sBBHIIHH")
+NAME_LENGTH = struct.Struct(">B")
+DATA_HEADER = struct.Struct(">BH")
+DATA_VALUE = struct.Struct(">i")
+SYMBOL_VALUE = struct.Struct(">I")
+
+
+class ObjectFile(namedtuple("ObjectFile", ["isa", "entry_point", "instruction_sizes", "code", "code_length", "data",
+                                           "symbols"])):
+    """
+    Assembled program in the form of the object file
+    isa - name of the ISA, entry_point - address the program is meant to start at, instruction_sizes - bytes with
+    the size of every instruction in the bytes of the ISA, code - bytes with the bits of the instructions, code_length -
+    number of the bits of the code, data - values of the db/dw labels by their names (int or tuple of ints),
+    symbols - numbers of the instructions of the jump labels by their names (empty if the symbols were stripped)
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_lines(cls, isa, binary_lines, data=None, symbols=None, entry_point=DEFAULT_ENTRY_POINT):
+        """
+        Builds the object file from the lines of '0' and '1' characters, one instruction per line
+        :param isa: str - name of the ISA
+        :param binary_lines: iterable of str - lines of the binary code, empty lines are skipped
+        :param data: dict - values of the db/dw labels by their names
+        :param symbols: dict - numbers of the instructions of the jump labels by their names
+        :param entry_point: int - address the program is meant to start at
+        :return: ObjectFile
+        """
+        if isa not in ISA_TABLES:
+            raise ObjectFileError(f"Unknown ISA: {isa}")
+        byte_size = ISA_TABLES[isa].instruction_size[2]
+
+        code = bitarray()
+        sizes = bytearray()
+        for line in binary_lines:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            if len(line) % byte_size or len(line) // byte_size > 255:
+                raise ObjectFileError(f"Not a valid instruction of {isa}: {line}")
+            code.extend(line)
+            sizes.append(len(line) // byte_size)
+
+        data = {name: value if isinstance(value, int) else tuple(value) for name, value in (data or {}).items()}
+        return cls(isa, entry_point, bytes(sizes), code.tobytes(), len(code), data, dict(symbols or {}))
+
+    @classmethod
+    def from_text(cls, isa, program_text, data=None, symbols=None, entry_point=DEFAULT_ENTRY_POINT):
+        """
+        Builds the object file from the text of the binary program file
+        :param isa: str - name of the ISA
+        :param program_text: str - text of the binary program file
+        :param data: dict - values of the db/dw labels by their names
+        :param symbols: dict - numbers of the instructions of the jump labels by their names
+        :param entry_point: int - address the program is meant to start at
+        :return: ObjectFile
+        """
+        return cls.from_lines(isa, program_text.split("\n"), data, symbols, entry_point)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        """
+        Reads the object file
+        :param blob: bytes - contents of the object file
+        :return: ObjectFile
+        """
+        view = memoryview(blob)
+        if len(view) < HEADER.size:
+            raise ObjectFileError("Not an object file: too short")
+        magic, version, isa_code, entry_point, count, code_length, data_count, symbols_count = HEADER.unpack_from(view)
+        if magic != OBJECT_MAGIC:
+            raise ObjectFileError("Not an object file")
+        if version != OBJECT_VERSION:
+            raise ObjectFileError(f"Unsupported version of the object file: {version}")
+        if isa_code >= len(ISA_NAMES):
+            raise ObjectFileError(f"Unknown ISA code in the object file: {isa_code}")
+
+        try:
+            offset = HEADER.size
+            sizes = bytes(view[offset:offset + count])
+            offset += count
+            code = bytes(view[offset:offset + (code_length + 7) // 8])
+            offset += (code_length + 7) // 8
+            if len(sizes) != count or len(code) != (code_length + 7) // 8:
+                raise ObjectFileError("The object file is cut short")
+
+            data = dict()
+            for _ in range(data_count):
+                name, offset = cls.__read_name(view, offset)
+                is_string, values_count = DATA_HEADER.unpack_from(view, offset)
+                offset += DATA_HEADER.size
+                values_view = view[offset:offset + values_count * DATA_VALUE.size]
+                if len(values_view) != values_count * DATA_VALUE.size:
+                    raise ObjectFileError("The object file is cut short")
+                values = tuple(value for value, in DATA_VALUE.iter_unpack(values_view))
+                offset += values_count * DATA_VALUE.size
+                data[name] = values if is_string else values[0]
+
+            symbols = dict()
+            for _ in range(symbols_count):
+                name, offset = cls.__read_name(view, offset)
+                symbols[name], = SYMBOL_VALUE.unpack_from(view, offset)
+                offset += SYMBOL_VALUE.size
+        except (struct.error, IndexError, UnicodeDecodeError):
+            raise ObjectFileError("The object file is damaged")
+
+        return cls(ISA_NAMES[isa_code], entry_point, sizes, code, code_length, data, symbols)
+
+    @staticmethod
+    def __read_name(view, offset):
+        """
+        Reads the name of the label
+        :param view: memoryview - contents of the object file
+        :param offset: int - where the name starts (with its length)
+        :return: (str, int) - the name, and where it ends
+        """
+        length, = NAME_LENGTH.unpack_from(view, offset)
+        offset += NAME_LENGTH.size
+        if offset + length > len(view):
+            raise ObjectFileError("The object file is cut short")
+        return str(view[offset:offset + length], "utf-8"), offset + length
+
+    def to_bytes(self):
+        """
+        Writes the object file
+        :return: bytes - contents of the object file
+        """
+        parts = [HEADER.pack(OBJECT_MAGIC, OBJECT_VERSION, ISA_NAMES.index(self.isa), self.entry_point,
+                             len(self.instruction_sizes), self.code_length, len(self.data), len(self.symbols)),
+                 self.instruction_sizes, self.code]
+
+        for name, value in self.data.items():
+            values = (value,) if isinstance(value, int) else value
+            parts += [self.__write_name(name), DATA_HEADER.pack(not isinstance(value, int), len(values))]
+            parts += [DATA_VALUE.pack(value) for value in values]
+
+        for name, number in self.symbols.items():
+            parts += [self.__write_name(name), SYMBOL_VALUE.pack(number)]
+
+        return b"".join(parts)
+
+    @staticmethod
+    def __write_name(name):
+        """
+        Writes the name of the label with its length
+        :param name: str - the name
+        :return: bytes
+        """
+        encoded = name.encode("utf-8")
+        if len(encoded) > 255:
+            raise ObjectFileError(f"The name of the label is too long: {name}")
+        return NAME_LENGTH.pack(len(encoded)) + encoded
+
+    def strip(self):
+        """
+        Drops the symbol table
+        :return: ObjectFile - the same program without the symbols
+        """
+        return self._replace(symbols=dict())
+
+    def bits(self):
+        """
+        Bits of the code of the program
+        :return: bitarray
+        """
+        code = bitarray()
+        code.frombytes(self.code)
+        del code[self.code_length:]
+        return code
+
+    def text(self):
+        """
+        Exports the program as the text of the binary program file, one instruction per line
+        :return: str - lines of '0' and '1' characters, each ending with a newline
+        """
+        code = self.bits().to01()
+        byte_size = ISA_TABLES[self.isa].instruction_size[2]
+
+        lines = []
+        start = 0
+        for size in self.instruction_sizes:
+            end = start + size * byte_size
+            lines.append(code[start:end] + "\n")
+            start = end
+        return "".join(lines)
+
+
+def is_object_file(blob):
+    """
+    Checks if the contents of the file are an object file, as opposed to the text of the binary program
+    :param blob: bytes - contents of the file (or at least its first bytes)
+    :return: bool
+    """
+    return bytes(blob[:len(OBJECT_MAGIC)]) == OBJECT_MAGIC
+
+
+class ObjectFileError(Exception):
+    """ Error raised when the object file can not be read or written """
@@ -7,7 +7,7 @@
 # This is the main module of the Hardware Simulator that processes binary instructions
 
 #     Emulates the work of a real computer with:
-#         * 64kib memory (in the future, now it's just 1kib)
+#         * paged memory of configurable size, up to 64KiB (1KiB by default)
 #         * processor registers
 #
 #     Is supposed to handle a few ISA architectures:
@@ -63,8 +63,10 @@
 # self.tos_start - Top Of the Register Stack (TOS) = 256 byte
 # (Grows incrementing, Shrinks decrementing)
 #
-# self.stack_start - Regular Stack = 65536 (last) byte  (for now it's 1024)
+# self.stack_start - Regular Stack = the end of the memory (memory_size, 1024 bytes by default, up to 65536)
 # (Grows decrementing, Shrinks incrementing)
+# With the full 64KiB of memory the end of the stack does not fit into 16 bits and is kept as 0, so the
+# Stack Pointer arithmetic is done modulo 2^16, and the first push goes to the last word of the memory
 
 # TODO: This module needs a lot of refactoring (after the available demo working properly), as
 #  it still has a lot of leftover curses functionality we are not going to need anymore,
@@ -87,17 +89,57 @@
 
 # TODO: Should we have a SIMD switch on / off for CISC?
 
-import os
-import json
+import time
 import curses
 import logging
+from itertools import accumulate
+from collections import namedtuple
 from bitarray import bitarray
-from bitarray.util import ba2hex
+from bitarray.util import ba2int, int2ba
 
-from modules.functions import functions_dictionary, twos_complement, bin_clean
-from modules.memory import Memory
+from modules.functions import twos_complement
+from modules.isa import ISA_TABLES
+from modules.int_functions import int_functions_dictionary, ZERO_FLAG, OVERFLOW_FLAG, SIGN_FLAG
+from modules.object_file import ObjectFile
+from modules.memory import Memory, SimulatorMemoryError, merge_ranges, PAGE_BITS, PAGE_SIZE
 from modules.register import Register
 from modules.shell import Shell
+from modules.snapshot import CPUSnapshot
+from modules.trace import TRACE_OFF, TRACE_SUMMARY, TRACE_FULL, TraceRecord
+from modules.profiler import Profiler, FETCH_PHASE, OPERANDS_PHASE, ALU_PHASE, WRITEBACK_PHASE
+from modules.history import History, UndoEntry, HISTORY_SIZE, CHECKPOINT_INTERVAL, MAX_CHECKPOINTS
+
+# Aliases of the operands which have values
+OPERAND_ALIASES = frozenset(["reg", "regoff", "memreg", "simdreg", "memregoff", "tos", "tospop", "tos2", "memtos",
+                             "memir", "memimm", "fr", "ir", "acc", "one"])
+
+# Number of written ranges of a memory kept apart before they are merged (see take_memory_changes)
+MEMORY_CHANGES_LIMIT = 1024
+
+# Execution modes of the CPU run: interpreting the instructions one by one, or executing the compiled basic blocks
+INTERPRETER_MODE = "interpreter"
+COMPILED_MODE = "compiled"
+# The longest straight run of instructions compiled into one block
+MAX_BLOCK_LENGTH = 64
+
+# Conditions of the jumps on the value of the flag register, both for interpreting and compiling the jumps
+# ('jc' checks its operand instead)
+JUMP_CONDITIONS = {"jmp": lambda flags: True,
+                   "je": lambda flags: flags & ZERO_FLAG,
+                   "jne": lambda flags: not flags & ZERO_FLAG,
+                   "jg": lambda flags: not flags & ZERO_FLAG and bool(flags & SIGN_FLAG) == bool(flags & OVERFLOW_FLAG),
+                   "jge": lambda flags: bool(flags & SIGN_FLAG) == bool(flags & OVERFLOW_FLAG),
+                   "jl": lambda flags: bool(flags & SIGN_FLAG) != bool(flags & OVERFLOW_FLAG),
+                   "jle": lambda flags: flags & ZERO_FLAG or bool(flags & SIGN_FLAG) != bool(flags & OVERFLOW_FLAG)}
+
+# The memory box of the curses interface fits the whole memory up to MEMORY_BOX_BYTES, the bigger memories are
+# shown as the lines of the pages written to, with their addresses, scrolled by the 'u' and 'd' keys
+MEMORY_BOX_BYTES = 1024
+MEMORY_BOX_LINES = 16
+MEMORY_LINE_BYTES = 32
+
+# Instruction tables built from the ISA registry by the first CPU of each ISA, shared by all the CPUs of the process
+instruction_tables_cache = dict()
 
 
 class CPU:
@@ -107,42 +149,47 @@ class CPU:
     Provides all arithmetics and memory manipulations
     """
 
-    def __init__(self, isa, architecture, io_arch, program_text, program_start=512, curses_mode=False, debug_mode=True):
+    def __init__(self, isa, architecture, io_arch, program_text, program_start=512, curses_mode=False, debug_mode=True,
+                 memory_size=1024):
         """
         Creates a new CPU.
         :param isa: chosen ISA
         :param architecture: chosen Architecture type
         :param io_arch: chosen Input/Output type
-        :param program_text: str - text of the binary program file
+        :param program_text: str - text of the binary program file, or ObjectFile with the assembled program
         :param program_start: location in the memory for the program code, as an offset from default
         :param curses_mode: bool - representing whether the app should draw curses interface or not
         :param debug_mode: bool - representing whether to log the information or not
+        :param memory_size: int - size of each of the memories in bytes, up to 64KiB
         :return: NoneType
         """
         self.isa = isa
         self.architecture = architecture
         self.io_arch = io_arch
         self.curses_mode = curses_mode
+        # The first line of the touched pages the curses interface shows, if the memory does not fit into its box
+        self.memory_scroll = 0
         self.instruction = bitarray('')
 
-        # Set up the logging module so it would save everything to a file
-        # (we are unable to track prints in real-time due to curses)
-        logging.basicConfig(filename="log.txt",
-                            filemode='w',
-                            format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
-                            datefmt='%H:%M:%S',
-                            level=logging.DEBUG)
-
         self.logger = logging.getLogger('processor')
 
-        # Disables the logger if we are not in debug mode
-        if not debug_mode:
-            self.logger.disabled = True
+        # The details of the execution are only logged in debug mode, and only if the application set the logging up
+        # to record them (like the CLI simulator does, saving everything to a file), see set_trace for the other options
+        self.trace_sink = None
+        self.trace_steps = 0
+        self.trace_level = TRACE_FULL if debug_mode and self.logger.isEnabledFor(logging.DEBUG) else TRACE_OFF
+
+        # Counters of the executed instructions and of the time spent executing them, see start_profiling
+        self.profiler = None
 
-        self.logger.debug(f"Created new CPU instance (ISA: {self.isa}, Architecture: {self.architecture}, "
-                          f"I/O: {self.io_arch}, CursesMode: {self.curses_mode})")
+        # Undo entries and checkpoints of the executed instructions, to go back to them, see start_history
+        self.history = None
 
-        self.memory_size = 1024
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"Created new CPU instance (ISA: {self.isa}, Architecture: {self.architecture}, "
+                              f"I/O: {self.io_arch}, CursesMode: {self.curses_mode})")
+
+        self.memory_size = memory_size
         # Create data and program memory according to the specified architecture
         if architecture in ["neumann", "harvardm"]:
             memory = Memory(self.memory_size)
@@ -156,22 +203,41 @@ class CPU:
         self.__create_registers()
 
         # Create devices for this CPU depending on the I/O architecture specified
-        if io_arch == "mmio":
-            shell = Shell(io_arch, start=1004, end=1024)
-        else:
-            shell = Shell(io_arch)
-        self.ports_dictionary = {"1": shell}
+        self.__create_devices()
 
-        # Opening the instruction set and choosing the one for our chosen ISA architecture
-        with open(os.path.join("modules", "instructions.json"), "r") as file:
-            self.instructions_dict = json.load(file)[self.isa]
+        # Choosing the instruction set for our chosen ISA architecture
+        self.instructions_dict = ISA_TABLES[self.isa].instructions
 
         # Determining the size of the instructions to read (size of the instruction, opcode size, byte size)
-        instruction_sizes = {"risc1": (6, 6, 6), "risc2": (8, 8, 8), "risc3": (16, 6, 8), "cisc": (8, 8, 8)}
-        self.instruction_size = instruction_sizes[self.isa]
+        self.instruction_size = ISA_TABLES[self.isa].instruction_size
+
+        # Instruction set entries with the handlers executing them, by opcode
+        # The handlers take the CPU they execute the instruction on, so all the CPUs of the ISA share the table
+        if (instruction_table := instruction_tables_cache.get(self.isa)) is None:
+            instruction_table = instruction_tables_cache[self.isa] = self.__build_instruction_table()
+        self.instruction_table = instruction_table
+
+        # Decoded instructions by the value of the Instruction Pointer, with the bounds (in bits) of the program memory
+        # they were decoded from, so we only have to check the writes into that part of the memory
+        self.decode_cache = dict()
+        self.decode_cache_low, self.decode_cache_high = self.program_memory.memory_size, 0
+        self.program_memory.write_listeners.append(self.__invalidate_decode_cache)
+
+        # Compiled basic blocks of the program by the value of the Instruction Pointer, dropped together with
+        # the decoded instructions they were compiled from, which changes the version of the program
+        self.execution_mode = COMPILED_MODE
+        self.block_cache = dict()
+        self.program_version = 0
+
+        # Byte ranges of the memories written since the last take_memory_changes call,
+        # so that the interface only has to redraw the parts of the memory that have changed
+        self.memory_changes = {"data": [], "program": []}
+        self.data_memory.write_listeners.append(self.__track_data_changes)
+        if self.program_memory is not self.data_memory:
+            self.program_memory.write_listeners.append(self.__track_program_changes)
 
         # Set the instruction pointer to the starting point of the program and load the specified program into memory
-        self.registers["IP"].write_data(bin(program_start)[2:])
+        self.registers["IP"].value = program_start
         self.__load_program(program_text)
         self.first_instruction = True
         self.is_input_active = False
@@ -198,8 +264,7 @@ class CPU:
         Create new registers depending on the ISA architecture specified
         :return: NoneType
         """
-        with open(os.path.join("modules", "registers.json"), "r") as file:
-            registers_list = json.load(file)[self.isa]
+        registers_list = ISA_TABLES[self.isa].registers
 
         self.registers = dict()
         self.register_codes = dict()
@@ -211,45 +276,170 @@ class CPU:
             # Remember the starting point of the 'register stack' or 'memory stack'
             if register[0] == "TOS":
                 self.tos_start = 256
-                temp.write_data(bin(self.tos_start)[2:])
             elif register[0] in ["SP", "BP"]:
-                self.stack_start = 1024
-                temp.write_data(bin(self.stack_start)[2:])
+                self.stack_start = self.memory_size
 
             self.registers[register[0]] = temp
             self.register_codes[register[2]] = temp
+        self.__reset_registers()
+
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"Created registers: {', '.join([register[0] for register in registers_list])}")
+
+    def __reset_registers(self):
+        """
+        Sets the registers to their starting values: the stack pointers to the start of their stacks, the rest to zero
+        """
+        for name, register in self.registers.items():
+            if name == "TOS":
+                register.value = self.tos_start
+            elif name in ["SP", "BP"]:
+                register.value = self.stack_start
+            else:
+                register.value = 0
+
+    def __create_devices(self):
+        """
+        Creates the devices of the CPU depending on the I/O architecture specified
+        """
+        if self.io_arch == "mmio":
+            # Memory-mapped devices take the last 20 bytes of the memory
+            shell = Shell(self.io_arch, start=self.memory_size - 20, end=self.memory_size)
+        else:
+            shell = Shell(self.io_arch)
+        self.ports_dictionary = {"1": shell}
 
-        self.logger.debug(f"Created registers: {', '.join([register[0] for register in registers_list])}")
+    def reset(self, program_text=None, program_start=None):
+        """
+        Brings the CPU back to the state it was created in, and loads the program again, without creating a new CPU
+        The memories are cleared, the registers and devices are set to their starting values, the settings
+        (like the execution mode and tracing) stay the same
+
+        :param program_text: str - text of the binary program file or ObjectFile, the same program is loaded again
+            if None
+        :param program_start: location in the memory for the program code, the same location is used if None
+        """
+        if program_text is None:
+            program_text = self.program_text
+        if program_start is None:
+            program_start = self.program_address
+
+        # The history starts anew, loading the program is not an instruction to undo
+        if self.history is not None:
+            self.history.clear()
+            self.data_memory.undo_log = self.program_memory.undo_log = None
+
+        self.data_memory.clear()
+        if self.program_memory is not self.data_memory:
+            self.program_memory.clear()
+
+        # Clearing the memory has dropped the decoded instructions from it, but the program is a new one altogether
+        self.decode_cache.clear()
+        self.decode_cache_low, self.decode_cache_high = self.program_memory.memory_size, 0
+        self.block_cache.clear()
+        self.program_version += 1
+
+        self.__reset_registers()
+        self.__create_devices()
+
+        # Forget everything about the instructions executed before, as if they never were
+        for name in CPUCheckpoint.attributes + ("long_registers", "long_immediates"):
+            self.__dict__.pop(name, None)
+        self.trace_steps = 0
+
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug("CPU was reset")
+
+        self.registers["IP"].value = program_start
+        self.__load_program(program_text)
+        self.first_instruction = True
+        self.is_input_active = False
+        self.instruction = bitarray('')
 
     def __load_program(self, program_text):
         """
         Loads the program into memory at Instruction Pointer
-        :param program_text: str - text of the binary program file
+        :param program_text: str - text of the binary program file, or ObjectFile with the assembled program
         """
+        ip_value = self.registers["IP"].value
+
+        # Object files already have the bits of the program and the sizes of the instructions, nothing to parse
+        if isinstance(program_text, ObjectFile):
+            if program_text.isa != self.isa:
+                raise SimulatorError(f"The program was assembled for {program_text.isa}, not {self.isa}")
+            code = program_text.bits()
+            # The text of the program ends with the newline, so the list of the sizes ends with 0 there too
+            instr_size_list = list(program_text.instruction_sizes) + [0]
+        else:
+            code = bitarray(program_text.replace('\n', ''))
+            instr_size_list = list(map(lambda x: len(x) // self.instruction_size[2], program_text.split('\n')))
+
         # Writing program instructions into to memory
-        ip_value = int(self.registers["IP"]._state.to01(), 2)
-        self.program_memory.write_data(ip_value * self.instruction_size[2], bitarray(program_text.replace('\n', '')))
+        self.program_memory.write_data(ip_value * self.instruction_size[2], code)
 
         # Determine the number of bytes for each instruction, and start at the beginning of the program (0th index)
-        self.instr_size_list = list(map(lambda x: len(x) // self.instruction_size[2], program_text.split('\n')))
+        self.instr_size_list = instr_size_list
         self.program_pointer = 0
-        self.logger.debug(f"Program was loaded into program memory starting at {ip_value} byte")
-        self.logger.debug(f"Instruction size list: {self.instr_size_list}")
+
+        # Offset of every instruction from the start of the program (and of the end of the program after them),
+        # so the distance of any jump is a single subtraction, and the instruction number of any address is known
+        self.program_text = program_text
+        self.program_address = ip_value
+        self.instr_offsets = list(accumulate(self.instr_size_list, initial=0))
+        self.instr_numbers = {offset: number for number, offset in enumerate(self.instr_offsets)}
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"Program was loaded into program memory starting at {ip_value} byte")
+            self.logger.debug(f"Instruction size list: {self.instr_size_list}")
+
+    def __program_length(self, start, end):
+        """
+        Length of the instructions of the program from start to end (not including), the same as
+        sum(self.instr_size_list[start:end]), but without going through the instructions
+        :param start: int - number of the first instruction
+        :param end: int - number of the instruction after the last one
+        :return: int - length in the units of the Instruction Pointer
+        """
+        start, end, _ = slice(start, end).indices(len(self.instr_size_list))
+        if end <= start:
+            return 0
+        return self.instr_offsets[end] - self.instr_offsets[start]
+
+    def __jump_distance(self, program_pointer, jump_num):
+        """
+        Finds how far the Instruction Pointer moves when jumping over a number of instructions
+        :param program_pointer: int - number of the instruction the jump is counted from
+        :param jump_num: int - number of instructions to jump over, negative for the backward jumps
+        :return: int - the change of the Instruction Pointer
+        """
+        if jump_num >= 0:
+            return self.__program_length(program_pointer, program_pointer + jump_num)
+        return -self.__program_length(program_pointer + jump_num, program_pointer)
+
+    def sync_program_pointer(self):
+        """
+        Points the program pointer at the instruction the Instruction Pointer is at, after the IP was changed
+        from the outside (like in the web interface). Leaves it as it is if the IP is not at any instruction
+        """
+        offset = self.registers["IP"].value - self.program_address
+        self.program_pointer = self.instr_numbers.get(offset, self.program_pointer)
 
     def web_next_instruction(self):
         """
         Executes the next instruction after button click on the webpage
         Only starts executing AFTER the first call, only reads the instruction on the first time
         """
-        self.logger.debug("Next instruction is executing")
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug("Next instruction is executing")
         # If the instruction is 'halt' - an empty string, terminate the execution
-        if isinstance(self.instruction, bitarray) and self.instruction.to01() == ('0' * self.instruction_size[0]):
-            self.logger.debug("Next instruction is 'halt' instruction")
+        if self.is_halted():
+            if self.trace_level == TRACE_FULL:
+                self.logger.debug("Next instruction is 'halt' instruction")
             return
 
         # If we are still waiting for input, we can't execute the next instruction
         if self.is_input_active:
-            self.logger.debug("Can't execute next instruction, CPU waits for the input")
+            if self.trace_level == TRACE_FULL:
+                self.logger.debug("Can't execute next instruction, CPU waits for the input")
             return
 
         if self.first_instruction:
@@ -264,72 +454,441 @@ class CPU:
         # Read first instruction of the program from the memory
         self.__read_instruction()
 
+    def run(self, max_steps=None, stop_on_halt=True, breakpoints=()):
+        """
+        Executes the program without any interface, until it halts, waits for the input,
+        reaches a breakpoint or runs out of steps
+        Can be called several times, as well as mixed with web_next_instruction calls
+
+        :param max_steps: int - the maximum number of instructions to execute, None for no limit
+        :param stop_on_halt: bool - whether to stop at the 'halt' instruction or to step over it like over 'nop'
+            (only possible with max_steps specified, as nothing else would stop the CPU then)
+        :param breakpoints: collection of instruction pointer values (in bytes) to stop before
+        :return: RunResult - steps executed, the reason of stopping, final IP and the shell output
+        """
+        if self.first_instruction:
+            self.first_instruction = False
+            self.__read_instruction()
+
+        breakpoints = frozenset(breakpoints)
+        ip_register = self.registers["IP"]
+        steps = 0
+
+        # The blocks don't stop after every instruction to record it, so they are only run without tracing
+        # and profiling (the history only takes the checkpoints between them, see __run_recorded_blocks)
+        compiled = self.execution_mode == COMPILED_MODE and self.trace_level == TRACE_OFF and self.profiler is None
+        while True:
+            if self.is_input_active:
+                halt_reason = "input"
+                break
+            if max_steps is not None and steps >= max_steps:
+                halt_reason = "max_steps"
+                break
+            if steps and ip_register.value in breakpoints:
+                halt_reason = "breakpoint"
+                break
+
+            if self.decoded.is_halt:
+                if stop_on_halt or max_steps is None:
+                    halt_reason = "halt"
+                    break
+                if self.history is not None:
+                    self.__record_step()
+                self.__step_over()
+                steps += 1
+            elif compiled and self.__block_fits(block := self.__find_block(ip_register.value),
+                                                 self.__blocks_steps_left(steps, max_steps), breakpoints):
+                if self.history is None:
+                    steps = self.__run_blocks(block, steps, max_steps, breakpoints)
+                else:
+                    steps = self.__run_recorded_blocks(block, steps, max_steps, breakpoints)
+            else:
+                self.__execute_instruction()
+                steps += 1
+            self.__read_instruction()
+
+        self.__update_devices()
+        return RunResult(steps, halt_reason, ip_register.value,
+                         " ".join(str(device) for device in self.ports_dictionary.values()))
+
+    def set_execution_mode(self, mode):
+        """
+        Chooses how the run method executes the program, the results are the same in both modes
+        The compiled mode executes the basic blocks of the program compiled into the chains of operations,
+        falling back to the interpreter for the instructions which need it (input, SIMD) and while tracing
+
+        :param mode: str - INTERPRETER_MODE or COMPILED_MODE
+        """
+        if mode not in (INTERPRETER_MODE, COMPILED_MODE):
+            raise SimulatorError(f"Unknown execution mode: {mode}")
+        self.execution_mode = mode
+
+    def is_halted(self):
+        """
+        Checks whether the CPU came to the 'halt' instruction
+        :return: bool
+        """
+        return not self.first_instruction and self.decoded.is_halt
+
+    def peek_next(self):
+        """
+        Finds out which instruction is going to be the current one after the next web_next_instruction call,
+        without changing the state of the CPU (only executes the current instruction if there is no other way to know)
+        :return: bitarray - the binary instruction
+        """
+        if self.first_instruction:
+            ip_value = self.registers["IP"].value
+            if (decoded := self.decode_cache.get(ip_value)) is None:
+                decoded = self.__decode_instruction(ip_value)
+            return decoded.instruction
+
+        # The CPU stays where it is if it halted or waits for the input
+        if self.decoded.is_halt or self.is_input_active:
+            return self.instruction
+
+        checkpoint = self.checkpoint()
+        trace_level, self.trace_level = self.trace_level, TRACE_OFF
+        memory_changes, self.memory_changes = self.memory_changes, {"data": [], "program": []}
+        history, self.history = self.history, None
+        undo_logs = self.data_memory.undo_log, self.program_memory.undo_log
+        self.data_memory.undo_log = self.program_memory.undo_log = None
+        try:
+            self.web_next_instruction()
+            return self.instruction
+        finally:
+            self.rollback(checkpoint)
+            self.trace_level = trace_level
+            self.memory_changes = memory_changes
+            self.history = history
+            self.data_memory.undo_log, self.program_memory.undo_log = undo_logs
+
+    def checkpoint(self):
+        """
+        Remembers the state of the CPU to come back to it later with rollback
+        Nothing is copied from the memory until it is written to
+
+        :return: CPUCheckpoint
+        """
+        state = {name: self.__dict__[name] for name in CPUCheckpoint.attributes if name in self.__dict__}
+        state["long_registers"] = list(self.long_registers) if "long_registers" in self.__dict__ else []
+        state["long_immediates"] = list(self.long_immediates) if "long_immediates" in self.__dict__ else []
+
+        program_pages = None
+        if self.program_memory is not self.data_memory:
+            program_pages = self.program_memory.snapshot()
+
+        return CPUCheckpoint({name: register.value for name, register in self.registers.items()},
+                             self.data_memory.snapshot(), program_pages,
+                             {port: bitarray(device._state) for port, device in self.ports_dictionary.items()}, state)
+
+    def rollback(self, checkpoint):
+        """
+        Brings the CPU back to the state remembered in the checkpoint
+        The checkpoint stays valid, so it is possible to come back to it several times
+
+        :param checkpoint: CPUCheckpoint - the result of the checkpoint method
+        """
+        for name, value in checkpoint.registers.items():
+            self.registers[name].value = value
+
+        self.data_memory.restore(checkpoint.data_pages)
+        if checkpoint.program_pages is not None:
+            self.program_memory.restore(checkpoint.program_pages)
+
+        for port, state in checkpoint.devices.items():
+            self.ports_dictionary[port]._state = bitarray(state)
+
+        self.__dict__.update(checkpoint.state)
+        self.long_registers = list(checkpoint.state["long_registers"])
+        self.long_immediates = list(checkpoint.state["long_immediates"])
+
+    def snapshot(self):
+        """
+        Saves the state of the CPU into a compact blob (see modules/snapshot.py), to restore it later, maybe
+        in another process, with restore or from_snapshot
+        Only the touched pages of the memories are saved, and nothing from the ISA tables, the current
+        instruction is decoded from the memory again on restore
+        The settings (like the execution mode, tracing and profiling) are not saved
+
+        :return: bytes
+        """
+        registers = list(self.registers.values())
+        input_destination = -1
+        if self.is_input_active:
+            input_destination = self.input_result_destination if self.memory_write_access else \
+                registers.index(self.input_result_destination)
+
+        memories = [self.data_memory]
+        if self.program_memory is not self.data_memory:
+            memories.append(self.program_memory)
+
+        return CPUSnapshot(self.isa, self.architecture, self.io_arch, self.memory_size, self.program_address,
+                           self.program_pointer, self.trace_steps, self.first_instruction, self.is_input_active,
+                           bool(self.__dict__.get("memory_write_access")), bool(self.__dict__.get("tos_push")),
+                           input_destination, tuple(register.value for register in registers), self.program_text,
+                           tuple({address >> PAGE_BITS: page for address, page in memory.touched_pages()}
+                                 for memory in memories),
+                           {port: device._state for port, device in self.ports_dictionary.items()}).to_bytes()
+
+    def restore(self, blob):
+        """
+        Brings the CPU back to the state saved by snapshot, the snapshot can be taken by any CPU with the same
+        ISA, architectures and memory size
+
+        :param blob: bytes - the result of the snapshot method
+        """
+        snapshot = CPUSnapshot.from_bytes(blob)
+        configuration = (snapshot.isa, snapshot.architecture, snapshot.io_arch, snapshot.memory_size)
+        if configuration != (self.isa, self.architecture, self.io_arch, self.memory_size):
+            raise SimulatorError(f"The snapshot was taken by another CPU (ISA, architecture, I/O, memory size: "
+                                 f"{', '.join(map(str, configuration))})")
+        if len(snapshot.registers) != len(self.registers):
+            raise SimulatorError("The snapshot does not have the registers of the ISA")
+
+        # Everything the snapshot does not have is set the way the program was loaded
+        self.reset(snapshot.program, snapshot.program_address)
+
+        self.data_memory.restore(snapshot.memories[0])
+        if self.program_memory is not self.data_memory and len(snapshot.memories) > 1:
+            self.program_memory.restore(snapshot.memories[1])
+
+        registers = list(self.registers.values())
+        for register, value in zip(registers, snapshot.registers):
+            register.value = value
+
+        for port, state in snapshot.devices.items():
+            if port in self.ports_dictionary:
+                self.ports_dictionary[port]._state = state
+
+        self.program_pointer = snapshot.program_pointer
+        self.trace_steps = snapshot.trace_steps
+        self.first_instruction = snapshot.first_instruction
+        self.is_input_active = snapshot.is_input_active
+        self.memory_write_access = snapshot.memory_write_access
+        self.tos_push = snapshot.tos_push
+        if snapshot.is_input_active:
+            self.input_result_destination = snapshot.input_destination if snapshot.memory_write_access else \
+                registers[snapshot.input_destination]
+
+        # The current instruction is the one at the Instruction Pointer, as it was read after the previous one
+        if not self.first_instruction:
+            self.__read_instruction()
+
+    @classmethod
+    def from_snapshot(cls, blob, debug_mode=True):
+        """
+        Creates the CPU in the state saved by snapshot
+        :param blob: bytes - the result of the snapshot method
+        :param debug_mode: bool - representing whether to log the information or not
+        :return: CPU
+        """
+        snapshot = CPUSnapshot.from_bytes(blob)
+        cpu = cls(snapshot.isa, snapshot.architecture, snapshot.io_arch, snapshot.program, snapshot.program_address,
+                  debug_mode=debug_mode, memory_size=snapshot.memory_size)
+        cpu.restore(blob)
+        return cpu
+
+    def take_memory_changes(self):
+        """
+        Returns the parts of the memories written since the previous call (or since the CPU was created)
+        and starts tracking the changes anew
+        :return: dict - lists of (start, end) byte ranges of the "data" and the "program" memory, end not included
+            (only "data" is used if the program shares the memory with the data)
+        """
+        changes = {name: merge_ranges(ranges) for name, ranges in self.memory_changes.items()}
+        self.memory_changes = {"data": [], "program": []}
+        return changes
+
+    def __track_data_changes(self, start_location, end_location):
+        """
+        Remembers the write into the data memory
+        :param start_location: int - start of the written range, in bits
+        :param end_location: int - end of the written range, in bits
+        """
+        CPU.__track_changes(self.memory_changes["data"], start_location, end_location)
+
+    def __track_program_changes(self, start_location, end_location):
+        """
+        Remembers the write into the program memory
+        :param start_location: int - start of the written range, in bits
+        :param end_location: int - end of the written range, in bits
+        """
+        CPU.__track_changes(self.memory_changes["program"], start_location, end_location)
+
+    @staticmethod
+    def __track_changes(ranges, start_location, end_location):
+        """
+        Adds the written range to the list of changes, keeping the list short
+        :param ranges: list of (start, end) byte ranges
+        :param start_location: int - start of the written range, in bits
+        :param end_location: int - end of the written range, in bits
+        """
+        ranges.append((start_location >> 3, (end_location + 7) >> 3))
+        if len(ranges) > MEMORY_CHANGES_LIMIT:
+            ranges[:] = merge_ranges(ranges)
+
+            # Scattered writes are covered with one range, redrawing a bit more than needed
+            if len(ranges) > MEMORY_CHANGES_LIMIT // 2:
+                ranges[:] = [(ranges[0][0], ranges[-1][1])]
+
     def __read_instruction(self):
         """
         Reads the instruction and the opcode in it for a specified ISA
         Reads a long immediate encoded in the next byets if the ISA uses those
         Does not actually move the instruction pointer to the next instruction
+
+        Decoded instructions are kept in the decode cache, so the bits of the same instruction are
+        only decoded once, unless the program memory under them gets overwritten
+        """
+        if self.profiler is not None:
+            start = time.perf_counter()
+        decoded = self.__cached_decode(self.registers["IP"].value)
+
+        self.decoded = decoded
+        self.instruction = decoded.instruction
+        self.opcode = decoded.opcode
+        self.additional_jump = decoded.additional_jump
+
+        # These are popped while adding the operands, so every execution gets its own copy
+        self.long_registers = list(decoded.long_registers)
+        self.long_immediates = list(decoded.long_immediates)
+        if decoded.long_registers:
+            self.long_register_result = decoded.long_register_result
+        if decoded.long_immediates:
+            self.long_immediate_result = decoded.long_immediate_result
+
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(decoded.printout)
+        if self.profiler is not None:
+            self.profiler.phase_times[FETCH_PHASE] += time.perf_counter() - start
+
+    def __cached_decode(self, ip_value):
+        """
+        Returns the decoded instruction located at the specified value of the Instruction Pointer from the decode
+        cache, decoding it and saving it there if needed
+        :param ip_value: int - value of the Instruction Pointer (in bytes)
+        :return: DecodedInstruction - the decoded instruction record
+        """
+        if (decoded := self.decode_cache.get(ip_value)) is None:
+            decoded = self.__decode_instruction(ip_value)
+            self.decode_cache[ip_value] = decoded
+            self.decode_cache_low = min(self.decode_cache_low, decoded.start)
+            self.decode_cache_high = max(self.decode_cache_high, decoded.end)
+        return decoded
+
+    def __decode_instruction(self, ip_value):
+        """
+        Decodes the instruction located at the specified value of the Instruction Pointer
+        :param ip_value: int - value of the Instruction Pointer (in bytes)
+        :return: DecodedInstruction - the decoded instruction record
         """
         register_reader, constant_reader = 0, 0
-        start_read_location = int(self.registers["IP"]._state.to01(), 2) * self.instruction_size[2]
-        self.instruction = self.program_memory.read_data(start_read_location,
-                                                         start_read_location + self.instruction_size[0])
+        start_read_location = ip_value * self.instruction_size[2]
+        decoded = DecodedInstruction(start_read_location)
+
+        instruction = self.program_memory.read_data(start_read_location,
+                                                    start_read_location + self.instruction_size[0])
         start_read_location += self.instruction_size[0]
 
         # Read the opcode part of the instruction
-        self.opcode = self.instruction[0:self.instruction_size[1]]
+        opcode = instruction[0:self.instruction_size[1]]
+        decoded.instruction = instruction
+        decoded.opcode = opcode
+        decoded.opcode_key = opcode.to01()
+        decoded.is_halt = not instruction.any()
 
         # If the first bit of the encoded binary instruction indicates that the next two
         # bytes are going to be an immediate constant, change the read_state
-        if self.isa in ["risc1", "risc2"] and self.opcode[0]:
+        if self.isa in ["risc1", "risc2"] and opcode[0]:
             constant_reader = 1
         elif self.isa == "cisc":
             # Styles of CISC architecture with counters for register and constant readers
             # {"STYLECODE": (Register counter, constant counter)}
             cisc_styles = {"000": (1, 0), "001": (0, 0), "010": (0, 1), "011": (2, 0), "100": (1, 1), "101": (2, 1),
                            "110": (1, 2)}
-            register_reader, constant_reader = cisc_styles[self.opcode[0:3].to01()]
+            register_reader, constant_reader = cisc_styles[opcode[0:3].to01()]
 
-        self.additional_jump = 0
+        additional_jump = 0
 
-        printout_temp = f"FETCH: Instruction: {self.instruction.to01()}, Opcode: {self.opcode.to01()}"
+        printout_temp = f"FETCH: Instruction: {instruction.to01()}, Opcode: {decoded.opcode_key}"
 
         # Read all the registers additionally recorded after the opcode
+        long_registers = []
         if register_reader > 0:
-            self.long_registers = self.program_memory.read_data(start_read_location,
-                                                                start_read_location + self.instruction_size[2]).to01()
+            long_registers = self.program_memory.read_data(start_read_location,
+                                                           start_read_location + self.instruction_size[2]).to01()
 
             # This needs to be reversed because we pop from the end of it
             if register_reader == 2:
-                self.long_registers = [self.long_registers[3:6], self.long_registers[0:3]]
+                long_registers = [long_registers[3:6], long_registers[0:3]]
             else:
-                self.long_registers = [self.long_registers[0:3]]
+                long_registers = [long_registers[0:3]]
 
             # Saving the register which is going to save the result of the operation
-            self.long_register_result = self.long_registers[-1]
+            decoded.long_register_result = long_registers[-1]
             start_read_location += self.instruction_size[2]
-            printout_temp += f", Long registers: {self.long_registers}"
-            self.additional_jump += 1
+            printout_temp += f", Long registers: {long_registers}"
+            additional_jump += 1
 
-        self.long_immediates = []
+        long_immediates = []
         # If we are in the state of reading the two-byte encoded immediate constant,
         # read it and add to the list of operands
         for _ in range(constant_reader):
-            temp = self.program_memory.read_data(start_read_location,
-                                                 start_read_location + 2 * self.instruction_size[2])
+            immediate_length = 2 * self.instruction_size[2]
+            immediate = ba2int(self.program_memory.read_data(start_read_location,
+                                                             start_read_location + immediate_length))
             # In order to turn 12-bit signed number into 16-bit signed number, we copy the sign bit into all high bits
-            self.long_immediates.append(bitarray(temp.to01().rjust(16, temp.to01()[0])))
-            # Saving the first long immediate which might point to the device port
-            self.long_immediate_result = self.long_immediates[0]
-            start_read_location += 2 * self.instruction_size[2]
+            if immediate >> (immediate_length - 1):
+                immediate |= 0xFFFF ^ ((1 << immediate_length) - 1)
+            long_immediates.append(immediate)
+            start_read_location += immediate_length
 
-            self.additional_jump += 2
-            printout_temp += f", Long immediate constant: {self.long_immediates[-1].to01()}"
+            additional_jump += 2
+            printout_temp += f", Long immediate constant: {immediate:016b}"
+
+        # Saving the first long immediate which might point to the device port
+        if long_immediates:
+            decoded.long_immediate_result = long_immediates[0]
 
         # This needs to be reversed because we pop from the end of it
-        self.long_immediates.reverse()
+        long_immediates.reverse()
+
+        decoded.long_registers = tuple(long_registers)
+        decoded.long_immediates = tuple(long_immediates)
+        decoded.additional_jump = additional_jump
+        decoded.end = start_read_location
+        decoded.printout = printout_temp
 
-        self.logger.debug(printout_temp)
+        # The opcode details were figured out from the instruction set when the CPU was created
+        if (entry := self.instruction_table.get(decoded.opcode_key)) is not None:
+            (decoded.name, decoded.res_type, decoded.operands_aliases, decoded.operands_widths,
+             decoded.function, decoded.start_point, decoded.handler) = entry
+
+        return decoded
+
+    def __invalidate_decode_cache(self, start_location, end_location):
+        """
+        Drops the decoded instructions overlapping with the range of program memory written to
+        Called by the program memory on every write
+
+        :param start_location: int - start of the written range, in bits
+        :param end_location: int - end of the written range, in bits
+        """
+        if end_location <= self.decode_cache_low or start_location >= self.decode_cache_high:
+            return
+
+        invalidated = False
+        for ip_value, decoded in list(self.decode_cache.items()):
+            if decoded.start < end_location and start_location < decoded.end:
+                del self.decode_cache[ip_value]
+                invalidated = True
+
+        # The blocks compiled from the dropped instructions are dropped as well
+        if invalidated:
+            self.block_cache.clear()
+            self.program_version += 1
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"Decode cache invalidated by a write to memory[{start_location}:{end_location}]")
 
     def __execute_cycle(self):
         """
@@ -340,26 +899,227 @@ class CPU:
         if self.curses_mode:
             is_close = self.curses_next_instruction()
 
-        # Executing the instruction if it's not a 'nop' - no operation instruction
-        if (instr_name := self.instructions_dict[self.opcode.to01()][0]) == "nop":
-            self.logger.debug('NOP OPERATION')
-            go_to_next_instruction = True
+        self.__execute_instruction()
+        return is_close
+
+    def __execute_instruction(self):
+        """
+        Executes the current decoded instruction and moves the instruction pointer to the next one if needed
+        """
+        if self.decoded.name is None:
+            raise SimulatorError(f"Unknown instruction opcode: {self.decoded.opcode_key}")
+
+        ip_value = self.registers["IP"].value
+        if self.history is not None:
+            self.__record_step()
+        if (profiler := self.profiler) is not None:
+            # Everything the handler does apart from reading the operands and computing the result is the writeback
+            profiler.count(ip_value, self.decoded.opcode_key)
+            phase_times = profiler.phase_times
+            measured = phase_times[OPERANDS_PHASE] + phase_times[ALU_PHASE]
+            start = time.perf_counter()
+            go_to_next_instruction = self.execute()
+            phase_times[WRITEBACK_PHASE] += time.perf_counter() - start - (
+                    phase_times[OPERANDS_PHASE] + phase_times[ALU_PHASE] - measured)
         else:
             go_to_next_instruction = self.execute()
 
-        self.logger.debug("FINISH decoding and executing the instruction")
-        registers_state = ', '.join([f'{name}: {ba2hex(register._state)}' for name, register in self.registers.items()])
-        self.logger.debug(F"Registers state: {registers_state}")
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug("FINISH decoding and executing the instruction")
         if go_to_next_instruction:
-            ip_val = int(self.registers["IP"]._state.to01(), 2)
-            bytes_per_instruction = self.instruction_size[0] // self.instruction_size[2]
-            ip_val = bin(ip_val + bytes_per_instruction + self.additional_jump)[2:]
-            self.program_pointer += 1
-            self.registers["IP"].write_data(ip_val)
-            self.logger.debug("MOVE IP to the next instruction")
+            self.__step_over()
 
-        self.logger.debug("-" * 100)
-        return is_close
+        if self.trace_level:
+            self.__trace_instruction(ip_value)
+
+    def __trace_instruction(self, ip_value):
+        """
+        Records the instruction executed
+        :param ip_value: int - value of the Instruction Pointer before the execution
+        """
+        if self.trace_sink is not None:
+            registers = tuple(register.value for register in self.registers.values())
+            self.trace_sink(TraceRecord(self.trace_steps, ip_value, ba2int(self.decoded.opcode), registers))
+        self.trace_steps += 1
+
+        if self.trace_level == TRACE_FULL:
+            registers_state = ', '.join([f'{name}: {register.value:04x}' for name, register in self.registers.items()])
+            self.logger.debug(F"Registers state: {registers_state}")
+            self.logger.debug("-" * 100)
+
+    def set_trace(self, level, sink=None):
+        """
+        Sets up the tracing of the program execution (see modules/trace.py)
+
+        :param level: int - TRACE_OFF, TRACE_SUMMARY or TRACE_FULL
+        :param sink: callable taking a TraceRecord for every executed instruction, like a TraceBuffer,
+            required for the summary level, and optional for the full one, which logs the details with the logger
+        """
+        if level not in (TRACE_OFF, TRACE_SUMMARY, TRACE_FULL):
+            raise SimulatorError(f"Unknown trace level: {level}")
+        if level == TRACE_SUMMARY and sink is None:
+            raise SimulatorError("Summary trace needs a trace sink to record into")
+
+        self.trace_level = level
+        self.trace_sink = sink if level != TRACE_OFF else None
+        self.trace_steps = 0
+
+    def start_profiling(self):
+        """
+        Starts counting the executed instructions and the time spent in the phases of their execution
+        (see modules/profiler.py), the program is interpreted instruction by instruction while profiling
+
+        :return: Profiler - with all the counters at zero
+        """
+        self.profiler = Profiler(self.instructions_dict, self.memory_size * 8 // self.instruction_size[2])
+        return self.profiler
+
+    def stop_profiling(self):
+        """
+        Stops profiling, the CPU does not spend any time on it anymore
+        :return: Profiler - the counters, or None if the CPU was not profiling
+        """
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    def start_history(self, max_entries=HISTORY_SIZE, checkpoint_interval=CHECKPOINT_INTERVAL,
+                      max_checkpoints=MAX_CHECKPOINTS):
+        """
+        Starts recording the executed instructions, to go back to them with step_back and goto_step
+        (see modules/history.py), the run method keeps executing the compiled blocks, recording only
+        the checkpoints between them
+        The instruction executed next is the step 0, rollback and changing the registers between the instructions
+        are not recorded (the writes into the memory are undone together with the previous instruction)
+
+        :param max_entries: int - the number of the last instructions it is possible to undo one by one
+        :param checkpoint_interval: int - the number of the instructions between the checkpoints
+        :param max_checkpoints: int - the number of the last checkpoints to keep, going back further than
+            the undo entries reach starts from them
+        :return: History - empty
+        """
+        self.stop_history()
+        self.history = History(max_entries, checkpoint_interval, max_checkpoints)
+        return self.history
+
+    def stop_history(self):
+        """
+        Stops recording the executed instructions, forgetting them
+        :return: History - the recorded history, or None if the CPU was not recording it
+        """
+        history, self.history = self.history, None
+        self.data_memory.undo_log = self.program_memory.undo_log = None
+        return history
+
+    def step_back(self, steps=1):
+        """
+        Goes back to the state before the last executed instructions, or as far back as the history reaches
+        :param steps: int - the number of the instructions to go back
+        :return: int - the number of the instructions it went back
+        """
+        history = self.__require_history()
+        step = history.step
+        return step - self.goto_step(max(step - steps, history.earliest_step))
+
+    def goto_step(self, step):
+        """
+        Brings the CPU to the state before the instruction with the number specified: back by the undo entries
+        or from the nearest checkpoint, or forward, executing the instructions (giving the program the same input
+        it got before, if it did)
+        The instructions are interpreted going forward, to record the undo entries of every one of them
+        Stops earlier going forward if the program halts or waits for the input it did not get before
+
+        :param step: int - the number of the instruction, counting from the start of the recording
+        :return: int - the step the CPU came to
+        """
+        history = self.__require_history()
+        if step < history.earliest_step:
+            raise SimulatorError(f"Step {step} is too far back in the history (the earliest is "
+                                 f"{history.earliest_step})")
+
+        if step < history.step - len(history.entries):
+            checkpoint_step, checkpoint = history.checkpoint_before(step)
+            self.rollback(checkpoint)
+            history.entries.clear()
+            history.step = checkpoint_step
+            self.data_memory.undo_log = self.program_memory.undo_log = None
+
+        while history.step > step:
+            self.__undo_step(history.entries.pop())
+            history.step -= 1
+        history.forget_after(history.step)
+
+        execution_mode, self.execution_mode = self.execution_mode, INTERPRETER_MODE
+        try:
+            while True:
+                if self.is_input_active and (character := history.inputs.get(history.step)) is not None:
+                    self.input_finish(character)
+                if history.step >= step or self.is_input_active or self.is_halted():
+                    break
+                self.run(max_steps=step - history.step)
+        finally:
+            self.execution_mode = execution_mode
+
+        # The run does not update the memory-mapped devices after every instruction, and neither do the entries
+        # it recorded
+        self.__update_devices()
+        return history.step
+
+    def __require_history(self):
+        """
+        Checks that the CPU records the history
+        :return: History
+        """
+        if self.history is None:
+            raise SimulatorError("The CPU does not record the history, start_history first")
+        return self.history
+
+    def __record_step(self):
+        """
+        Remembers the state of the CPU before the instruction in the history, and starts saving the writes
+        into the memory into the undo entry of the instruction
+        """
+        history = self.history
+        if not history.steps_to_checkpoint():
+            history.add_checkpoint(self.checkpoint())
+
+        state = {name: self.__dict__[name] for name in CPUCheckpoint.attributes if name in self.__dict__}
+        state["long_registers"] = list(self.long_registers)
+        state["long_immediates"] = list(self.long_immediates)
+        memory_writes = []
+        history.entries.append(UndoEntry(tuple(register.value for register in self.registers.values()),
+                                         {port: bitarray(device._state) for port, device in
+                                          self.ports_dictionary.items()}, state, memory_writes))
+        self.data_memory.undo_log = self.program_memory.undo_log = memory_writes
+        history.step += 1
+
+    def __undo_step(self, entry):
+        """
+        Brings the CPU back to the state before the instruction
+        :param entry: UndoEntry - the entry of the instruction, taken out of the history
+        """
+        self.data_memory.undo_log = self.program_memory.undo_log = None
+        for memory, address, data in reversed(entry.memory_writes):
+            memory.write_bytes(address, data)
+
+        for register, value in zip(self.registers.values(), entry.registers):
+            register.value = value
+        for port, state in entry.devices.items():
+            self.ports_dictionary[port]._state = state
+        self.__dict__.update(entry.state)
+
+        # Writes from now on (like the input) are undone together with the previous instruction
+        if self.history.entries:
+            self.data_memory.undo_log = self.program_memory.undo_log = self.history.entries[-1].memory_writes
+
+    def __step_over(self):
+        """
+        Moves the instruction pointer to the instruction following the current one
+        """
+        bytes_per_instruction = self.instruction_size[0] // self.instruction_size[2]
+        self.program_pointer += 1
+        self.registers["IP"].value += bytes_per_instruction + self.additional_jump
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug("MOVE IP to the next instruction")
 
     def __update_devices(self):
         """
@@ -368,7 +1128,9 @@ class CPU:
         # TODO: I think we've never properly tested this? I know this SHOULD work, but anyhow
         for port, device in self.ports_dictionary.items():
             if device.io_type == "mmio":
-                self.logger.debug(f"Updating mmio device at {port}, memory[{device.start_point}:{device.end_point}]")
+                if self.trace_level == TRACE_FULL:
+                    self.logger.debug(f"Updating mmio device at {port}, "
+                                      f"memory[{device.start_point}:{device.end_point}]")
                 data = self.data_memory.read_data(device.start_point * 8, device.end_point * 8)
                 device._state = data
 
@@ -378,289 +1140,483 @@ class CPU:
         result and saving it in the proper place
         :return: bool - whether to go to the next instruction
         """
-        self.logger.debug("START decoding and executing the instruction")
-        # The return value that tells whether we should go to the next instruction after the execution
-        go_to_next_instruction = True
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug("START decoding and executing the instruction")
+            self.logger.debug(f"INST INFO, <{self.decoded.name}> Operands Aliases: {self.decoded.operands_aliases}")
 
-        # Determine the point in the binary instruction where operands start
-        start_point = self.__determine_start_point()
+        # The handler was chosen for this opcode when the CPU was created
+        return self.decoded.handler(self)
 
-        # Reading the list of operands encoded in the binary instruction
-        if self.isa in ["risc3", "cisc"]:
-            operands_aliases = self.instructions_dict[self.opcode.to01()][-1]
-        elif self.isa == "risc1":
-            operands_aliases = self.instructions_dict[self.opcode.to01()][1][1:]
-        else:
-            operands_aliases = self.instructions_dict[self.opcode.to01()][1]
-        self.logger.debug(f"INST INFO, <{self.instructions_dict[self.opcode.to01()][0]}> "
-                          f"Operands Aliases: {operands_aliases}")
+    def __build_instruction_table(self):
+        """
+        Builds the table of the instructions of the chosen ISA by their opcodes, once per CPU
+        Everything that only depends on the opcode is figured out here, including the handler executing the
+        instruction, so nothing has to be looked up by the instruction name or type while running the program
 
-        # Get the values of the operands for this function
-        operands_values = self.__add_operands(start_point, operands_aliases)
-        self.logger.debug(f"INST INFO Operands Values: {', '.join([op.to01() for op in operands_values])}")
+        :return: dict - {opcode: InstructionEntry}
+        """
+        instruction_table = dict()
+        for opcode, instruction_info in self.instructions_dict.items():
+            name = instruction_info[0]
+
+            # Different architectures have different kinds of instructions encodings
+            if self.isa in ["risc3", "cisc"]:
+                res_type, operands_aliases = instruction_info[1], instruction_info[-1]
+            elif name in ["halt", "nop"]:
+                res_type, operands_aliases = name, []
+            elif self.isa == "risc1":
+                res_type, operands_aliases = instruction_info[1][0], instruction_info[1][1:]
+            else:
+                res_type, operands_aliases = instruction_info[1][0], instruction_info[1]
 
-        # Determine whether the memory is going to be affected as a
-        # result of the operation and where to save it
-        memory_write_access, result_destination, tos_push = self.__determine_result_dest(start_point, operands_aliases)
-        self.logger.debug(f"INST INFO (Memory Write Access: {memory_write_access}, "
-                          f"Destination: {result_destination}, TOS_Push: {tos_push})")
+            # Widths of the values the operands are read as, the ALU depends on them
+            operands_widths = [self.__determine_operand_width(operand) for operand in operands_aliases
+                               if operand in OPERAND_ALIASES or operand.startswith("imm")]
 
-        # Different architectures have different kinds of instructions encodings
-        if self.isa in ["risc3", "cisc"]:
-            res_type = self.instructions_dict[self.opcode.to01()][1]
-        else:
-            res_type = self.instructions_dict[self.opcode.to01()][1][0]
+            start_point = self.__determine_start_point(name)
+            handler = self.__create_handler(res_type, start_point, operands_aliases)
+            instruction_table[opcode] = InstructionEntry(name, res_type, operands_aliases, operands_widths,
+                                                         int_functions_dictionary.get(name), start_point, handler)
 
-        # If the opcode type is call, we can perform the needed actions without calling functions_dict
-        if res_type == "call":
+        return instruction_table
 
-            # Remember the next instruction after the one which called the 'call' function
-            next_instruction = self.program_pointer + 1
-            if self.isa == "risc3":
-                self.registers["LR"].write_data(bin(next_instruction)[2:])
-            else:
-                self.__push_stack(bitarray(bin(next_instruction)[2:].rjust(16, '0')))
-
-            # There is only one operand for a call function, and it determines the program_start from the IP
-            operand = operands_aliases[0]
-            if operand.startswith("imm") or ((len(operands_aliases) > 1) and operands_aliases[1] == "imm"):
-                if self.isa == "risc3":
-                    # Calculate the new location of the instruction pointer, change it
-                    imm_len = int(operand[3:])
-                    jump_num = twos_complement(int(operands_values[0].to01(), 2), imm_len)
-                elif self.isa == "cisc":
-                    jump_num = twos_complement(int(operands_values[0].to01(), 2), 16)
-                else:
-                    jump_num = twos_complement(int(self.long_immediate_result.to01(), 2), self.instruction_size[0] * 2)
-            elif operand in ["reg", "tos", "acc", "regoff"] or operands_aliases[1] == "acc":
-                jump_num = twos_complement(int(operands_values[0].to01(), 2), 16)
+    @staticmethod
+    def __determine_operand_width(operand):
+        """
+        Determines the width of the value of the operand
+        :param operand: str - alias of the operand
+        :return: int - the width in bits
+        """
+        # Immediate constants encoded in RISC-Register instructions are narrower than the rest of the values
+        if operand.startswith("imm") and operand[3:]:
+            return int(operand[3:])
+        elif operand == "simdreg":
+            return 64
+        return 16
+
+    def __create_handler(self, res_type, start_point, operands_aliases):
+        """
+        Creates the handler executing the instructions of the specified type
+        The handler takes the CPU as its only argument instead of being bound to this one,
+        so the copies of the CPU can share the instruction table
 
-            # Calculate the new program_start in instructions
-            if jump_num >= 0:
-                jump_distance = sum(self.instr_size_list[self.program_pointer:self.program_pointer + jump_num])
-            else:
-                jump_distance = -1 * sum(self.instr_size_list[self.program_pointer + jump_num:self.program_pointer])
+        :param res_type: str - type of the instruction from the instruction set
+        :param start_point: int - the point in the instruction where operands' encodings start
+        :param operands_aliases: list of aliases for the operands encoded in binary
+        :return: function(CPU) -> bool, whether to go to the next instruction
+        """
+        if res_type in ["halt", "nop"]:
+            return CPU.__execute_nop
 
-            # Change the instruction pointer
-            ip_value = int(self.registers["IP"]._state.to01(), 2)
-            self.registers["IP"].write_data(bin(ip_value + jump_distance)[2:])
-            self.program_pointer += jump_num
-            self.logger.debug(f"INST INFO: <call> (Distance: {jump_num}, Bytes: {jump_distance}, "
-                              f"Bits: {jump_distance * self.instruction_size[2]})")
+        action = CPU.__choose_action(res_type)
+        destination = self.__choose_destination(res_type, operands_aliases)
+
+        def handler(cpu):
+            if cpu.profiler is not None:
+                start = time.perf_counter()
+
+            # Get the values of the operands for this function
+            operands_values = cpu.__add_operands(start_point, operands_aliases)
+            if cpu.trace_level == TRACE_FULL:
+                cpu.logger.debug(f"INST INFO Operands Values: {', '.join([f'{op:04x}' for op in operands_values])}")
+
+            # Determine whether the memory is going to be affected as a
+            # result of the operation and where to save it
+            memory_write_access, result_destination, tos_push = destination(cpu, start_point, operands_aliases)
+            if cpu.trace_level == TRACE_FULL:
+                cpu.logger.debug(f"INST INFO (Memory Write Access: {memory_write_access}, "
+                                 f"Destination: {result_destination}, TOS_Push: {tos_push})")
+            if cpu.profiler is not None:
+                cpu.profiler.phase_times[OPERANDS_PHASE] += time.perf_counter() - start
+
+            return action(cpu, operands_values, memory_write_access, result_destination, tos_push)
+
+        return handler
+
+    @staticmethod
+    def __choose_action(res_type):
+        """
+        Chooses the action executing the instructions of the specified type
+        :param res_type: str - type of the instruction from the instruction set
+        :return: function(CPU, operands_values, memory_write_access, result_destination, tos_push) -> bool
+        """
+        actions = {"call": CPU.__execute_call, "ret": CPU.__execute_ret, "jmp": CPU.__execute_jmp,
+                   "enter": CPU.__execute_enter, "leave": CPU.__execute_leave, "stackpush": CPU.__execute_stackpush,
+                   "stackpop": CPU.__execute_stackpop, "stackpopf": CPU.__execute_stackpop,
+                   "out": CPU.__execute_out, "in": CPU.__execute_in, "swap": CPU.__execute_swap}
+        if res_type.startswith("simd"):
+            return CPU.__execute_simd
+        return actions.get(res_type, CPU.__execute_alu)
+
+    def __choose_destination(self, res_type, operands_aliases):
+        """
+        Chooses the way to determine where to save the result of the instructions of the specified type
+
+        :param res_type: str - type of the instruction from the instruction set
+        :param operands_aliases: list of aliases for the operands encoded in binary
+        :return: function(CPU, start_point, operands_aliases) -> (memory_write_access, result_destination, tos_push)
+        """
+        # RISC-Stack ISA
+        if self.isa == "risc1":
+            if res_type in ["tos", "in", "swap", "stackpop"]:
+                return CPU.__tos_destination
+            elif res_type == "memtos":
+                return CPU.__memtos_destination
+            elif res_type in ["fr", "stackpopf"]:
+                return CPU.__register_destination("FR")
+            elif res_type == "out":
+                return CPU.__port_destination
+
+        # Accumulator-RISC
+        elif self.isa == "risc2":
+            if res_type in ["acc", "in"]:
+                return CPU.__register_destination("ACC")
+            elif res_type == "stackpop":
+                return CPU.__register_destination(operands_aliases[1].upper())
+            elif res_type == "memir":
+                return CPU.__memir_destination
+            elif res_type == "out":
+                return CPU.__port_destination
+            elif res_type in ["cmp", "fr"]:
+                return CPU.__register_destination("FR")
+            elif res_type == "ir":
+                return CPU.__register_destination("IR")
+
+        # Register-RISC and CISC architectures
+        elif self.isa in ["risc3", "cisc"]:
+            if res_type in ["firstop", "in", "stackpop", "simd", "simdstore"]:
+                return CPU.__first_operand_destination
+            elif res_type == "flags":
+                return CPU.__register_destination("FR")
+            elif res_type == "out":
+                return CPU.__device_destination
+
+        return CPU.__no_destination
+
+    # Destinations of the results of the instructions, each returns (memory_write_access, result_destination, tos_push)
+    def __no_destination(self, start_point, operands_aliases):
+        """ The instruction does not save any result """
+        return False, None, False
+
+    def __tos_destination(self, start_point, operands_aliases):
+        """ The result is pushed onto the register stack (RISC-Stack) """
+        return True, self.registers["TOS"].value, True
+
+    def __memtos_destination(self, start_point, operands_aliases):
+        """ The result is saved into the memory at the address popped from the register stack (RISC-Stack) """
+        return True, self.__pop_tos(pop=True), False
+
+    def __memir_destination(self, start_point, operands_aliases):
+        """ The result is saved into the memory at the address in the Index Register (RISC-Accumulator) """
+        return True, self.registers["IR"].value, False
+
+    def __port_destination(self, start_point, operands_aliases):
+        """ The result is outputted to the device at the port in the long immediate (RISC-Stack, RISC-Accumulator) """
+        return False, self.ports_dictionary[str(self.long_immediate_result)], False
+
+    @staticmethod
+    def __register_destination(register_name):
+        """
+        Creates the destination saving the result into the specified register
+        :param register_name: str - name of the register
+        """
+        def destination(cpu, start_point, operands_aliases):
+            return False, cpu.registers[register_name], False
 
-            go_to_next_instruction = False
+        return destination
 
-        # If the opcode type is return, we just move the instruction pointer back
-        elif res_type == "ret":
+    def __first_operand_destination(self, start_point, operands_aliases):
+        """ The result is saved into the first operand (RISC-Register, CISC) """
+        result_destination = None
+        memory_write_access = False
+
+        # Determining the code of the result register
+        if self.isa == "cisc":
+            register_code = self.long_register_result
+        else:
+            register_code = self.instruction[start_point:start_point + 3].to01()
+
+        # Figuring out if it's the register we are working with, or where it points to in memory
+        if operands_aliases[0] == "reg":
+            result_destination = self.register_codes[register_code]
+        elif operands_aliases[0] in ["memreg", "simdreg"]:
+            memory_write_access = True
+            result_destination = self.register_codes[register_code].value
+        elif operands_aliases[0] == "memregoff":
+            memory_write_access = True
+            offset = twos_complement(self.long_immediate_result, 16)
+            result_destination = self.register_codes[register_code].value + offset
+
+        return memory_write_access, result_destination, False
+
+    def __device_destination(self, start_point, operands_aliases):
+        """ The result is outputted to the device at the port specified in the instruction (RISC-Register, CISC) """
+        if self.io_arch == "mmio":
+            raise SimulatorError("This instruction does not exist in MMIO architecture")
+
+        if self.isa == "cisc":
+            port_num = self.long_immediate_result
+        else:
+            imm_len = int(operands_aliases[0][3:])
+            port_num = ba2int(self.instruction[start_point:start_point + imm_len])
+        return False, self.ports_dictionary[str(port_num)], False
+
+    # Actions of the instructions, each returns whether to go to the next instruction after the execution
+    def __execute_nop(self):
+        """ No operation, just moving on to the next instruction """
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug('NOP OPERATION')
+        return True
+
+    def __execute_call(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ Calls the procedure, remembering where to return from it """
+        operands_aliases = self.decoded.operands_aliases
 
-            # TODO: Should we zero out the Link Register register after returning to it once?
-            # In RISC-Register architecture we retrieve the caller address in the Link Register,
-            # otherwise we just pop it on the stack
+        # Remember the next instruction after the one which called the 'call' function
+        next_instruction = self.program_pointer + 1
+        if self.isa == "risc3":
+            self.registers["LR"].value = next_instruction
+        else:
+            self.__push_stack(next_instruction)
+
+        # There is only one operand for a call function, and it determines the program_start from the IP
+        operand = operands_aliases[0]
+        if operand.startswith("imm") or ((len(operands_aliases) > 1) and operands_aliases[1] == "imm"):
             if self.isa == "risc3":
-                return_point = int(self.registers["LR"]._state.to01(), 2)
+                # Calculate the new location of the instruction pointer, change it
+                imm_len = int(operand[3:])
+                jump_num = twos_complement(operands_values[0], imm_len)
+            elif self.isa == "cisc":
+                jump_num = twos_complement(operands_values[0], 16)
             else:
-                return_point = int(self.__pop_stack().to01(), 2)
+                jump_num = twos_complement(self.long_immediate_result, self.instruction_size[0] * 2)
+        elif operand in ["reg", "tos", "acc", "regoff"] or operands_aliases[1] == "acc":
+            jump_num = twos_complement(operands_values[0], 16)
+
+        # Calculate the new program_start in instructions
+        jump_distance = self.__jump_distance(self.program_pointer, jump_num)
+
+        # Change the instruction pointer
+        ip_value = self.registers["IP"].value
+        self.registers["IP"].value = ip_value + jump_distance
+        self.program_pointer += jump_num
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"INST INFO: <call> (Distance: {jump_num}, Bytes: {jump_distance}, "
+                              f"Bits: {jump_distance * self.instruction_size[2]})")
+        return False
 
-            ip_value = int(self.registers["IP"]._state.to01(), 2)
-            if self.program_pointer >= return_point:
-                destination = ip_value - sum(self.instr_size_list[return_point:self.program_pointer])
-            else:
-                destination = ip_value - sum(self.instr_size_list[self.program_pointer:return_point])
+    def __execute_ret(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ Returns from the procedure, moving the instruction pointer back """
+        # TODO: Should we zero out the Link Register register after returning to it once?
+        # In RISC-Register architecture we retrieve the caller address in the Link Register,
+        # otherwise we just pop it on the stack
+        if self.isa == "risc3":
+            return_point = self.registers["LR"].value
+        else:
+            return_point = self.__pop_stack()
+
+        ip_value = self.registers["IP"].value
+        if self.program_pointer >= return_point:
+            destination = ip_value - self.__program_length(return_point, self.program_pointer)
+        else:
+            destination = ip_value - self.__program_length(self.program_pointer, return_point)
 
-            self.registers["IP"].write_data(bin(destination)[2:])
-            self.program_pointer = return_point
-            go_to_next_instruction = False
+        self.registers["IP"].value = destination
+        self.program_pointer = return_point
+        if self.trace_level == TRACE_FULL:
             self.logger.debug(f"INST INFO <ret> (Return Point {return_point}, Program Pointer {self.program_pointer})")
+        return False
 
-        # If the opcode is of type jump, we look at the Flag Register and move Instruction Pointer if needed
-        elif res_type == "jmp":
-
-            # Set jump by default to False
-            should_jump = False
-            flag_reg = self.registers["FR"]._state
-            carry_flag, zero_flag, overflow_flag, sign_flag = flag_reg[-4:]
-
-            # Check the needed flags according to the jump condition specified
-            if (jmp_spec := self.instructions_dict[self.opcode.to01()][0]) == "jmp":
-                should_jump = True
-            elif jmp_spec == "jc":
-                if operands_values[0] == bitarray("1" * 16):
-                    should_jump = True
-            elif jmp_spec == "je":
-                should_jump = zero_flag
-            elif jmp_spec == "jne":
-                should_jump = not zero_flag
-            elif jmp_spec == "jg":
-                should_jump = (sign_flag == overflow_flag) and not zero_flag
-            elif jmp_spec == "jge":
-                should_jump = (sign_flag == overflow_flag)
-            elif jmp_spec == "jl":
-                should_jump = (sign_flag != overflow_flag)
-            elif jmp_spec == "jle":
-                should_jump = (sign_flag != overflow_flag) or zero_flag
-
-            # If the jump condition was satisfied, jump to the value specified with the operand
-            if should_jump:
-
-                # If the program_start was specified with the number, its length was specified as well
-                # Else, just use the register length or long immediate length
-                if operands_aliases[0].startswith("imm") and self.isa == "risc3":
-                    num_len = int(operands_aliases[0][3:])
-                else:
-                    num_len = 16
+    def __execute_jmp(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ Looks at the Flag Register and moves the Instruction Pointer if needed """
+        operands_aliases = self.decoded.operands_aliases
 
-                # Calculate the new program_start in instructions
-                if self.isa in ["risc3", "cisc"]:
-                    jump_num = twos_complement(int(operands_values[0].to01(), 2), num_len)
-                else:
-                    # Figure out if the value we should jump for was pushed on to the stack, or is in the instruction
-                    if operands_aliases[-1].startswith("tos") or operands_aliases[-1] in ["acc", "regoff"]:
-                        jump_num = twos_complement(int(operands_values[-1].to01(), 2), num_len)
-                    else:
-                        jump_num = twos_complement(int(self.long_immediate_result.to01(), 2), num_len)
-
-                # Calculate the number of bits to jump
-                if jump_num >= 0:
-                    jump_distance = sum(self.instr_size_list[self.program_pointer:self.program_pointer + jump_num])
-                else:
-                    jump_distance = -1 * sum(self.instr_size_list[self.program_pointer + jump_num:self.program_pointer])
-
-                # Change the instruction pointer
-                self.logger.debug(f"INST INFO <jmp> (Distance: {jump_num}, Bytes: {jump_distance}, "
-                                  f"Bits: {jump_distance * self.instruction_size[2]})")
-                ip_value = int(self.registers["IP"]._state.to01(), 2)
-                self.registers["IP"].write_data(bin(ip_value + jump_distance)[2:])
-                self.program_pointer += jump_num
-                go_to_next_instruction = False
-            else:
+        # 'jc' jumps if its operand is all ones, the rest of the jumps look at the flags
+        if self.decoded.name == "jc":
+            should_jump = operands_values[0] == 0xFFFF
+        else:
+            should_jump = JUMP_CONDITIONS[self.decoded.name](self.registers["FR"].value)
+
+        # If the jump condition was not satisfied, just go to the next instruction
+        if not should_jump:
+            if self.trace_level == TRACE_FULL:
                 self.logger.debug("INST INFO <jmp> not successful")
+            return True
 
-        # If the opcode is CISC's 'enter' instruction, which replaces three instructions on moving the stack further
-        # down when calling a new procedure: push %bp / mov %bp, %sp / sub %sp, $num
-        elif res_type == "enter":
-            self.logger.debug(f"INST INFO <enter> {ba2hex(operands_values[0])}")
-            self.__push_stack(self.registers['BP']._state)  # Push %bp
-            self.registers['BP'].write_data(self.registers['SP']._state)  # mov %bp, %sp
-            new_stack_pointer_value = int(self.registers["SP"]._state.to01(), 2) - int(operands_values[0].to01(), 2)
-            self.registers["SP"].write_data(bin(new_stack_pointer_value)[2:])  # sub %sp, $num
-
-        # If the opcode is CISC's 'leave' instruction, which replaces two instructions when returning to the previous
-        # procedure's stack frame: mov %sp, %bp / pop %bp
-        elif res_type == "leave":
-            self.logger.debug(f"INST INFO <leave>")
-            self.registers['SP'].write_data(bitarray(self.registers['BP']._state.to01()))  # mov %sp, %bp
-            self.registers['BP'].write_data(self.__pop_stack())  # pop %bp
+        # If the program_start was specified with the number, its length was specified as well
+        # Else, just use the register length or long immediate length
+        if operands_aliases[0].startswith("imm") and self.isa == "risc3":
+            num_len = int(operands_aliases[0][3:])
+        else:
+            num_len = 16
 
-        # If the opcode specified pushes the value on the stack
-        elif res_type == "stackpush":
-            self.logger.debug(f"INST INFO <stackpush>")
-            self.__push_stack(operands_values[0])
-
-        # If the opcode specified pops the value from the stack into the register
-        elif res_type in ["stackpop", "stackpopf"]:
-            popped_val = self.__pop_stack()
-            if memory_write_access:
-                self.data_memory.write_data(result_destination * 8, popped_val)
-                if tos_push:
-                    self.registers["TOS"].write_data(bin(result_destination + 2)[2:])
+        # Calculate the new program_start in instructions
+        if self.isa in ["risc3", "cisc"]:
+            jump_num = twos_complement(operands_values[0], num_len)
+        else:
+            # Figure out if the value we should jump for was pushed on to the stack, or is in the instruction
+            if operands_aliases[-1].startswith("tos") or operands_aliases[-1] in ["acc", "regoff"]:
+                jump_num = twos_complement(operands_values[-1], num_len)
             else:
-                result_destination.write_data(popped_val)
-            self.logger.debug(f"INST INFO <stackpop> (Popped value {ba2hex(popped_val)}, )")
+                jump_num = twos_complement(self.long_immediate_result, num_len)
 
-        # If the opcode specifies outputting to the device
-        elif res_type == "out":
-            self.logger.debug(f"INST INFO outputting to the device, value: {ba2hex(operands_values[-1])}")
-            result_destination.out_shell(operands_values[-1])
+        # Calculate the number of bits to jump
+        jump_distance = self.__jump_distance(self.program_pointer, jump_num)
 
-        # If we are getting input from device, we 'hang' the processor so that it waits for input
-        elif res_type == "in":
-            self.logger.debug("INST INFO CPU is waiting for the input from the device")
-            self.is_input_active = True
-            self.input_result_destination = result_destination
-            self.memory_write_access = memory_write_access
-            self.tos_push = tos_push
-            # TODO: Currently, the port: device interface is not ideal, and is not finished,
-            #  one of the places we will need to fix for it to work is input instructions, as they
-            #  currently assume just one device to receive input from, which is not great
-            # TODO: Implement interrupts and update the input functionality, with a buffer created which
-            #  populates itself up to a certain point on interrupts, and feeds the values from its queue into 'in'
-
-        # Swapping two of the top TOS values
-        elif res_type == "swap":
-            self.logger.debug("INST INFO Swapping TOS")
-            self.data_memory.write_data(result_destination * 8, operands_values[0])
-            self.data_memory.write_data(result_destination * 8 + 16, operands_values[1])
-            self.registers["TOS"].write_data(bin(result_destination + 4)[2:])
+        # Change the instruction pointer
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"INST INFO <jmp> (Distance: {jump_num}, Bytes: {jump_distance}, "
+                              f"Bits: {jump_distance * self.instruction_size[2]})")
+        ip_value = self.registers["IP"].value
+        self.registers["IP"].value = ip_value + jump_distance
+        self.program_pointer += jump_num
+        return False
 
-        # Opcode specifies SIMD instruction for CISC
-        elif res_type.startswith("simd"):
+    def __execute_enter(self, operands_values, memory_write_access, result_destination, tos_push):
+        """
+        CISC's 'enter' instruction, which replaces three instructions on moving the stack further
+        down when calling a new procedure: push %bp / mov %bp, %sp / sub %sp, $num
+        """
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"INST INFO <enter> {operands_values[0]:04x}")
+        self.__push_stack(self.registers['BP'].value)  # Push %bp
+        self.registers['BP'].value = self.registers['SP'].value  # mov %bp, %sp
+        new_stack_pointer_value = self.registers["SP"].value - operands_values[0]
+        self.registers["SP"].value = new_stack_pointer_value  # sub %sp, $num
+        return True
+
+    def __execute_leave(self, operands_values, memory_write_access, result_destination, tos_push):
+        """
+        CISC's 'leave' instruction, which replaces two instructions when returning to the previous
+        procedure's stack frame: mov %sp, %bp / pop %bp
+        """
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"INST INFO <leave>")
+        self.registers['SP'].value = self.registers['BP'].value  # mov %sp, %bp
+        self.registers['BP'].value = self.__pop_stack()  # pop %bp
+        return True
 
-            # Get the values from four consecutive memory cells starting with the one passed in a memreg operand
-            if res_type == "simdstore":
-                result = (self.registers['R00']._state + self.registers['R01']._state +
-                               self.registers['R02']._state + self.registers['R03']._state)
-            else:
-                result = ""
-
-            # Calculate the result of the operations in ALU
-            if res_type == "simd":
-                function = functions_dictionary[self.instructions_dict[self.opcode.to01()][0][:-1]]
-                for i in range(0, 49, 16):
-                    result += function([operands_values[0][i:i + 16], operands_values[-1]], self.registers['FR']).to01()
-
-            # If needed, we have to save the result to several sources at the same time
-            if res_type in ["simd", "simdstore"]:
-                self.data_memory.write_data(result_destination * 8, bitarray(result))
-            elif res_type == "simdload":
-                self.registers['R00'].write_data(operands_values[0][0:16].to01())
-                self.registers['R01'].write_data(operands_values[0][16:32].to01())
-                self.registers['R02'].write_data(operands_values[0][32:48].to01())
-                self.registers['R03'].write_data(operands_values[0][48:64].to01())
-
-            self.logger.debug(f"SIMD OPERATION op_val: {', '.join([ba2hex(op_value) for op_value in operands_values])}")
-
-        # Else, we have to execute the needed computations for this function in the virtual ALU
+    def __execute_stackpush(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ Pushes the value on the stack """
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"INST INFO <stackpush>")
+        self.__push_stack(operands_values[0])
+        return True
+
+    def __execute_stackpop(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ Pops the value from the stack into the destination """
+        popped_val = self.__pop_stack()
+        if memory_write_access:
+            self.data_memory.write_word(result_destination, popped_val)
+            if tos_push:
+                self.registers["TOS"].value = result_destination + 2
         else:
-            # Determine the needed function for this opcode and execute it, passing the flag register
-            function = functions_dictionary[self.instructions_dict[self.opcode.to01()][0]]
-            result_value = function(operands_values, flag_register=self.registers["FR"])
+            result_destination.value = popped_val
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"INST INFO <stackpop> (Popped value {popped_val:04x}, )")
+        return True
+
+    def __execute_out(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ Outputs the value to the device """
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"INST INFO outputting to the device, value: {operands_values[-1]:04x}")
+        result_destination.out_shell(int2ba(operands_values[-1], self.decoded.operands_widths[-1]))
+        return True
+
+    def __execute_in(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ 'Hangs' the processor so that it waits for the input from the device """
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug("INST INFO CPU is waiting for the input from the device")
+        self.is_input_active = True
+        self.input_result_destination = result_destination
+        self.memory_write_access = memory_write_access
+        self.tos_push = tos_push
+        # TODO: Currently, the port: device interface is not ideal, and is not finished,
+        #  one of the places we will need to fix for it to work is input instructions, as they
+        #  currently assume just one device to receive input from, which is not great
+        # TODO: Implement interrupts and update the input functionality, with a buffer created which
+        #  populates itself up to a certain point on interrupts, and feeds the values from its queue into 'in'
+        return True
+
+    def __execute_swap(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ Swaps two of the top TOS values """
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug("INST INFO Swapping TOS")
+        self.data_memory.write_word(result_destination, operands_values[0])
+        self.data_memory.write_word(result_destination + 2, operands_values[1])
+        self.registers["TOS"].value = result_destination + 4
+        return True
+
+    def __execute_simd(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ SIMD instructions for CISC """
+        res_type = self.decoded.res_type
+
+        vector_registers = [self.registers['R00'], self.registers['R01'], self.registers['R02'], self.registers['R03']]
+
+        # Get the values from four consecutive memory cells starting with the one passed in a memreg operand
+        if res_type == "simdstore":
+            result = [register.value for register in vector_registers]
+
+        # Calculate the result of the operations in ALU
+        elif res_type == "simd":
+            function = int_functions_dictionary[self.decoded.name[:-1]]
+            result = [function([(operands_values[0] >> shift) & 0xFFFF, operands_values[-1]], [16, 16],
+                               self.registers['FR']) for shift in (48, 32, 16, 0)]
+
+        # If needed, we have to save the result to several sources at the same time
+        if res_type in ["simd", "simdstore"]:
+            self.data_memory.write_bytes(result_destination, b"".join(word.to_bytes(2, "big") for word in result))
+        elif res_type == "simdload":
+            for register, shift in zip(vector_registers, (48, 32, 16, 0)):
+                register.value = operands_values[0] >> shift
+
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"SIMD OPERATION op_val: {', '.join([f'{value:04x}' for value in operands_values])}")
+        return True
+
+    def __execute_alu(self, operands_values, memory_write_access, result_destination, tos_push):
+        """ Executes the needed computations for this instruction in the virtual ALU """
+        # Determine the needed function for this opcode and execute it, passing the flag register
+        if self.profiler is not None:
+            start = time.perf_counter()
+            result_value = self.decoded.function(operands_values, self.decoded.operands_widths, self.registers["FR"])
+            self.profiler.phase_times[ALU_PHASE] += time.perf_counter() - start
+        else:
+            result_value = self.decoded.function(operands_values, self.decoded.operands_widths, self.registers["FR"])
 
-            # Write the result of the operation into the memory
-            if memory_write_access:
-                self.data_memory.write_data(result_destination * 8, result_value)
+        # Write the result of the operation into the memory
+        if memory_write_access:
+            self.data_memory.write_word(result_destination, result_value)
 
-                # Move the TOS pointer if the instruction pushed into the virtual register stack
-                if tos_push:
-                    self.registers["TOS"].write_data(bin(result_destination + 2)[2:])
+            # Move the TOS pointer if the instruction pushed into the virtual register stack
+            if tos_push:
+                self.registers["TOS"].value = result_destination + 2
 
-            # Write into the result destination
-            else:
-                result_destination.write_data(result_value)
+        # Write into the result destination
+        else:
+            result_destination.value = result_value
 
+        if self.trace_level == TRACE_FULL:
             self.logger.debug(
-                f"INST INFO mwa: {memory_write_access}, tos_push: {tos_push}, result: {ba2hex(result_value)}")
+                f"INST INFO mwa: {memory_write_access}, tos_push: {tos_push}, result: {result_value:04x}")
+        return True
 
-        return go_to_next_instruction
+    def __determine_start_point(self, instruction_name):
 
-    def __determine_start_point(self):
         """
         Determines the start point of the operands in the instruction and other details
         depending on the ISA architecture
 
-        The helper function for the 'execute' method
+        The helper function for the instruction decoding
 
+        :param instruction_name: str - name of the decoded instruction
         :return: start_point - int, representing the bit value in the instruction from which the opcodes begin
         """
         # Figure out the operands details for the RISC-Register ISA
         if self.isa == "risc3":
 
-            # Load the special case moves for RISC-Register architecture
-            low_high_load_risc = ["mov_low", "mov_high"]
-            low_high_load_risc = [bitarray(code) for code in self.instructions_dict if
-                                  self.instructions_dict[code][0] in low_high_load_risc]
-
-            # Load low/high bytes check for RISC-register architecture
-            if self.opcode in low_high_load_risc:
+            # Load low/high bytes check for RISC-register architecture, those are special case moves
+            if instruction_name in ["mov_low", "mov_high"]:
                 start_point = 5
             else:
                 start_point = 6
@@ -673,105 +1629,11 @@ class CPU:
 
         return start_point
 
-    def __determine_result_dest(self, start_point, operands_aliases):
-        """
-        Determines where to save the result and whether the memory is going to be affected
-        :param start_point: the point in the instruction where operands' encodings start
-        :param operands_aliases: list of aliases for the operands encoded in binary
-        """
-        result_destination = None
-        # Set 'write' access to memory and tos_push bools to False by default
-        memory_write_access = False
-        tos_push = False
-
-        # Determining where to save the result of the operation depending on type of the operation specified
-        #
-        # RISC-Stack ISA
-        if self.isa == "risc1":
-
-            # Determining the result destination for RISC-Stack iSA
-            if (res_type := self.instructions_dict[self.opcode.to01()][1][0]) in ["tos", "in", "swap"]:
-                memory_write_access, tos_push = True, True
-                result_destination = int(self.registers["TOS"]._state.to01(), 2)
-            elif res_type == "memtos":
-                memory_write_access = True
-                result_destination = int(self.__pop_tos(pop=True).to01(), 2)
-            elif res_type == "fr":
-                result_destination = self.registers["FR"]
-            elif res_type == "stackpop":
-                memory_write_access, tos_push = True, True
-                result_destination = int(self.registers["TOS"]._state.to01(), 2)
-            elif res_type == "stackpopf":
-                result_destination = self.registers["FR"]
-            elif res_type == "out":
-                result_destination = self.ports_dictionary[str(int(self.long_immediate_result.to01(), 2))]
-
-        # Accumulator-RISC
-        elif self.isa == "risc2":
-
-            # Determining the result destination for RISC-Accumulator ISA
-            if (res_type := self.instructions_dict[self.opcode.to01()][1][0]) in ["acc", "in"]:
-                result_destination = self.registers["ACC"]
-            elif res_type == "stackpop":
-                dest_type = self.instructions_dict[self.opcode.to01()][1][1]
-                result_destination = self.registers[dest_type.upper()]
-            elif res_type == "memir":
-                memory_write_access = True
-                result_destination = int(self.registers["IR"]._state.to01(), 2)
-            elif res_type == "out":
-                result_destination = self.ports_dictionary[str(int(self.long_immediate_result.to01(), 2))]
-            elif res_type in ["cmp", "fr"]:
-                result_destination = self.registers["FR"]
-            elif res_type == "ir":
-                result_destination = self.registers["IR"]
-
-        # Register-RISC and CISC architectures
-        elif self.isa in ["risc3", "cisc"]:
-
-            # If the result is to be saved into the first operand
-            if (res_type := self.instructions_dict[self.opcode.to01()][1]) in ["firstop", "in", "stackpop", "simd", "simdstore"]:
-
-                # Determining the code of the result register
-                if self.isa == "cisc":
-                    register_code = self.long_register_result
-                else:
-                    register_code = self.instruction[start_point:start_point + 3].to01()
-
-                # Figuring out if it's the register we are working with, or where it points to in memory
-                if operands_aliases[0] == "reg":
-                    result_destination = self.register_codes[register_code]
-                elif operands_aliases[0] in ["memreg", "simdreg"]:
-                    memory_write_access = True
-                    result_destination = int(self.register_codes[register_code]._state.to01(), 2)
-                elif operands_aliases[0] == "memregoff":
-                    memory_write_access = True
-                    offset = twos_complement(int(self.long_immediate_result.to01(), 2), 16)
-                    result_destination = int(self.register_codes[register_code]._state.to01(), 2) + offset
-
-            # If the result is the flag register affected (compare operations)
-            elif res_type == "flags":
-                result_destination = self.registers["FR"]
-
-            # If the result is outputted to a device, we should output to the specified port
-            elif res_type == "out":
-
-                if self.io_arch == "mmio":
-                    raise SimulatorError("This instruction does not exist in MMIO architecture")
-                else:
-                    if self.isa == "cisc":
-                        port_num = int(self.long_immediate_result.to01(), 2)
-                    else:
-                        imm_len = int(operands_aliases[0][3:])
-                        port_num = int(self.instruction[start_point:start_point + imm_len].to01(), 2)
-                    result_destination = self.ports_dictionary[str(port_num)]
-
-        return memory_write_access, result_destination, tos_push
-
     def __add_operands(self, start_point, operands_aliases):
         """
         Adds operands values to the list to provide to a chosen function later
         :param operands_aliases: list of short instruction type strings
-        :return: operands_values - list of binary data for the functions to compute on
+        :return: operands_values - list of int values for the functions to compute on
         """
         operands_values = []
         for operand in operands_aliases:
@@ -784,17 +1646,19 @@ class CPU:
                 else:
                     register_code = self.instruction[start_point:start_point + 3].to01()
                     start_point += 3
-                operands_values.append(self.register_codes[register_code]._state)
+                operands_values.append(self.register_codes[register_code].value)
 
             elif operand == "regoff":
 
                 register_code = self.long_registers.pop()
-                register_value = twos_complement(int(self.register_codes[register_code]._state.to01(), 2), 16)
-                offset_number = twos_complement(int(self.long_immediates.pop().to01(), 2), 16)
+                register_value = twos_complement(self.register_codes[register_code].value, 16)
+                offset_number = twos_complement(self.long_immediates.pop(), 16)
 
-                result = bin_clean(bin(register_value + offset_number))
-                sign_adjuster = "0" if (register_value + offset_number) >= 0 else "1"
-                operands_values.append(bitarray(result.rjust(16, sign_adjuster)))
+                # Negative results are padded to 16 bits with ones on top of their absolute value
+                result = register_value + offset_number
+                if result < 0:
+                    result = -result | (0xFFFF ^ ((1 << (-result).bit_length()) - 1))
+                operands_values.append(result & 0xFFFF)
 
             # If the operand is the memory addressed by register, add its value and go to the next operand
             elif operand in ["memreg", "simdreg"]:
@@ -804,22 +1668,20 @@ class CPU:
                 else:
                     register_code = self.instruction[start_point:start_point + 3].to01()
                     start_point += 3
-                tmp_register = int(self.register_codes[register_code]._state.to01(), 2) * 8
+                address = self.register_codes[register_code].value
 
                 # If we are reading a vector of four from the memory
                 if operand == "simdreg":
-                    operands_values.append(self.data_memory.read_data(tmp_register, tmp_register + 64))
+                    operands_values.append(int.from_bytes(self.data_memory.read_bytes(address, address + 8), "big"))
                 else:
-                    operands_values.append(self.data_memory.read_data(tmp_register, tmp_register + 16))
+                    operands_values.append(self.__read_word(address))
 
             elif operand == "memregoff":
 
                 register_code = self.long_registers.pop()
-                register_value = twos_complement(int(self.register_codes[register_code]._state.to01(), 2), 16)
-                offset_number = twos_complement(int(self.long_immediates.pop().to01(), 2), 16)
-                register_offset = register_value + offset_number
-
-                operands_values.append(self.data_memory.read_data(register_offset * 8, register_offset * 8 + 16))
+                register_value = twos_complement(self.register_codes[register_code].value, 16)
+                offset_number = twos_complement(self.long_immediates.pop(), 16)
+                operands_values.append(self.__read_word(register_value + offset_number))
 
             # If the operand is the immediate constant, add its value and go to the next operand
             elif operand.startswith("imm"):
@@ -827,7 +1689,7 @@ class CPU:
                     operands_values.append(self.long_immediates.pop())
                 else:
                     immediate_length = int(operand[3:])
-                    operands_values.append(bitarray(self.instruction[start_point:start_point + immediate_length]))
+                    operands_values.append(ba2int(self.instruction[start_point:start_point + immediate_length]))
                     start_point += immediate_length
 
             elif operand == "tos":
@@ -840,80 +1702,486 @@ class CPU:
                 operands_values.append(self.__pop_tos(second=True))
 
             elif operand == "memtos":
-                tos_val = int(self.__pop_tos(pop=True).to01(), 2) * 8
-                operands_values.append(self.data_memory.read_data(tos_val, tos_val + 16))
+                operands_values.append(self.__read_word(self.__pop_tos(pop=True)))
 
             elif operand == "memir":
-                ir_value = int(self.registers["IR"]._state.to01(), 2) * 8
-                operands_values.append(self.data_memory.read_data(ir_value, ir_value + 16))
+                operands_values.append(self.__read_word(self.registers["IR"].value))
 
             elif operand == "memimm":
-                start_read = int(self.long_immediate_result.to01(), 2) * 8
-                operands_values.append(self.data_memory.read_data(start_read, start_read + 16))
+                operands_values.append(self.__read_word(self.long_immediate_result))
 
             elif operand in ["fr", "ir", "acc"]:
-                operands_values.append(self.registers[operand.upper()]._state)
+                operands_values.append(self.registers[operand.upper()].value)
 
             elif operand == "one":
-                operands_values.append(bitarray(bin(1)[2:].rjust(16, '0')))
+                operands_values.append(1)
 
         return operands_values
 
+    def __run_blocks(self, block, steps, max_steps, breakpoints):
+        """
+        Executes the compiled block, and the blocks following it for as long as they fit into the run
+        The next instruction is not read in between, so the caller has to read it afterwards
+
+        :param block: CompiledBlock - the block at the current value of the Instruction Pointer
+        :param steps: int - number of instructions executed in the run so far
+        :param max_steps: int - the maximum number of instructions to execute, None for no limit
+        :param breakpoints: frozenset of the values of the Instruction Pointer to stop before
+        :return: int - number of instructions executed in the run after the blocks
+        """
+        ip_register = self.registers["IP"]
+        while True:
+            # A write into the program memory may change the instructions of the block which follow it
+            program_version = self.program_version
+            for operation in block.operations:
+                operation(self)
+                steps += 1
+                if self.program_version != program_version:
+                    return steps
+
+            ip_value = ip_register.value
+            if breakpoints and ip_value in breakpoints:
+                return steps
+            block = self.__find_block(ip_value)
+            if not self.__block_fits(block, max_steps - steps if max_steps is not None else None, breakpoints):
+                return steps
+
+    def __blocks_steps_left(self, steps, max_steps):
+        """
+        The number of instructions the compiled blocks can execute in the run: up to the maximum number of steps,
+        and up to the next checkpoint of the history if it is recorded
+        :param steps: int - number of instructions executed in the run so far
+        :param max_steps: int - the maximum number of instructions to execute, None for no limit
+        :return: int - the number of instructions, None for no limit
+        """
+        steps_left = max_steps - steps if max_steps is not None else None
+        if self.history is not None:
+            to_checkpoint = self.history.steps_to_checkpoint()
+            steps_left = to_checkpoint if steps_left is None else min(steps_left, to_checkpoint)
+        return steps_left
+
+    def __run_recorded_blocks(self, block, steps, max_steps, breakpoints):
+        """
+        Executes the compiled blocks while recording the history, up to its next checkpoint
+        The instructions of the blocks are counted in the history without the undo entries, going back to them
+        starts from the checkpoint before them, so the undo entries of the instructions before are dropped too
+
+        :param block: CompiledBlock - the block at the current value of the Instruction Pointer
+        :param steps: int - number of instructions executed in the run so far
+        :param max_steps: int - the maximum number of instructions to execute, None for no limit
+        :param breakpoints: frozenset of the values of the Instruction Pointer to stop before
+        :return: int - number of instructions executed in the run after the blocks
+        """
+        self.data_memory.undo_log = self.program_memory.undo_log = None
+        executed = self.__run_blocks(block, 0, self.__blocks_steps_left(steps, max_steps), breakpoints)
+        if executed:
+            self.history.entries.clear()
+            self.history.step += executed
+        return steps + executed
+
+    def __find_block(self, ip_value):
+        """
+        Returns the compiled basic block starting at the specified value of the Instruction Pointer,
+        compiling it if needed
+        :param ip_value: int - value of the Instruction Pointer (in bytes)
+        :return: CompiledBlock
+        """
+        if (block := self.block_cache.get(ip_value)) is None:
+            block = self.block_cache[ip_value] = self.__compile_block(ip_value)
+        return block
+
+    @staticmethod
+    def __block_fits(block, steps_left, breakpoints):
+        """
+        Checks whether the whole block can be executed at once
+        :param block: CompiledBlock
+        :param steps_left: int - number of instructions left to execute, None for no limit
+        :param breakpoints: frozenset of the values of the Instruction Pointer to stop before
+        :return: bool
+        """
+        if not block.operations:
+            return False
+        if steps_left is not None and steps_left < len(block.operations):
+            return False
+        return not breakpoints or breakpoints.isdisjoint(block.addresses)
+
+    def __compile_block(self, ip_value):
+        """
+        Compiles the basic block of the program starting at the specified value of the Instruction Pointer:
+        the straight run of instructions up to the next jump, call or return (including it), which are executed
+        one after another without decoding them again or looking at the Instruction Pointer in between
+        The block ends before 'halt' and the instructions executed by the interpreter (see __compile_instruction)
+
+        :param ip_value: int - value of the Instruction Pointer (in bytes)
+        :return: CompiledBlock - the block, without any operations if it starts with such an instruction
+        """
+        bytes_per_instruction = self.instruction_size[0] // self.instruction_size[2]
+        operations, addresses = [], []
+        while len(operations) < MAX_BLOCK_LENGTH:
+            # The instructions after the first one are only looked at in advance, so the bits that can't be
+            # decoded (like data after the program) just end the block, the interpreter gets to them if ever
+            try:
+                decoded = self.__cached_decode(ip_value)
+            except (KeyError, ValueError, IndexError, SimulatorMemoryError):
+                break
+            if decoded.is_halt or (operation := self.__compile_instruction(decoded)) is None:
+                break
+
+            operations.append(operation)
+            if len(operations) > 1:
+                addresses.append(ip_value)
+            if decoded.res_type in ["call", "ret", "jmp"]:
+                break
+            ip_value += bytes_per_instruction + decoded.additional_jump
+
+        return CompiledBlock(tuple(operations), frozenset(addresses))
+
+    def __compile_instruction(self, decoded):
+        """
+        Compiles the decoded instruction into an operation executing it and moving the Instruction Pointer,
+        with everything that only depends on the bits of the instruction figured out in advance, e.g. the values
+        of the immediate constants and the codes of the registers
+        Like the handlers, the operations take the CPU as their only argument, instead of being bound to this one
+
+        :param decoded: DecodedInstruction
+        :return: function(CPU), or None if the instruction can only be executed by the interpreter
+        """
+        res_type = decoded.res_type
+        if decoded.name is None or res_type == "in" or res_type.startswith("simd"):
+            return None
+
+        step = self.instruction_size[0] // self.instruction_size[2] + decoded.additional_jump
+        long_register_result, long_immediate_result = decoded.long_register_result, decoded.long_immediate_result
+        if res_type in ["halt", "nop"]:
+            def operation(cpu):
+                cpu.decoded = decoded
+                cpu.program_pointer += 1
+                cpu.registers["IP"].value += step
+
+            return operation
+
+        start_point, operands_aliases = decoded.start_point, decoded.operands_aliases
+        readers = self.__compile_operands(decoded)
+        if res_type == "jmp":
+            return self.__compile_jump(decoded, readers, step)
+
+        destination = self.__compile_destination(decoded)
+        action = CPU.__choose_action(res_type)
+
+        # The ALU instructions are the most common ones, so their action is compiled right into the operation
+        if action == CPU.__execute_alu:
+            function, operands_widths = decoded.function, decoded.operands_widths
+
+            def operation(cpu):
+                cpu.decoded = decoded
+                if long_register_result is not None:
+                    cpu.long_register_result = long_register_result
+                if long_immediate_result is not None:
+                    cpu.long_immediate_result = long_immediate_result
+
+                operands_values = [reader(cpu) for reader in readers]
+                memory_write_access, result_destination, tos_push = destination(cpu, start_point, operands_aliases)
+                result_value = function(operands_values, operands_widths, cpu.registers["FR"])
+                if memory_write_access:
+                    cpu.data_memory.write_word(result_destination, result_value)
+                    if tos_push:
+                        cpu.registers["TOS"].value = result_destination + 2
+                else:
+                    result_destination.value = result_value
+
+                cpu.program_pointer += 1
+                cpu.registers["IP"].value += step
+        else:
+            def operation(cpu):
+                # The rest of the actions look at the details of the instruction themselves
+                cpu.decoded = decoded
+                cpu.instruction = decoded.instruction
+                if long_register_result is not None:
+                    cpu.long_register_result = long_register_result
+                if long_immediate_result is not None:
+                    cpu.long_immediate_result = long_immediate_result
+
+                operands_values = [reader(cpu) for reader in readers]
+                if action(cpu, operands_values, *destination(cpu, start_point, operands_aliases)):
+                    cpu.program_pointer += 1
+                    cpu.registers["IP"].value += step
+
+        return operation
+
+    def __compile_jump(self, decoded, readers, step):
+        """
+        Compiles the jump instruction, figuring out in advance which flags it checks (see JUMP_CONDITIONS)
+        and how far it jumps, the same way __execute_jmp does it
+
+        :param decoded: DecodedInstruction
+        :param readers: list of functions(CPU) -> int, reading the values of the operands
+        :param step: int - number of bytes to move the Instruction Pointer by, if the jump is not taken
+        :return: function(CPU)
+        """
+        operands_aliases, long_immediate_result = decoded.operands_aliases, decoded.long_immediate_result
+        checks_operand = decoded.name == "jc"
+        condition = None if checks_operand else JUMP_CONDITIONS[decoded.name]
+
+        if operands_aliases[0].startswith("imm") and self.isa == "risc3":
+            num_len = int(operands_aliases[0][3:])
+        else:
+            num_len = 16
+
+        # Index of the operand holding the distance of the jump, None if it is the long immediate constant
+        if self.isa in ["risc3", "cisc"]:
+            distance_operand = 0
+        elif operands_aliases[-1].startswith("tos") or operands_aliases[-1] in ["acc", "regoff"]:
+            distance_operand = -1
+        else:
+            distance_operand = None
+            jump_num = twos_complement(long_immediate_result, num_len)
+
+        def operation(cpu):
+            cpu.decoded = decoded
+            if long_immediate_result is not None:
+                cpu.long_immediate_result = long_immediate_result
+            operands_values = [reader(cpu) for reader in readers]
+
+            # 'jc' jumps if its operand is all ones, the rest of the jumps look at the flags
+            if checks_operand:
+                should_jump = operands_values[0] == 0xFFFF
+            else:
+                should_jump = condition(cpu.registers["FR"].value)
+            if not should_jump:
+                cpu.program_pointer += 1
+                cpu.registers["IP"].value += step
+                return
+
+            distance = jump_num if distance_operand is None else twos_complement(operands_values[distance_operand],
+                                                                                 num_len)
+            program_pointer = cpu.program_pointer
+            cpu.registers["IP"].value += cpu.__jump_distance(program_pointer, distance)
+            cpu.program_pointer = program_pointer + distance
+
+        return operation
+
+    def __compile_operands(self, decoded):
+        """
+        Compiles reading the values of the operands of the instruction, the same way __add_operands reads them
+        :param decoded: DecodedInstruction
+        :return: list of functions(CPU) -> int, in the order of the operands
+        """
+        start_point = decoded.start_point
+        long_registers, long_immediates = list(decoded.long_registers), list(decoded.long_immediates)
+
+        readers = []
+        for operand in decoded.operands_aliases:
+            if operand in ["reg", "memreg"]:
+                if self.isa == "cisc":
+                    register_code = long_registers.pop()
+                else:
+                    register_code = decoded.instruction[start_point:start_point + 3].to01()
+                    start_point += 3
+                if operand == "reg":
+                    readers.append(CPU.__register_reader(register_code))
+                else:
+                    readers.append(CPU.__memory_register_reader(register_code))
+
+            elif operand in ["regoff", "memregoff"]:
+                register_code = long_registers.pop()
+                offset_number = twos_complement(long_immediates.pop(), 16)
+                if operand == "regoff":
+                    readers.append(CPU.__register_offset_reader(register_code, offset_number))
+                else:
+                    readers.append(CPU.__memory_offset_reader(register_code, offset_number))
+
+            elif operand.startswith("imm"):
+                if self.isa in ["risc1", "risc2", "cisc"]:
+                    readers.append(CPU.__constant_reader(long_immediates.pop()))
+                else:
+                    immediate_length = int(operand[3:])
+                    readers.append(CPU.__constant_reader(
+                        ba2int(decoded.instruction[start_point:start_point + immediate_length])))
+                    start_point += immediate_length
+
+            elif operand == "tos":
+                readers.append(lambda cpu: cpu.__pop_tos())
+            elif operand == "tospop":
+                readers.append(lambda cpu: cpu.__pop_tos(pop=True))
+            elif operand == "tos2":
+                readers.append(lambda cpu: cpu.__pop_tos(second=True))
+            elif operand == "memtos":
+                readers.append(lambda cpu: cpu.__read_word(cpu.__pop_tos(pop=True)))
+            elif operand == "memir":
+                readers.append(lambda cpu: cpu.__read_word(cpu.registers["IR"].value))
+            elif operand == "memimm":
+                readers.append(CPU.__memory_constant_reader(decoded.long_immediate_result))
+            elif operand in ["fr", "ir", "acc"]:
+                readers.append(CPU.__named_register_reader(operand.upper()))
+            elif operand == "one":
+                readers.append(CPU.__constant_reader(1))
+
+        return readers
+
+    # Readers of the values of the operands for the compiled instructions, each is a function(CPU) -> int
+    @staticmethod
+    def __constant_reader(value):
+        """ The operand is a constant encoded in the instruction """
+        return lambda cpu: value
+
+    @staticmethod
+    def __register_reader(register_code):
+        """ The operand is the register with the code specified """
+        return lambda cpu: cpu.register_codes[register_code].value
+
+    @staticmethod
+    def __named_register_reader(register_name):
+        """ The operand is the register with the name specified """
+        return lambda cpu: cpu.registers[register_name].value
+
+    @staticmethod
+    def __register_offset_reader(register_code, offset_number):
+        """ The operand is the value of the register with an offset added to it """
+        def reader(cpu):
+            # Negative results are padded to 16 bits with ones on top of their absolute value
+            result = twos_complement(cpu.register_codes[register_code].value, 16) + offset_number
+            if result < 0:
+                result = -result | (0xFFFF ^ ((1 << (-result).bit_length()) - 1))
+            return result & 0xFFFF
+
+        return reader
+
+    @staticmethod
+    def __memory_register_reader(register_code):
+        """ The operand is the word in the memory addressed by the register """
+        return lambda cpu: cpu.__read_word(cpu.register_codes[register_code].value)
+
+    @staticmethod
+    def __memory_offset_reader(register_code, offset_number):
+        """ The operand is the word in the memory addressed by the register with an offset """
+        return lambda cpu: cpu.__read_word(twos_complement(cpu.register_codes[register_code].value, 16) + offset_number)
+
+    @staticmethod
+    def __memory_constant_reader(address):
+        """ The operand is the word in the memory at the address encoded in the instruction """
+        return lambda cpu: cpu.__read_word(address)
+
+    def __compile_destination(self, decoded):
+        """
+        Compiles figuring out where to save the result of the instruction
+        The registers of the first operands and the ports of the devices are known in advance,
+        the rest of the destinations are figured out by the same functions the handlers use
+
+        :param decoded: DecodedInstruction
+        :return: function(CPU, start_point, operands_aliases) -> (memory_write_access, result_destination, tos_push)
+        """
+        res_type, operands_aliases, start_point = decoded.res_type, decoded.operands_aliases, decoded.start_point
+        if self.isa not in ["risc3", "cisc"] or res_type not in ["firstop", "stackpop", "out"]:
+            return self.__choose_destination(res_type, operands_aliases)
+
+        if res_type == "out":
+            if self.isa == "cisc":
+                port_num = decoded.long_immediate_result
+            else:
+                imm_len = int(operands_aliases[0][3:])
+                port_num = ba2int(decoded.instruction[start_point:start_point + imm_len])
+
+            def destination(cpu, start_point, operands_aliases):
+                if cpu.io_arch == "mmio":
+                    raise SimulatorError("This instruction does not exist in MMIO architecture")
+                return False, cpu.ports_dictionary[str(port_num)], False
+
+            return destination
+
+        if self.isa == "cisc":
+            register_code = decoded.long_register_result
+        else:
+            register_code = decoded.instruction[start_point:start_point + 3].to01()
+
+        if operands_aliases[0] == "reg":
+            def destination(cpu, start_point, operands_aliases):
+                return False, cpu.register_codes[register_code], False
+        elif operands_aliases[0] == "memreg":
+            def destination(cpu, start_point, operands_aliases):
+                return True, cpu.register_codes[register_code].value, False
+        elif operands_aliases[0] == "memregoff":
+            offset = twos_complement(decoded.long_immediate_result, 16)
+
+            def destination(cpu, start_point, operands_aliases):
+                return True, cpu.register_codes[register_code].value + offset, False
+        else:
+            return CPU.__no_destination
+        return destination
+
+    def __read_word(self, address):
+        """
+        Reads a 16-bit word from the data memory
+        Reading outside of the memory works the way it always did with the bits, as some of the
+        programs rely on it (like popping from the empty stack, which gives zero)
+
+        :param address: int - location of the word
+        :return: int
+        """
+        if 0 <= address <= self.data_memory.size - 2:
+            return self.data_memory.read_word(address)
+        data = self.data_memory.read_data(address * 8, address * 8 + 16)
+        return ba2int(data) if data else 0
+
     def __push_stack(self, value):
         """
         Pushes the value onto the memory stack, changing the position of the Stack Pointer register
-        :param value: bitarray(16) - a value to be pushed into memory
+        :param value: int - a 16-bit value to be pushed into memory
         """
-        stack_pointer_value = int(self.registers["SP"]._state.to01(), 2) * 8
-        self.data_memory.write_data(stack_pointer_value - 16, value)
-        self.registers["SP"]._state = bitarray(bin(stack_pointer_value // 8 - 2)[2:].rjust(16, '0'))
-        self.logger.debug(f"Push to stack: {ba2hex(value)}")
+        stack_pointer_value = (self.registers["SP"].value - 2) & 0xFFFF
+        self.data_memory.write_word(stack_pointer_value, value)
+        self.registers["SP"].value = stack_pointer_value
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"Push to stack: {value:04x}")
 
     def __pop_stack(self):
         """
         Pops the last value from the memory stack, changing the position of the Stack Pointer register
-        :return: bitarray - of size 16 representing the value of the register previously pushed onto the stack
+        :return: int - the 16-bit value previously pushed onto the stack
         """
-        stack_pointer_value = int(self.registers["SP"]._state.to01(), 2) * 8
-        self.registers["SP"].write_data(bin(stack_pointer_value // 8 + 2)[2:])
-        self.logger.debug(f"Pop from stack: {ba2hex(self.registers['SP']._state)}")
-        return self.data_memory.read_data(stack_pointer_value, stack_pointer_value + 16)
+        stack_pointer_value = self.registers["SP"].value
+        self.registers["SP"].value = stack_pointer_value + 2
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"Pop from stack: {self.registers['SP'].value:04x}")
+        return self.__read_word(stack_pointer_value)
 
     def __pop_tos(self, second=False, pop=False):
         """
         Gets the value of the 'tos', which lies in memory, and moves the register stack if needed
         :param second: bool - whether to return the value of the second-to-top register
         :param pop: bool - whether to move the stack behind the popped value
+        :return: int - the 16-bit value
         """
-        start_read = int(self.registers["TOS"]._state.to01(), 2) * 8
-        tos_val = start_read
-        if second and start_read > self.tos_start:
-            start_read -= 16
-        return_data = self.data_memory.read_data(start_read - 16, start_read)
+        start_read = tos_val = self.registers["TOS"].value
+        if second and start_read * 8 > self.tos_start:
+            start_read -= 2
+        return_data = self.__read_word(start_read - 2)
         if pop:
-            self.registers["TOS"].write_data(bin(tos_val // 8 - 2)[2:])
-        self.logger.debug(f"Pop from TOS stack: (newtosval: {ba2hex(self.registers['TOS']._state)}, "
-                          f"second: {second}, pop: {pop})")
+            self.registers["TOS"].value = tos_val - 2
+        if self.trace_level == TRACE_FULL:
+            self.logger.debug(f"Pop from TOS stack: (newtosval: {self.registers['TOS'].value:04x}, "
+                              f"second: {second}, pop: {pop})")
         return return_data
 
     def input_finish(self, char):
         """
         Stops the waiting process for the CPU, putting the result of the operation in a register specified
-        :param char: bitarray of size 16, the result of the input
+        :param char: str - binary representation of the result of the input
         """
-        char = bitarray(char.rjust(16, '0'))
+        if self.history is not None:
+            self.history.add_input(char)
+        char = int(char, 2) if char else 0
         self.is_input_active = False
         # Write the result of the operation into the memory
         if self.memory_write_access:
-            self.data_memory.write_data(self.input_result_destination * 8, char)
+            self.data_memory.write_word(self.input_result_destination, char)
 
             # Move the TOS pointer if the instruction pushed into the virtual register stack
             if self.tos_push:
-                self.registers["TOS"].write_data(bin(self.input_result_destination + 2)[2:])
+                self.registers["TOS"].value = self.input_result_destination + 2
 
         # Write into the result destination
         else:
-            self.input_result_destination.write_data(char)
+            self.input_result_destination.value = char
 
     # Below are the methods for curses-driven command-line interface
     def start_program(self):
@@ -935,7 +2203,7 @@ class CPU:
             if self.curses_mode:
                 self.draw_screen()
 
-            if self.instruction.to01() == ('0' * self.instruction_size[0]):
+            if self.decoded.is_halt:
                 return False
 
             is_close = self.__execute_cycle()
@@ -954,6 +2222,11 @@ class CPU:
             # Finish the program if the 'q' key is pressed
             if key in ('Q', 'q'):
                 return True
+            # Scroll the memory by a page if it does not fit into its box
+            if key in ('U', 'u', 'D', 'd'):
+                lines = PAGE_SIZE // MEMORY_LINE_BYTES
+                self.memory_scroll = max(self.memory_scroll + (lines if key in ('D', 'd') else -lines), 0)
+                self.draw_screen()
 
     def start_screen(self):
         """
@@ -980,7 +2253,7 @@ class CPU:
         # Add title and menu elements
         self.std_screen.addstr("Hardware Simulator", curses.A_REVERSE | curses.color_pair(2))
         self.std_screen.addstr(curses.LINES - 1, 0,
-                               "Press 'q' to exit, 'n' to execute the next instruction",
+                               "Press 'q' to exit, 'n' to execute the next instruction, 'u'/'d' to scroll the memory",
                                curses.A_REVERSE)
 
         # Create the box for the instruction in binary
@@ -1039,7 +2312,7 @@ class CPU:
         # Fill the register box with current registers and their values
         self.register_box.clear()
         self.register_box.addstr(" Registers:\n")
-        items = [(value.name, value._state.tobytes().hex()) for key, value in self.registers.items()]
+        items = [(value.name, f"{value.value:04x}") for key, value in self.registers.items()]
         for i in range(len(items)):
             self.register_box.addstr(f" {(items[i][0] + ':').ljust(4, ' ')} {items[i][1]}")
             if (i % 2) == 1:
@@ -1047,14 +2320,12 @@ class CPU:
 
         # Refresh the data memory on screen
         self.data_memory_box.clear()
-        for i in range(0, len(self.data_memory.slots), 8):
-            self.data_memory_box.addstr(ba2hex(self.data_memory.slots[i:i + 8]))
+        self.memory_scroll = self.__draw_memory(self.data_memory_box, self.data_memory)
 
         # If the architecture has two separate memories, we update the program memory too
         if self.architecture == "harvard":
             self.program_memory_box.clear()
-            for i in range(0, len(self.program_memory.slots), 8):
-                self.program_memory_box.addstr(ba2hex(self.program_memory.slots[i:i + 8]))
+            self.__draw_memory(self.program_memory_box, self.program_memory)
 
         # Refresh the shell output
         self.shell_box.clear()
@@ -1069,6 +2340,25 @@ class CPU:
         self.shell_box.noutrefresh()
         curses.doupdate()
 
+    def __draw_memory(self, box, memory):
+        """
+        Writes the contents of the memory into its box: all the bytes if they fit, otherwise the lines
+        of the pages written to, starting from the line the interface is scrolled to
+        :param box: curses window - the box of the memory
+        :param memory: Memory - the memory to show
+        :return: int - the line it is scrolled to, no further than the last lines shown
+        """
+        if memory.size <= MEMORY_BOX_BYTES:
+            box.addstr(memory.read_bytes(0, memory.size).hex())
+            return 0
+
+        lines = [f"{start + offset:04x}: {page[offset:offset + MEMORY_LINE_BYTES].hex()}"
+                 for start, page in memory.touched_pages()
+                 for offset in range(0, min(len(page), memory.size - start), MEMORY_LINE_BYTES)]
+        scroll = max(min(self.memory_scroll, len(lines) - MEMORY_BOX_LINES), 0)
+        box.addstr("\n".join(lines[scroll:scroll + MEMORY_BOX_LINES]))
+        return scroll
+
     def close_screen(self):
         """
         Finishes the execution of the program, clearing the
@@ -1082,5 +2372,74 @@ class CPU:
         curses.endwin()
 
 
+class CPUCheckpoint(namedtuple("CPUCheckpoint", ["registers", "data_pages", "program_pages", "devices", "state"])):
+    """
+    State of the CPU remembered by CPU.checkpoint
+    registers - values of the registers by name, data_pages and program_pages - snapshots of the memories
+    (program_pages is None if the program is in the data memory), devices - contents of the devices by port,
+    state - the rest of the CPU attributes changing while the program runs
+    """
+    __slots__ = ()
+
+    # The CPU attributes changing while the program runs, apart from the registers, memory and devices
+    attributes = ("program_pointer", "first_instruction", "is_input_active", "input_result_destination",
+                  "memory_write_access", "tos_push", "decoded", "instruction", "opcode", "additional_jump",
+                  "long_register_result", "long_immediate_result", "trace_steps")
+
+
+class RunResult(namedtuple("RunResult", ["steps", "halt_reason", "ip", "output"])):
+    """
+    Summary of a headless CPU run
+    steps - number of instructions executed, halt_reason - one of 'halt', 'input', 'breakpoint', 'max_steps',
+    ip - final value of the Instruction Pointer, output - contents of the shell
+    """
+    __slots__ = ()
+
+
+class CompiledBlock(namedtuple("CompiledBlock", ["operations", "addresses"])):
+    """
+    Basic block of the program compiled for the execution
+    operations - tuple of functions(CPU) executing the instructions one after another,
+    addresses - values of the Instruction Pointer at the instructions of the block after the first one
+    """
+    __slots__ = ()
+
+
+class InstructionEntry(namedtuple("InstructionEntry", ["name", "res_type", "operands_aliases", "operands_widths",
+                                                       "function", "start_point", "handler"])):
+    """
+    Entry of the CPU instruction table, holding everything known about the instruction from its opcode
+    name, res_type, operands_aliases - as in the instruction set, operands_widths - widths of the operands values,
+    function - the integer ALU function (if any),
+    start_point - where the operands start in the instruction, handler - function(CPU) executing the instruction
+    """
+    __slots__ = ()
+
+
+class DecodedInstruction:
+    """
+    Decoded instruction record, kept in the CPU decode cache
+    Holds everything the CPU figures out from the bits of the instruction before executing it
+    """
+    __slots__ = ("start", "end", "instruction", "opcode", "opcode_key", "name", "res_type", "operands_aliases",
+                 "operands_widths", "function", "start_point", "handler", "long_registers", "long_register_result",
+                 "long_immediates", "long_immediate_result", "additional_jump", "is_halt", "printout")
+
+    def __init__(self, start):
+        """
+        Creates an empty record for the instruction starting at the specified location
+        :param start: int - location of the instruction in the program memory, in bits
+        """
+        self.start = self.end = start
+        self.instruction = self.opcode = self.opcode_key = None
+        self.name = self.res_type = self.function = self.start_point = self.handler = None
+        self.operands_aliases = self.operands_widths = []
+        self.long_registers = self.long_immediates = ()
+        self.long_register_result = self.long_immediate_result = None
+        self.additional_jump = 0
+        self.is_halt = False
+        self.printout = ""
+
+
 class SimulatorError(Exception):
     """ Exception raised in Hardware Simulator modules """
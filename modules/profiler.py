@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Profiling of the program execution in the CPU
+#
+# While the CPU has a profiler (see CPU.start_profiling), it counts:
+#   * the instruction mix - executed instructions by opcode, reported by mnemonic
+#   * the hot addresses - executed instructions by the value of the Instruction Pointer
+#   * the time the simulator spends in every phase of the execution:
+#       fetch - reading and decoding the instruction (decoded instructions are cached, see CPU.__read_instruction)
+#       operands - reading the values of the operands and figuring out where the result goes
+#       alu - computing the result with the functions of modules/int_functions.py
+#       writeback - saving the result, and everything else the instruction does (jumps, stack, I/O, SIMD)
+#
+# The counters are arrays of numbers allocated once, so counting an instruction does not allocate anything
+# When the CPU has no profiler, it only checks for it once per instruction (compiled blocks are not profiled,
+# the CPU interprets the instructions one by one while profiling, the same way it does while tracing)
+
+import heapq
+from array import array
+from collections import namedtuple
+
+# Phases of the execution, indexes in the array of the phase times
+PHASES = ("fetch", "operands", "alu", "writeback")
+FETCH_PHASE, OPERANDS_PHASE, ALU_PHASE, WRITEBACK_PHASE = range(len(PHASES))
+
+
+class ProfileReport(namedtuple("ProfileReport", ["instructions", "instruction_mix", "hot_addresses",
+                                                 "phase_seconds"])):
+    """
+    Summary of the profile
+    instructions - number of the executed instructions, instruction_mix - numbers of the executed instructions
+    by mnemonic (from the most executed), hot_addresses - list of (value of the Instruction Pointer, number of
+    the instructions executed there), from the most executed, phase_seconds - seconds spent in every phase by name
+    """
+    __slots__ = ()
+
+
+class Profiler:
+    """
+    Counters of the executed instructions and of the time spent in the phases of the execution
+    """
+
+    def __init__(self, instructions, addresses_count):
+        """
+        Creates a new profiler with all the counters at zero
+        :param instructions: dict - the instruction set of the ISA by opcode, with the mnemonic first
+        :param addresses_count: int - the number of the values the Instruction Pointer can have
+        :return: NoneType
+        """
+        self.opcodes = tuple(instructions)
+        self.opcode_numbers = {opcode: number for number, opcode in enumerate(self.opcodes)}
+        self.mnemonics = tuple(instructions[opcode][0] for opcode in self.opcodes)
+
+        self.opcode_counts = array("Q", bytes(8 * len(self.opcodes)))
+        self.address_counts = array("Q", bytes(8 * addresses_count))
+        self.phase_times = array("d", bytes(8 * len(PHASES)))
+        self.instructions = 0
+
+    def count(self, ip_value, opcode):
+        """
+        Counts the executed instruction
+        :param ip_value: int - value of the Instruction Pointer at the instruction
+        :param opcode: str - the opcode of the instruction
+        """
+        self.instructions += 1
+        self.opcode_counts[self.opcode_numbers[opcode]] += 1
+        if ip_value < len(self.address_counts):
+            self.address_counts[ip_value] += 1
+
+    def reset(self):
+        """
+        Sets all the counters back to zero, to profile another run
+        """
+        self.opcode_counts = array("Q", bytes(8 * len(self.opcode_counts)))
+        self.address_counts = array("Q", bytes(8 * len(self.address_counts)))
+        self.phase_times = array("d", bytes(8 * len(PHASES)))
+        self.instructions = 0
+
+    def instruction_mix(self):
+        """
+        Numbers of the executed instructions by mnemonic, the opcodes of the same mnemonic are counted together
+        :return: dict - {mnemonic: number}, from the most executed, without the ones never executed
+        """
+        mix = dict()
+        for mnemonic, count in zip(self.mnemonics, self.opcode_counts):
+            if count:
+                mix[mnemonic] = mix.get(mnemonic, 0) + count
+        return dict(sorted(mix.items(), key=lambda item: item[1], reverse=True))
+
+    def hot_addresses(self, count=10):
+        """
+        The values of the Instruction Pointer the most instructions were executed at
+        :param count: int - the number of the addresses to find
+        :return: list of (address, number of the instructions), from the most executed
+        """
+        return heapq.nlargest(count, ((address, executed) for address, executed in enumerate(self.address_counts)
+                                      if executed), key=lambda item: item[1])
+
+    def phase_seconds(self):
+        """
+        Time spent in every phase of the execution
+        :return: dict - {phase: seconds}
+        """
+        return dict(zip(PHASES, self.phase_times))
+
+    def report(self, hot_count=10):
+        """
+        Summarizes the profile
+        :param hot_count: int - the number of the hot addresses to report
+        :return: ProfileReport
+        """
+        return ProfileReport(self.instructions, self.instruction_mix(), self.hot_addresses(hot_count),
+                             self.phase_seconds())
@@ -4,7 +4,13 @@
 # Assembly Simulator project 2020
 # GNU General Public License v3.0
 
+# Registers hold their state as a plain 16-bit integer, which is what the CPU reads and writes
+# on every instruction. The bitarray representation (_state) is only produced when something asks
+# for it (display code, tests, older modules), and is kept until the next integer write, so
+# the changes made to it in place (like setting a single flag bit) are still seen by the CPU
+
 from bitarray import bitarray
+from bitarray.util import ba2int, int2ba
 
 
 class Register:
@@ -21,18 +27,59 @@ class Register:
         :return: NoneType
         """
         self.name = name
-        self._state = bitarray('0'*16)
+        self._value = 0
+        self._view = None
         self.accessibility = general_purpose
 
+    @property
+    def value(self):
+        """
+        The state of the register as an unsigned 16-bit integer
+        :return: int
+        """
+        # Somebody might have changed the bitarray view in place, it has the final say then
+        if self._view is not None:
+            self._value = ba2int(self._view[-16:]) if self._view else 0
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        """
+        Writes the integer into the register, keeping only the lowest 16 bits
+        :param value: int
+        """
+        self._value = value & 0xFFFF
+        self._view = None
+
+    @property
+    def _state(self):
+        """
+        Bitarray view of the register state, created lazily
+        :return: bitarray(16)
+        """
+        if self._view is None:
+            self._view = int2ba(self._value, 16)
+        return self._view
+
+    @_state.setter
+    def _state(self, value):
+        """
+        Replaces the state of the register with the bitarray provided
+        :param value: bitarray
+        """
+        self._view = value
+
     def write_data(self, value):
         """
         Writes the data provided into its state
-        :param value: str - binary string representing bits
+        :param value: str - binary string representing bits, bitarray or int
         """
-        if isinstance(value, str):
-            self._state = bitarray(value.rjust(16, '0'))
+        if isinstance(value, int):
+            self.value = value
+        elif isinstance(value, str):
+            self.value = int(value, 2) if value else 0
         elif isinstance(value, bitarray):
-            self._state = bitarray(value.to01().rjust(16, '0'))
+            self.value = ba2int(value) if value else 0
 
     def get_low(self):
         """
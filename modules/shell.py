@@ -41,7 +41,8 @@ class Shell:
         """
         Return string representation of the shell's contents
 
-        :return: ascii-decoded slots of the shell
+        :return: ascii-decoded slots of the shell, the bytes which are not ASCII characters (like the words
+            the stack pushes into the memory-mapped shell) are shown as replacement characters
         """
         data = bitarray(self._state.to01())
 
@@ -50,4 +51,4 @@ class Shell:
             if data[i:i+8].to01() == "00000000":
                 data[i:i+8] = bitarray("00100000")
 
-        return data.tobytes().decode("ascii")
+        return data.tobytes().decode("ascii", errors="replace")
@@ -4,9 +4,11 @@
 # Assembly Simulator project 2020
 # GNU General Public License v3.0
 import os
+import logging
 import argparse
 
 from modules.processor import CPU, SimulatorError
+from modules.object_file import ObjectFile, ObjectFileError, is_object_file
 
 
 class Simulator:
@@ -21,13 +23,18 @@ class Simulator:
         """
         # Creating the argument parser instance and adding the main arguments
         parser = argparse.ArgumentParser()
-        parser.add_argument("--file", help="provide the binary code filepath")
+        parser.add_argument("--file", help="provide the binary code filepath (the text or the object file)")
         parser.add_argument("--isa",
-                            help="specify the ISA architecture: RISC1 (Stack), RISC2 (Accumulator), RISC3 (Register), CISC (Register)")
+                            help="specify the ISA architecture: RISC1 (Stack), RISC2 (Accumulator), RISC3 (Register), CISC (Register), "
+                                 "the object files know their ISA")
         parser.add_argument("--architecture",
                             help="specify the data/program architecture: neumann, harvard, harvardm")
         parser.add_argument("--output", help="specify the type of I/O: mmio, special")
-        parser.add_argument("--program_start", help="provide the program_start for the instructions in the memory")
+        parser.add_argument("--program_start", type=int,
+                            help="provide the program_start for the instructions in the memory "
+                                 "(default: the entry point of the object file, or 512)")
+        parser.add_argument("--memory_size", type=int, default=1024,
+                            help="specify the size of the memory in bytes, up to 65536 (default: 1024)")
 
         # Parsing the command line arguments
         args = parser.parse_args()
@@ -44,19 +51,47 @@ class Simulator:
         if not os.path.isfile(args.file):
             raise SimulatorError("Provide a valid file path")
 
-        with open(args.file, "r") as file:
-            program_text = file.read()
+        with open(args.file, "rb") as file:
+            program_blob = file.read()
 
-        if not args.isa or args.isa.lower() not in valid_isa:
+        # The object files are loaded as they are, the text of the binary code has to be given the ISA
+        if is_object_file(program_blob):
+            try:
+                program_text = ObjectFile.from_bytes(program_blob)
+            except ObjectFileError as error:
+                raise SimulatorError(f"Provide a valid object file: {error}")
+            if args.isa and args.isa.lower() != program_text.isa:
+                raise SimulatorError(f"The program was assembled for {program_text.isa}, not {args.isa.lower()}")
+            isa, program_start = program_text.isa, program_text.entry_point
+        else:
+            program_text = program_blob.decode("utf-8")
+            isa, program_start = (args.isa or "").lower(), 512
+
+        if isa not in valid_isa:
             raise SimulatorError("Provide the type of ISA for simulation.")
 
+        if args.program_start is not None:
+            program_start = args.program_start
+
         if not args.architecture or args.architecture.lower() not in valid_architectures:
             raise SimulatorError("Provide the type of data/program architecture for simulation.")
 
         if not args.output or args.output.lower() not in valid_io:
             raise SimulatorError("Provide the type of Input/Output architecture for simulation")
 
-        CPU(args.isa.lower(), args.architecture.lower(), args.output.lower(), program_text, curses_mode=True)
+        if not 0 < args.memory_size <= 65536:
+            raise SimulatorError("Provide the memory size between 1 and 65536 bytes")
+
+        # Set up the logging module so it would save everything to a file
+        # (we are unable to track prints in real-time due to curses)
+        logging.basicConfig(filename="log.txt",
+                            filemode='w',
+                            format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
+                            datefmt='%H:%M:%S',
+                            level=logging.DEBUG)
+
+        CPU(isa, args.architecture.lower(), args.output.lower(), program_text, program_start=program_start,
+            curses_mode=True, memory_size=args.memory_size)
 
 
 if __name__ == '__main__':
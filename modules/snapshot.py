@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Snapshots are the compact binary form of the state of the CPU (see CPU.snapshot and CPU.restore), to save it
+# (like the web sessions do), to send it to another process, or to keep it as a checkpoint
+#
+# Only the state of the simulated computer is saved, nothing the CPU can figure out again from the ISA tables
+# and the program. Everything is big-endian, the snapshot consists of:
+#   * header - magic number, version of the format, ISA, data/program architecture, I/O mode, flags
+#       (waiting for the first instruction, waiting for the input, where the input goes), memory size,
+#       address of the program, number of the current instruction of the program and of the traced ones
+#   * destination of the input the CPU waits for - the memory address or the number of the register
+#   * registers - their values, in the order of the registers of the ISA
+#   * program - the object file of the loaded program, or the text of the binary code if it was loaded as text,
+#       so that the CPU can be reset to it
+#   * memories - the data memory (and the program memory for the Harvard architecture), only the pages that
+#       were ever written to: number of the page and its contents
+#   * devices - the port and the contents of every device
+#
+# The size of the snapshot is proportional to the memory the program used, not to the size of the memory
+
+import struct
+from collections import namedtuple
+from bitarray import bitarray
+
+from modules.isa import ISA_NAMES
+from modules.object_file import ObjectFile, ObjectFileError
+
+SNAPSHOT_MAGIC = b"HSAS"
+SNAPSHOT_VERSION = 1
+
+ARCHITECTURES = ("neumann", "harvard", "harvardm")
+IO_MODES = ("mmio", "special")
+
+# Flags of the header
+FIRST_INSTRUCTION = 1
+INPUT_ACTIVE = 2
+MEMORY_WRITE_ACCESS = 4
+TOS_PUSH = 8
+
+# Kinds of the program
+PROGRAM_OBJECT = 0
+PROGRAM_TEXT = 1
+
+HEADER = struct.Struct(">4sBBBBBIIIQ")
+INPUT_DESTINATION = struct.Struct(">i")
+COUNT = struct.Struct(">H")
+REGISTER_VALUE = struct.Struct(">H")
+PROGRAM_HEADER = struct.Struct(">BI")
+PAGE_HEADER = struct.Struct(">HH")
+DEVICE_HEADER = struct.Struct(">BI")
+
+
+class CPUSnapshot(namedtuple("CPUSnapshot", ["isa", "architecture", "io_arch", "memory_size", "program_address",
+                                             "program_pointer", "trace_steps", "first_instruction",
+                                             "is_input_active", "memory_write_access", "tos_push",
+                                             "input_destination", "registers", "program", "memories",
+                                             "devices"])):
+    """
+    State of the CPU
+    isa, architecture, io_arch, memory_size - configuration of the CPU, program_address - where the program is
+    loaded, program_pointer - number of the current instruction of the program, trace_steps - number of the traced
+    instructions, first_instruction - whether the first instruction is not read yet, is_input_active - whether
+    the CPU waits for the input, memory_write_access and tos_push - where the input goes (into the memory,
+    pushing the register stack), input_destination - the memory address or the number of the register the input
+    goes to (-1 if the CPU does not wait for the input), registers - tuple of the values of the registers,
+    program - ObjectFile or the text of the loaded program, memories - tuple of the touched pages of the data
+    memory (and of the program memory for the Harvard architecture), each a dict {page number: bytes},
+    devices - dict {port: bitarray} of the contents of the devices
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        """
+        Reads the snapshot
+        :param blob: bytes - the snapshot
+        :return: CPUSnapshot
+        """
+        view = memoryview(blob)
+        try:
+            (magic, version, isa, architecture, io_arch, flags, memory_size, program_address, program_pointer,
+             trace_steps) = HEADER.unpack_from(view)
+            if magic != SNAPSHOT_MAGIC:
+                raise SnapshotError("Not a CPU snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise SnapshotError(f"Unsupported version of the CPU snapshot: {version}")
+            offset = HEADER.size
+
+            input_destination, = INPUT_DESTINATION.unpack_from(view, offset)
+            offset += INPUT_DESTINATION.size
+
+            count, = COUNT.unpack_from(view, offset)
+            offset += COUNT.size
+            registers = tuple(value for value, in REGISTER_VALUE.iter_unpack(
+                view[offset:offset + count * REGISTER_VALUE.size]))
+            offset += count * REGISTER_VALUE.size
+
+            kind, length = PROGRAM_HEADER.unpack_from(view, offset)
+            offset += PROGRAM_HEADER.size
+            program = bytes(cls.__read(view, offset, length))
+            program = ObjectFile.from_bytes(program) if kind == PROGRAM_OBJECT else str(program, "utf-8")
+            offset += length
+
+            memories = []
+            memories_count, = COUNT.unpack_from(view, offset)
+            offset += COUNT.size
+            for _ in range(memories_count):
+                pages = dict()
+                pages_count, = COUNT.unpack_from(view, offset)
+                offset += COUNT.size
+                for _ in range(pages_count):
+                    page_number, length = PAGE_HEADER.unpack_from(view, offset)
+                    offset += PAGE_HEADER.size
+                    pages[page_number] = bytes(cls.__read(view, offset, length))
+                    offset += length
+                memories.append(pages)
+
+            devices = dict()
+            devices_count, = COUNT.unpack_from(view, offset)
+            offset += COUNT.size
+            for _ in range(devices_count):
+                length, bits = DEVICE_HEADER.unpack_from(view, offset)
+                offset += DEVICE_HEADER.size
+                port = str(cls.__read(view, offset, length), "utf-8")
+                offset += length
+                state = bitarray()
+                state.frombytes(bytes(cls.__read(view, offset, (bits + 7) // 8)))
+                del state[bits:]
+                devices[port] = state
+                offset += (bits + 7) // 8
+
+            return cls(ISA_NAMES[isa], ARCHITECTURES[architecture], IO_MODES[io_arch], memory_size, program_address,
+                       program_pointer, trace_steps, bool(flags & FIRST_INSTRUCTION), bool(flags & INPUT_ACTIVE),
+                       bool(flags & MEMORY_WRITE_ACCESS), bool(flags & TOS_PUSH), input_destination, registers,
+                       program, tuple(memories), devices)
+        except (struct.error, IndexError, UnicodeDecodeError, ObjectFileError):
+            raise SnapshotError("The CPU snapshot is damaged")
+
+    @staticmethod
+    def __read(view, offset, length):
+        """
+        Takes the part of the snapshot, making sure it is not cut short
+        :param view: memoryview - the snapshot
+        :param offset: int - where the part starts
+        :param length: int - length of the part
+        :return: memoryview
+        """
+        if offset + length > len(view):
+            raise SnapshotError("The CPU snapshot is cut short")
+        return view[offset:offset + length]
+
+    def to_bytes(self):
+        """
+        Writes the snapshot
+        :return: bytes
+        """
+        flags = (FIRST_INSTRUCTION * self.first_instruction | INPUT_ACTIVE * self.is_input_active |
+                 MEMORY_WRITE_ACCESS * self.memory_write_access | TOS_PUSH * self.tos_push)
+        parts = [HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, ISA_NAMES.index(self.isa),
+                             ARCHITECTURES.index(self.architecture), IO_MODES.index(self.io_arch), flags,
+                             self.memory_size, self.program_address, self.program_pointer, self.trace_steps),
+                 INPUT_DESTINATION.pack(self.input_destination),
+                 COUNT.pack(len(self.registers))]
+        parts += [REGISTER_VALUE.pack(value) for value in self.registers]
+
+        if isinstance(self.program, ObjectFile):
+            program = PROGRAM_OBJECT, self.program.to_bytes()
+        else:
+            program = PROGRAM_TEXT, self.program.encode("utf-8")
+        parts += [PROGRAM_HEADER.pack(program[0], len(program[1])), program[1]]
+
+        parts.append(COUNT.pack(len(self.memories)))
+        for pages in self.memories:
+            parts.append(COUNT.pack(len(pages)))
+            for page_number, page in pages.items():
+                parts += [PAGE_HEADER.pack(page_number, len(page)), page]
+
+        parts.append(COUNT.pack(len(self.devices)))
+        for port, state in self.devices.items():
+            port = port.encode("utf-8")
+            parts += [DEVICE_HEADER.pack(len(port), len(state)), port, state.tobytes()]
+
+        return b"".join(parts)
+
+
+def is_snapshot(blob):
+    """
+    Checks if the bytes are a CPU snapshot
+    :param blob: bytes - the bytes (or at least the first of them)
+    :return: bool
+    """
+    return bytes(blob[:len(SNAPSHOT_MAGIC)]) == SNAPSHOT_MAGIC
+
+
+class SnapshotError(Exception):
+    """ Error raised when the CPU snapshot can not be read """
@@ -4,8 +4,12 @@
 # Assembly Simulator project 2020
 # GNU General Public License v3.0
 import unittest
+import tempfile
+import copy
 import os
-from modules.assembler import Assembler, AssemblerError
+from modules.assembler import Assembler, AssemblerError, AssemblerCache
+from modules.isa import ISA_TABLES, ISA_NAMES
+from modules.object_file import ObjectFile, ObjectFileError, is_object_file
 
 
 # This module tests the Assembler's basic functionality
@@ -120,6 +124,136 @@ class TestAssembler(unittest.TestCase):
         with self.assertRaises(AssemblerError):
             Assembler("risc1", ".anime 024")
 
+    def test_operands(self):
+        """ Test reading the operands and choosing the encoding of the instruction by them """
+        grammar = Assembler("cisc", "nop").grammar
+        self.assertEqual(grammar.tokenize("[%R01-$12]"), ("memregoff", "001", "-", 12, None))
+        self.assertEqual(grammar.tokenize(".arr+$2"), ("labelindex", None, "+", 2, "arr"))
+        self.assertEqual(grammar.tokenize("%R09").shape, None)
+        self.assertEqual([types for _, types in grammar.encodings("mov", ("reg", "number"))], [("reg", "imm")])
+
+        # The same lines jumping to the label are encoded differently, depending on where they are
+        binary = Assembler("risc3", ".loop\njmp .loop\njmp .loop\njmp .loop\n").binary_code.split()
+        self.assertEqual(len(set(binary)), 3)
+
+        # The sign of the offset number is a part of the number
+        self.assertEqual(Assembler("cisc", "mov [%R00-$+5], $7").binary_code,
+                         Assembler("cisc", "mov [%R00-$5], $7").binary_code)
+
+        # The number does not fit into any of the encodings
+        with self.assertRaises(AssemblerError):
+            Assembler("risc3", "mov_low %R00, $1000")
+
+    def test_streaming(self):
+        """ Test assembling the programs line by line, from the files and other sources of lines """
+        with open(os.path.join("modules", "program_examples", "label_test_cisc.asm"), "r") as file:
+            program_text = file.read()
+        lines = program_text.split("\n")
+        self.assertEqual("".join(Assembler("cisc").assemble_lines(lambda: iter(lines))), self.label_cisc)
+
+        with tempfile.TemporaryDirectory() as directory:
+            input_path, output_path = os.path.join(directory, "program.asm"), os.path.join(directory, "program.bin")
+            with open(input_path, "w") as file:
+                file.write(program_text)
+            Assembler("cisc").assemble_file(input_path, output_path)
+            with open(output_path, "r") as file:
+                self.assertEqual(file.read(), self.label_cisc)
+
+            # Nothing is written if the program has errors
+            os.remove(output_path)
+            with open(input_path, "a") as file:
+                file.write("\nmov_low %R00, $4\n")
+            with self.assertRaises(AssemblerError):
+                Assembler("cisc").assemble_file(input_path, output_path)
+            self.assertEqual(os.listdir(directory), ["program.asm"])
+
+    def test_object_file(self):
+        """ Test writing the assembled programs into the object files and reading them back """
+        with open(os.path.join("modules", "program_examples", "directive_test_cisc.asm"), "r") as file:
+            assembler = Assembler("cisc", file.read())
+        program = assembler.object_file()
+        blob = program.to_bytes()
+        self.assertTrue(is_object_file(blob))
+        self.assertEqual(ObjectFile.from_bytes(blob), program)
+        self.assertEqual(program.text(), self.directives_cisc)
+        self.assertEqual(program.data, {name: value if isinstance(value, int) else tuple(value)
+                                        for name, value in assembler.mov_labels.items()})
+        self.assertEqual(ObjectFile.from_bytes(program.strip().to_bytes()).symbols, {})
+
+        # RISC-Stack instructions are not made of whole bytes
+        program = ObjectFile.from_text("risc1", self.complete_risc1, entry_point=600)
+        self.assertEqual(ObjectFile.from_bytes(program.to_bytes()).text(), self.complete_risc1)
+        self.assertEqual(ObjectFile.from_bytes(program.to_bytes()).entry_point, 600)
+
+        with tempfile.TemporaryDirectory() as directory:
+            input_path, output_path = os.path.join(directory, "program.asm"), os.path.join(directory, "program.o")
+            with open(input_path, "w") as file:
+                file.write("mov_low %R00, $7\n.end\njmp .end\n")
+            Assembler("risc3").assemble_file(input_path, output_path, object_file=True)
+            with open(output_path, "rb") as file:
+                program = ObjectFile.from_bytes(file.read())
+            self.assertEqual(program.symbols, {"end": 1})
+            self.assertEqual(program.text(), Assembler("risc3", "mov_low %R00, $7\n.end\njmp .end\n").binary_code)
+
+        # Damaged object files
+        with self.assertRaises(ObjectFileError):
+            ObjectFile.from_bytes(blob[:-3])
+        with self.assertRaises(ObjectFileError):
+            ObjectFile.from_bytes(b"HSAO" + bytes([9]) + blob[5:])
+        with self.assertRaises(ObjectFileError):
+            ObjectFile.from_text("risc3", "0101\n")
+
+    def test_cache(self):
+        """ Test that the same programs are assembled only once, and the least recently used ones are forgotten """
+        with open(os.path.join("modules", "demos", "risc3", "helloworld.asm"), "r") as file:
+            program_text = file.read()
+        cache = AssemblerCache(max_size=2)
+        program = cache.assemble("risc3", program_text)
+        self.assertEqual(program.text(), Assembler("risc3", program_text).binary_code)
+
+        # Comments, empty lines and spaces around the lines do not change the program
+        self.assertIs(cache.assemble("risc3", "# Hello World\n\n" + program_text.replace("\n", "  \n")), program)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # The same program for another ISA is a different program
+        with self.assertRaises(AssemblerError):
+            cache.assemble("risc1", program_text)
+        self.assertEqual(len(cache), 1)
+
+        cache.assemble("risc3", "nop")
+        cache.assemble("risc3", program_text)
+        cache.assemble("risc3", "halt")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.misses, 3)
+        cache.assemble("risc3", "nop")
+        self.assertEqual(cache.misses, 4)
+
+        # The programs saved in the directory are remembered by the other caches
+        with tempfile.TemporaryDirectory() as directory:
+            program = AssemblerCache(directory=directory).assemble("risc3", program_text)
+            self.assertEqual(program.symbols, Assembler("risc3", program_text).jump_labels)
+            path, = [os.path.join(directory, name) for name in os.listdir(directory)]
+            with open(path, "rb") as file:
+                self.assertEqual(ObjectFile.from_bytes(file.read()), program)
+
+            # The program is read from the directory, not assembled
+            with open(path, "wb") as file:
+                file.write(Assembler("risc3", "nop").object_file().to_bytes())
+            self.assertEqual(AssemblerCache(directory=directory).assemble("risc3", program_text).text(),
+                             Assembler("risc3", "nop").binary_code)
+
+    def test_isa_tables(self):
+        """ Test that the ISA tables are shared by the assemblers and can not be changed """
+        self.assertEqual(set(ISA_TABLES), set(ISA_NAMES))
+        self.assertIs(Assembler("risc3", "nop").instructions, Assembler("risc3", "halt").instructions)
+
+        tables = ISA_TABLES["risc3"]
+        self.assertEqual(tables.register_codes["R00"], "000")
+        self.assertEqual({len(opcode) for opcode, _ in tables.mnemonics["mov_low"]}, {5})
+        self.assertIs(copy.deepcopy(tables.instructions), tables.instructions)
+        with self.assertRaises(TypeError):
+            tables.register_codes["R00"] = "111"
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+import random
+import unittest
+from bitarray.util import ba2int, int2ba
+
+from modules import functions, int_functions
+from modules.functions import twos_complement
+from modules.register import Register
+
+
+# This module checks the integer ALU against the original bitarray-based one, bit for bit:
+# the results of the operations and the flags they leave in the flag register have to be the same
+
+
+class TestIntFunctions(unittest.TestCase):
+    # Widths of the operands, the way the instructions pass them to the ALU
+    operand_widths = [(16, 16), (16, 16, 16), (16, 7), (16, 8), (16, 5), (16, 10)]
+    edge_values = [0, 1, 2, 0x7f, 0x80, 0xff, 0x7ffe, 0x7fff, 0x8000, 0x8001, 0xfffe, 0xffff]
+
+    # The exact results of the operations on their last two (signed) operands, for the results the original
+    # functions fail to turn back into bits
+    exact_results = {"add": lambda first, second: first + second,
+                     "sub": lambda first, second: first - second,
+                     "mul": lambda first, second: first * second,
+                     "div": lambda first, second: first // second}
+
+    def setUp(self):
+        """ Generates the operands for the comparison """
+        generator = random.Random(2020)
+        self.cases = []
+        for widths in self.operand_widths:
+            for _ in range(300):
+                operands = []
+                for width in widths:
+                    if generator.random() < 0.3:
+                        operands.append(generator.choice(self.edge_values) & ((1 << width) - 1))
+                    else:
+                        operands.append(generator.getrandbits(width))
+                self.cases.append((operands, widths, generator.getrandbits(16)))
+
+    def compare(self, name, operands, widths, flags):
+        """
+        Runs the original and the integer ALU function on the same operands and compares the results
+        :param name: str - name of the instruction
+        :param operands: list of ints - values of the operands
+        :param widths: list of ints - widths of the operands
+        :param flags: int - the value of the flag register before the operation
+        """
+        legacy_flag_register, flag_register = Register("FR"), Register("FR")
+        legacy_flag_register.value = flag_register.value = flags
+
+        message = f"{name} {[hex(operand) for operand in operands]}, widths {widths}, flags {flags:04x}"
+        try:
+            expected = functions.functions_dictionary[name](
+                [int2ba(operand, width) for operand, width in zip(operands, widths)], legacy_flag_register)
+        except ZeroDivisionError:
+            with self.assertRaises(ZeroDivisionError):
+                int_functions.int_functions_dictionary[name](operands, widths, flag_register)
+            return
+        except ValueError as error:
+            self.compare_failed(name, operands, widths, flag_register, error, message)
+            return
+
+        result = int_functions.int_functions_dictionary[name](operands, widths, flag_register)
+        self.assertEqual(result, ba2int(expected) if expected else 0, message)
+        self.assertEqual(flag_register.value, legacy_flag_register.value, message)
+
+    def compare_failed(self, name, operands, widths, flag_register, error, message):
+        """
+        Checks the integer ALU function on the operands the original one failed on (turning the bits of
+        a result too long for 16 bits back into the bitarray): it either fails the same way, or keeps the lowest
+        16 bits of the result in two's complement of 18 bits and sets the carry flag (see int_functions.py)
+        :param name: str - name of the instruction
+        :param operands: list of ints - values of the operands
+        :param widths: list of ints - widths of the operands
+        :param flag_register: Register - the flag register with the value before the operation
+        :param error: ValueError - the error of the original function
+        :param message: str - description of the case
+        """
+        try:
+            result = int_functions.int_functions_dictionary[name](operands, widths, flag_register)
+        except ValueError as int_error:
+            self.assertEqual(str(int_error), str(error), message)
+            return
+
+        self.assertIn(name, self.exact_results, f"{message}: the original function failed with {error}")
+        exact = self.exact_results[name](*[twos_complement(operand, width)
+                                           for operand, width in zip(operands[-2:], widths[-2:])])
+        self.assertEqual(result, abs(twos_complement(exact, 18)) & 0xFFFF, message)
+        self.assertTrue(flag_register.value & int_functions.CARRY_FLAG, message)
+
+    def test_arithmetic(self):
+        """ Tests the arithmetic operations, which set the flags """
+        for name in ["add", "addc", "sub", "inc", "dec", "mul", "div"]:
+            for operands, widths, flags in self.cases:
+                self.compare(name, operands, widths, flags)
+
+    def test_logic(self):
+        """ Tests the bitwise operations and shifts """
+        for name in ["and", "or", "xor", "not", "lsh", "rsh"]:
+            for operands, widths, flags in self.cases:
+                # Shifts only ever get 16-bit values to shift
+                if name not in ["lsh", "rsh"] or widths[-2] == 16:
+                    self.compare(name, operands, widths, flags)
+
+    def test_comparisons(self):
+        """ Tests the comparisons, which only return the flags or the result of the comparison """
+        for name in ["cmp", "cmpe", "cmpb", "test"]:
+            for operands, widths, flags in self.cases:
+                self.compare(name, operands, widths, flags)
+
+    def test_moves(self):
+        """ Tests the instructions moving the values """
+        for name in ["load", "store", "dup", "mov", "mov_low", "mov_high"]:
+            for operands, widths, flags in self.cases:
+                if name not in ["mov_low", "mov_high"] or widths == (16, 8):
+                    self.compare(name, operands, widths, flags)
+
+
+if __name__ == '__main__':
+    unittest.main()
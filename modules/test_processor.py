@@ -4,11 +4,21 @@
 # Assembly Simulator project 2020
 # GNU General Public License v3.0
 import os
+import copy
+import json
+import tempfile
 import unittest
+from bitarray import bitarray
 from bitarray.util import ba2hex
 
-from modules.processor import CPU
+from modules.processor import CPU, SimulatorError, MEMORY_CHANGES_LIMIT, COMPILED_MODE, INTERPRETER_MODE
+from modules.memory import SimulatorMemoryError
 from modules.assembler import Assembler
+from modules.object_file import ObjectFile
+from modules.snapshot import SnapshotError
+from modules.batch import read_manifest, run_batch
+from modules.benchmark import find_programs, run_benchmarks, compare
+from modules.trace import TRACE_OFF, TRACE_SUMMARY, TRACE_FULL, TraceBuffer
 
 # This module tests the basic functionality of the processor module, including
 # its initialization (registers, program text, memory etc.)
@@ -1307,6 +1317,528 @@ class TestCPU(unittest.TestCase):
         cpu.web_next_instruction()
         self.assertEqual(ba2hex(cpu.data_memory.read_data(256 * 8, 264 * 8)), '0046004701001efc')
 
+    def test_run(self):
+        """ Tests the headless execution of the programs """
+        cpu_risc1 = CPU("risc1", "harvard", "special", self.risc1_hello_world)
+        cpu_risc3 = CPU("risc3", "neumann", "special", self.risc3_alphabet)
+
+        result = cpu_risc1.run()
+        self.assertEqual(result.halt_reason, "halt")
+        self.assertEqual(result.output, "        Hello world!")
+
+        # Running for a number of steps is the same as clicking through them
+        result = cpu_risc3.run(max_steps=34)
+        self.assertEqual((result.steps, result.halt_reason, result.ip), (34, "max_steps", 520))
+        self.assertEqual(result.output, "              ABCDEF")
+
+        # The CPU stops before the instruction at the breakpoint, but can go on from it
+        result = cpu_risc3.run(breakpoints=[522])
+        self.assertEqual((result.steps, result.halt_reason, result.ip), (1, "breakpoint", 522))
+        result = cpu_risc3.run(breakpoints=[522])
+        self.assertEqual((result.steps, result.halt_reason, result.ip), (5, "breakpoint", 522))
+        self.assertEqual(result.output, "             ABCDEFG")
+
+        result = cpu_risc3.run()
+        self.assertEqual(result.halt_reason, "halt")
+        self.assertEqual(result.output, "GHIJKLMNOPQRSTUVWXYZ")
+
+        # The stack starts at the end of the memory, pushing into the memory-mapped shell whatever is not text
+        cpu_mmio = CPU("cisc", "neumann", "mmio", Assembler("cisc", "mov %R00, $255\npush %R00\nhalt\n").object_file())
+        result = cpu_mmio.run()
+        self.assertEqual((result.steps, result.halt_reason), (2, "halt"))
+        self.assertEqual(result.output, " " * 19 + "�")
+
+    def test_memory(self):
+        """ Tests the byte and word accessors of the memory against its bit interface """
+        memory = CPU("risc3", "harvard", "special", self.risc3_alphabet).data_memory
+
+        memory.write_word(10, 0x1234)
+        self.assertEqual(memory.read_data(10 * 8, 12 * 8).to01(), '0001001000110100')
+        self.assertEqual((memory.read_byte(10), memory.read_byte(11)), (0x12, 0x34))
+        self.assertEqual(bytes(memory.view(10, 12)), b'\x12\x34')
+
+        # Writing bits, which do not fill whole bytes, keeps the rest of the bytes intact
+        memory.write_data(10 * 8 + 4, bitarray('111111'))
+        self.assertEqual(memory.read_word(10), 0x1ff4)
+        self.assertEqual(memory.read_data(10 * 8 + 2, 10 * 8 + 12).to01(), '0111111111')
+
+        with self.assertRaises(SimulatorMemoryError):
+            memory.write_word(1023, 0)
+        with self.assertRaises(SimulatorMemoryError):
+            memory.write_data(1023 * 8, bitarray('0' * 16))
+
+    def test_paged_memory(self):
+        """ Tests the full 64KiB memory, which only allocates the pages written to """
+        cpu = CPU("risc3", "harvard", "special", self.risc3_alphabet, memory_size=65536)
+        memory = cpu.data_memory
+        self.assertEqual(memory.touched_pages(), [])
+        self.assertEqual(memory.read_word(40000), 0)
+
+        # Words can cross the page boundary
+        memory.write_word(255, 0xabcd)
+        self.assertEqual(memory.read_word(255), 0xabcd)
+        self.assertEqual(bytes(memory.view(254, 258)), b'\x00\xab\xcd\x00')
+        self.assertEqual([address for address, page in memory.touched_pages()], [0, 256])
+
+        # Writing zeros does not allocate the pages
+        memory.write_data(0, bitarray('0' * memory.memory_size))
+        self.assertEqual(len(memory.touched_pages()), 2)
+        self.assertEqual(memory.read_word(255), 0)
+
+        # The end of the stack does not fit into 16 bits, so it wraps to the last word of the memory
+        self.assertEqual(cpu.registers['SP'].value, 0)
+        cpu._CPU__push_stack(0x1234)
+        self.assertEqual((cpu.registers['SP'].value, memory.read_word(65534)), (65534, 0x1234))
+        self.assertEqual(cpu._CPU__pop_stack(), 0x1234)
+        self.assertEqual(cpu.registers['SP'].value, 0)
+
+        cpu.run()
+        self.assertEqual(str(cpu.ports_dictionary['1']), "GHIJKLMNOPQRSTUVWXYZ")
+
+    def test_instruction_table(self):
+        """ Tests that every instruction of every ISA gets a handler, and the copies of the CPU can use them """
+        for isa in ["risc1", "risc2", "risc3", "cisc"]:
+            cpu = CPU(isa, "neumann", "special", "")
+            self.assertEqual(set(cpu.instruction_table), set(cpu.instructions_dict))
+            for entry in cpu.instruction_table.values():
+                self.assertTrue(callable(entry.handler))
+
+        cpu = CPU("risc3", "neumann", "special", self.risc3_alphabet)
+        cpu.run(max_steps=10)
+        copied_cpu = copy.deepcopy(cpu)
+        copied_cpu.run()
+        self.assertEqual(str(copied_cpu.ports_dictionary['1']), "GHIJKLMNOPQRSTUVWXYZ")
+        self.assertEqual(str(cpu.ports_dictionary['1']), "                   A")
+
+    def test_checkpoint(self):
+        """ Tests going back to the checkpoints of the CPU and peeking at the next instruction """
+        cpu = CPU("risc3", "harvard", "special", self.risc3_alphabet)
+        self.assertFalse(cpu.is_halted())
+        self.assertEqual(cpu.peek_next(), cpu.program_memory.read_data(512 * 8, 514 * 8))
+
+        cpu.run(max_steps=10)
+        registers = {name: register.value for name, register in cpu.registers.items()}
+        checkpoint = cpu.checkpoint()
+        cpu.data_memory.write_word(0, 0x1234)
+        cpu.run()
+        self.assertTrue(cpu.is_halted())
+        self.assertEqual(str(cpu.ports_dictionary['1']), "GHIJKLMNOPQRSTUVWXYZ")
+
+        # The checkpoint can be used several times
+        for _ in range(2):
+            cpu.rollback(checkpoint)
+            self.assertEqual({name: register.value for name, register in cpu.registers.items()}, registers)
+            self.assertEqual(cpu.data_memory.read_word(0), 0)
+            self.assertEqual(str(cpu.ports_dictionary['1']), "                   A")
+            cpu.run()
+            self.assertEqual(str(cpu.ports_dictionary['1']), "GHIJKLMNOPQRSTUVWXYZ")
+
+        # Peeking does not change anything
+        cpu.rollback(checkpoint)
+        next_instruction = cpu.peek_next()
+        self.assertEqual({name: register.value for name, register in cpu.registers.items()}, registers)
+        cpu.web_next_instruction()
+        self.assertEqual(cpu.instruction, next_instruction)
+
+        cpu.run()
+        self.assertEqual(cpu.peek_next(), cpu.instruction)
+
+    def test_trace(self):
+        """ Tests the summary trace records and the ring buffer keeping the last of them """
+        cpu = CPU("risc3", "neumann", "special", self.risc3_alphabet)
+        self.assertEqual(cpu.trace_level, TRACE_OFF)
+
+        records = []
+        cpu.set_trace(TRACE_SUMMARY, records.append)
+        cpu.run(max_steps=12)
+        self.assertEqual([record.step for record in records], list(range(12)))
+        self.assertEqual(records[0].ip, 512)
+        self.assertEqual(len(records[0].registers), len(cpu.registers))
+
+        buffer = TraceBuffer(5)
+        cpu.set_trace(TRACE_SUMMARY, buffer)
+        cpu.run(max_steps=12)
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual([record.step for record in buffer.records()], list(range(7, 12)))
+        self.assertEqual(buffer.records()[-1].registers,
+                         tuple(register.value for register in cpu.registers.values()))
+
+        # The full trace logs the details of every instruction
+        cpu.set_trace(TRACE_FULL)
+        with self.assertLogs('processor', level='DEBUG') as logs:
+            cpu.run(max_steps=1)
+        self.assertTrue(any("Registers state" in message for message in logs.output))
+
+        cpu.set_trace(TRACE_OFF)
+        cpu.run(max_steps=1)
+        self.assertEqual(len(buffer), 5)
+
+    def test_memory_changes(self):
+        """ Tests tracking of the written parts of the memories """
+        cpu = CPU("risc3", "harvard", "special", self.risc3_alphabet, memory_size=4096)
+        changes = cpu.take_memory_changes()
+        self.assertEqual(changes["data"], [])
+        self.assertEqual(changes["program"][0][0], 512)
+
+        cpu.data_memory.write_word(10, 0x1234)
+        cpu.data_memory.write_byte(12, 0x56)
+        cpu.data_memory.write_byte(100, 0x78)
+        self.assertEqual(cpu.take_memory_changes(), {"data": [(10, 13), (100, 101)], "program": []})
+        self.assertEqual(cpu.take_memory_changes(), {"data": [], "program": []})
+
+        # Peeking at the next instruction does not leave any changes behind
+        cpu.run(max_steps=5)
+        cpu.take_memory_changes()
+        cpu.peek_next()
+        self.assertEqual(cpu.take_memory_changes(), {"data": [], "program": []})
+
+        # Many scattered writes are merged into one range
+        for address in range(0, 3 * (MEMORY_CHANGES_LIMIT + 1), 3):
+            cpu.data_memory.write_byte(address, 1)
+        self.assertEqual(cpu.take_memory_changes()["data"], [(0, 3 * MEMORY_CHANGES_LIMIT + 1)])
+
+    def test_compiled_mode(self):
+        """ Tests that the compiled basic blocks give the same results as the interpreter """
+        programs = [("risc1", self.complete_risc1), ("risc1", self.risc1_alphabet), ("risc2", self.complete_risc2),
+                    ("risc2", self.risc2_hello_world), ("risc3", self.complete_risc3), ("risc3", self.risc3_alphabet),
+                    ("cisc", self.complete_cisc), ("cisc", self.label_cisc)]
+
+        def run_in_chunks(isa, program, mode, chunk, breakpoints=()):
+            cpu = CPU(isa, "neumann", "special", program)
+            cpu.set_execution_mode(mode)
+            results = []
+            while not cpu.is_halted() and len(results) < 1000:
+                results.append(cpu.run(max_steps=chunk, breakpoints=breakpoints))
+                if cpu.is_input_active:
+                    cpu.input_finish("1000001")
+            registers = {name: register.value for name, register in cpu.registers.items()}
+            return results, registers, cpu.data_memory.read_bytes(0, cpu.data_memory.size), cpu.program_pointer
+
+        for isa, program in programs:
+            for chunk, breakpoints in [(None, ()), (1, ()), (7, ()), (100, (516, 520))]:
+                self.assertEqual(run_in_chunks(isa, program, COMPILED_MODE, chunk, breakpoints),
+                                 run_in_chunks(isa, program, INTERPRETER_MODE, chunk, breakpoints), f"{isa} {chunk}")
+
+        with self.assertRaises(SimulatorError):
+            CPU("risc3", "neumann", "special", self.risc3_alphabet).set_execution_mode("jit")
+
+    def test_compiled_self_modifying(self):
+        """ Tests that the compiled blocks see the writes into the program they were compiled from """
+        new_instruction = int(Assembler("risc3", "mov_low %R00, $99").binary_code, 2)
+
+        # Overwrites the 'add' instruction (at 524) in the same basic block
+        program = Assembler("risc3", f"mov_low %R01, $1\nmov_low %R02, $12\nmov_high %R02, $2\n"
+                                     f"mov_low %R03, ${new_instruction & 0xFF}\n"
+                                     f"mov_high %R03, ${new_instruction >> 8}\n"
+                                     f"store [%R02], %R03\nadd %R00, %R00, %R01\nnop\n").binary_code
+        for mode in [COMPILED_MODE, INTERPRETER_MODE]:
+            cpu = CPU("risc3", "neumann", "special", program)
+            cpu.set_execution_mode(mode)
+            self.assertEqual(cpu.run().steps, 8)
+            self.assertEqual(cpu.registers["R00"].value, 99)
+
+    def test_jump_table(self):
+        """ Tests the offsets of the instructions used for the jumps, and following the IP changed from outside """
+        cpu = CPU("cisc", "neumann", "special", self.complete_cisc)
+        sizes = cpu.instr_size_list
+        self.assertEqual(cpu.instr_offsets, [sum(sizes[:i]) for i in range(len(sizes) + 1)])
+
+        # Moving the IP to the third instruction by hand should move the program pointer with it
+        cpu.registers["IP"].value = cpu.program_address + sizes[0] + sizes[1]
+        cpu.sync_program_pointer()
+        self.assertEqual(cpu.program_pointer, 2)
+
+        # Not an address of an instruction, nothing to follow
+        cpu.registers["IP"].value += 1
+        cpu.sync_program_pointer()
+        self.assertEqual(cpu.program_pointer, 2)
+
+    def test_reset(self):
+        """ Tests that the reset CPU behaves as the new one, and that the CPUs share the tables of the ISA """
+        cpu = CPU("risc3", "harvard", "special", self.risc3_alphabet)
+        self.assertIs(cpu.instruction_table, CPU("risc3", "neumann", "mmio", "").instruction_table)
+        cpu.run()
+        self.assertEqual(str(cpu.ports_dictionary['1']), "ABCDEFGHIJKLMNOPQRSTUVWXYZ"[-20:])
+
+        # The same program again
+        cpu.reset()
+        self.assertEqual(cpu.registers["SP"].value, 1024)
+        self.assertEqual(str(cpu.ports_dictionary['1']).strip(), "")
+        cpu.run()
+        self.assertEqual(str(cpu.ports_dictionary['1']), "ABCDEFGHIJKLMNOPQRSTUVWXYZ"[-20:])
+
+        # Another program, somewhere else in the memory
+        program = Assembler("risc3", "mov_low %R00, $7\nadd %R01, %R00, %R00\n").binary_code
+        cpu.reset(program, 600)
+        new_cpu = CPU("risc3", "harvard", "special", program, 600)
+        self.assertEqual(cpu.data_memory.touched_pages(), [])
+        self.assertEqual(cpu.program_memory.read_bytes(0, 1024), new_cpu.program_memory.read_bytes(0, 1024))
+        self.assertEqual(cpu.run(), new_cpu.run())
+        self.assertEqual({name: register.value for name, register in cpu.registers.items()},
+                         {name: register.value for name, register in new_cpu.registers.items()})
+        self.assertEqual(cpu.registers["R01"].value, 14)
+
+    def test_object_file(self):
+        """ Tests that the programs loaded from the object files run the same way as the ones from the text """
+        for isa, program_text in [("risc1", self.risc1_alphabet), ("risc2", self.risc2_hello_world),
+                                  ("risc3", self.risc3_alphabet), ("cisc", self.complete_cisc)]:
+            program = ObjectFile.from_bytes(ObjectFile.from_text(isa, program_text).to_bytes())
+            cpu, text_cpu = CPU(isa, "neumann", "special", program), CPU(isa, "neumann", "special", program_text)
+            self.assertEqual(cpu.program_memory.read_bytes(0, 1024), text_cpu.program_memory.read_bytes(0, 1024))
+            self.assertEqual(cpu.instr_size_list, text_cpu.instr_size_list)
+            self.assertEqual(cpu.run(), text_cpu.run())
+            self.assertEqual({name: register.value for name, register in cpu.registers.items()},
+                             {name: register.value for name, register in text_cpu.registers.items()})
+
+        # The program has to be run on the ISA it was assembled for
+        with self.assertRaises(SimulatorError):
+            CPU("risc2", "neumann", "special", ObjectFile.from_text("risc3", self.risc3_alphabet))
+
+    def test_batch(self):
+        """ Tests running the jobs of the manifest in the worker processes and in this one """
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "echo.asm"), "w") as file:
+                file.write("in %R00, $1\nout $1, %R00\nin %R00, $1\nout $1, %R00\nhalt\n")
+            with open(os.path.join(directory, "push.asm"), "w") as file:
+                file.write("mov %R00, $255\npush %R00\nhalt\n")
+            with open(os.path.join(directory, "divide.asm"), "w") as file:
+                file.write("mov %R00, $7\nmov %R01, $0\ndiv %R00, %R01\nhalt\n")
+            with open(os.path.join(directory, "alphabet.o"), "wb") as file:
+                file.write(ObjectFile.from_text("risc3", self.risc3_alphabet).to_bytes())
+
+            jobs = [{"file": "echo.asm", "isa": "cisc", "input": "hi", "id": "echo"},
+                    {"file": "echo.asm", "isa": "cisc", "input": "h"},
+                    {"file": "alphabet.o", "architecture": "harvard", "max_steps": 10},
+                    {"file": "alphabet.o"},
+                    {"file": "echo.asm", "isa": "risc1"},
+                    {"file": "push.asm", "isa": "cisc", "io": "mmio"},
+                    {"file": "divide.asm", "isa": "cisc", "input": "x"}]
+            with open(os.path.join(directory, "manifest.jsonl"), "w") as file:
+                file.write("\n".join(json.dumps(job) for job in jobs))
+
+            results = list(run_batch(read_manifest(os.path.join(directory, "manifest.jsonl")), workers=1))
+            self.assertEqual(list(run_batch(read_manifest(os.path.join(directory, "manifest.jsonl")), workers=2)),
+                             results)
+
+        self.assertEqual([result.halt_reason for result in results],
+                         ["halt", "input", "max_steps", "halt", "error", "halt", "error"])
+        self.assertEqual((results[0].id, results[0].steps, results[0].output.strip()), ("echo", 4, "hi"))
+        self.assertEqual(results[0].registers["R00"], ord("i"))
+        self.assertEqual(results[2].steps, 10)
+        self.assertEqual(results[3].output, "ABCDEFGHIJKLMNOPQRSTUVWXYZ"[-20:])
+        self.assertTrue(results[4].error.startswith("AssemblerError"))
+
+        # The stack pushes into the memory-mapped shell, the output is not text, but the program still ran
+        self.assertEqual((results[5].steps, results[5].registers["R00"], results[5].error), (2, 255, None))
+        self.assertEqual(results[5].output, " " * 19 + "\ufffd")
+
+        # The program failed while running, the state it reached is kept
+        self.assertEqual(results[6].registers["R00"], 7)
+        self.assertTrue(results[6].error.startswith("ZeroDivisionError"))
+
+    def test_benchmark(self):
+        """ Tests the benchmark suite on a few programs, and finding the regressions in its results """
+        programs = [program for program in find_programs() if "helloworld" in program[0]]
+        self.assertEqual({isa for _, isa, _ in programs}, {"risc1", "risc2", "risc3", "cisc"})
+        self.assertIn(("program_examples/assembly_test6.asm", "risc3"),
+                      [(name, isa) for name, isa, _ in find_programs()])
+
+        results = run_benchmarks(programs[:2], architectures=["neumann", "harvard"], min_time=0.001)
+        self.assertEqual(len(results["assembler"]), 2)
+        self.assertEqual(len(results["cpu"]), 4)
+        self.assertGreater(results["summary"]["instructions_per_second"], 0)
+        self.assertEqual(compare(results, results), [])
+
+        # Slower and bigger than the baseline
+        slower = copy.deepcopy(results)
+        case = slower["cpu"][f"{programs[0][0]}:harvard"]
+        case["instructions_per_second"] /= 2
+        case["peak_memory_bytes"] *= 1.1
+        regressions = compare(slower, results, threshold=0.05)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith(f"{programs[0][0]}:harvard instructions_per_second"))
+        self.assertEqual(compare(slower, results, threshold=0.5), [])
+
+    def test_profiling(self):
+        """ Tests counting the executed instructions, and that profiling does not change the execution """
+        cpu, profiled_cpu = CPU("risc3", "neumann", "special", self.risc3_alphabet), \
+            CPU("risc3", "neumann", "special", self.risc3_alphabet)
+        profiler = profiled_cpu.start_profiling()
+        result = profiled_cpu.run()
+        self.assertEqual(cpu.run(), result)
+
+        report = profiler.report(hot_count=3)
+        self.assertEqual(report.instructions, result.steps)
+        self.assertEqual(sum(report.instruction_mix.values()), result.steps)
+        self.assertEqual(report.instruction_mix["out"], 26)
+        self.assertEqual(report.instruction_mix["cmp"], 27)
+
+        # The comparison of the loop is the hottest instruction, it is executed once more to leave the loop
+        self.assertEqual(report.hot_addresses, [(518, 27), (520, 27), (522, 26)])
+        self.assertEqual(set(report.phase_seconds), {"fetch", "operands", "alu", "writeback"})
+        self.assertGreater(report.phase_seconds["fetch"], 0)
+
+        # The web interface steps are counted too
+        profiler.reset()
+        profiled_cpu.reset()
+        for _ in range(4):
+            profiled_cpu.web_next_instruction()
+        self.assertEqual(profiler.report().instructions, 3)
+
+        self.assertIs(profiled_cpu.stop_profiling(), profiler)
+        profiled_cpu.web_next_instruction()
+        self.assertEqual(profiler.instructions, 3)
+
+    def test_snapshot(self):
+        """ Tests saving the state of the CPU into a snapshot and restoring it in another CPU """
+        for architecture in ["neumann", "harvard"]:
+            cpu = CPU("risc3", architecture, "special", self.risc3_alphabet)
+            cpu.run(max_steps=30)
+            blob = cpu.snapshot()
+
+            # Only the touched pages of the memories are saved
+            self.assertLess(len(blob), 1024)
+            restored_cpu = CPU.from_snapshot(blob)
+            self.assertEqual(restored_cpu.snapshot(), blob)
+            self.assertEqual(restored_cpu.run(), cpu.run())
+            self.assertEqual({name: register.value for name, register in restored_cpu.registers.items()},
+                             {name: register.value for name, register in cpu.registers.items()})
+
+            # The snapshot can be restored several times, the program is loaded again
+            restored_cpu.restore(blob)
+            restored_cpu.run()
+            self.assertEqual(str(restored_cpu.ports_dictionary['1']), "GHIJKLMNOPQRSTUVWXYZ")
+
+        # The CPU waiting for the input, into a register and into the memory
+        for program in ["in %R00, $1\nout $1, %R00\nhalt\n", "in [%R01], $1\nout $1, [%R01]\nhalt\n"]:
+            cpu = CPU("cisc", "neumann", "special", Assembler("cisc", program).object_file())
+            self.assertEqual(cpu.run().halt_reason, "input")
+            restored_cpu = CPU.from_snapshot(cpu.snapshot())
+            self.assertTrue(restored_cpu.is_input_active)
+            for each_cpu in (cpu, restored_cpu):
+                each_cpu.input_finish(bin(ord("x"))[2:])
+                self.assertEqual(each_cpu.run().output.strip(), "x")
+
+        # Only a CPU of the same configuration can restore the snapshot
+        with self.assertRaises(SimulatorError):
+            CPU("risc3", "neumann", "special", self.risc3_alphabet).restore(blob)
+        with self.assertRaises(SimulatorError):
+            CPU("risc3", "harvard", "special", self.risc3_alphabet, memory_size=2048).restore(blob)
+
+        with self.assertRaises(SnapshotError):
+            CPU.from_snapshot(blob[:len(blob) // 2])
+        with self.assertRaises(SnapshotError):
+            CPU.from_snapshot(b"HSAO" + blob[4:])
+
+    def test_history(self):
+        """ Tests going back and forth over the executed instructions with the undo entries and the checkpoints """
+        cpu = CPU("risc3", "neumann", "special", self.risc3_alphabet)
+        with self.assertRaises(SimulatorError):
+            cpu.step_back()
+
+        # The state before every instruction, as the web interface shows it
+        states = []
+        cpu.web_next_instruction()
+        history = cpu.start_history(max_entries=20, checkpoint_interval=16, max_checkpoints=4)
+        while not cpu.is_halted():
+            states.append(({name: register.value for name, register in cpu.registers.items()},
+                           cpu.data_memory.read_bytes(0, 1024), str(cpu.ports_dictionary['1']), cpu.instruction))
+            cpu.web_next_instruction()
+        self.assertEqual(history.step, len(states))
+
+        def assert_state(step):
+            self.assertEqual(({name: register.value for name, register in cpu.registers.items()},
+                              cpu.data_memory.read_bytes(0, 1024), str(cpu.ports_dictionary['1']), cpu.instruction),
+                             states[step])
+
+        # Back by the undo entries, and further by the checkpoints
+        self.assertEqual(cpu.step_back(), 1)
+        assert_state(len(states) - 1)
+        self.assertEqual(cpu.step_back(30), 30)
+        assert_state(len(states) - 31)
+
+        # The last 4 checkpoints were taken every 16 instructions, the rest of them are forgotten
+        self.assertEqual(history.earliest_step, (len(states) // 16 - 3) * 16)
+        self.assertEqual(cpu.goto_step(history.earliest_step), history.earliest_step)
+        assert_state(history.earliest_step)
+        with self.assertRaises(SimulatorError):
+            cpu.goto_step(history.earliest_step - 1)
+
+        # Forward again, and the same way the second time
+        for step in [len(states) - 5, len(states) - 40, len(states) - 1]:
+            self.assertEqual(cpu.goto_step(step), step)
+            assert_state(step)
+        cpu.run()
+        self.assertEqual(str(cpu.ports_dictionary['1']), "GHIJKLMNOPQRSTUVWXYZ")
+
+        # Running the compiled blocks only takes the checkpoints between them
+        cpu.set_execution_mode(COMPILED_MODE)
+        cpu.reset()
+        cpu.web_next_instruction()
+        self.assertEqual(cpu.run().steps, len(states))
+        self.assertEqual(history.step, len(states))
+        self.assertEqual(cpu.execution_mode, COMPILED_MODE)
+        self.assertEqual(cpu.step_back(30), 30)
+        assert_state(len(states) - 30)
+        self.assertEqual(cpu.goto_step(history.earliest_step), history.earliest_step)
+        assert_state(history.earliest_step)
+
+        # The program gets the same input going forward again
+        cpu = CPU("cisc", "neumann", "special", Assembler("cisc", "in [%R01], $1\nout $1, [%R01]\nhalt\n").object_file())
+        history = cpu.start_history()
+        cpu.run()
+        cpu.input_finish(bin(ord("x"))[2:])
+        cpu.run()
+        self.assertEqual((history.step, cpu.data_memory.read_byte(1)), (2, ord("x")))
+        self.assertEqual(cpu.step_back(5), 2)
+        self.assertEqual(cpu.data_memory.read_byte(1), 0)
+        self.assertEqual(cpu.goto_step(2), 2)
+        self.assertEqual(cpu.run().output.strip(), "x")
+
+        # Nothing is recorded anymore
+        cpu.stop_history()
+        cpu.reset()
+        self.assertEqual(cpu.run().halt_reason, "input")
+        self.assertEqual(history.step, 2)
+
+    def test_registers(self):
+        """ Tests that the integer state of the registers is consistent with their bitarray views """
+        cpu = CPU("risc3", "neumann", "special", self.risc3_alphabet)
+        register = cpu.registers['R00']
+
+        register.write_data('101')
+        self.assertEqual(register.value, 5)
+        register.write_data(bitarray('1' * 16))
+        self.assertEqual(register.value, 0xffff)
+        register.value = 0x12345
+        self.assertEqual(ba2hex(register._state), '2345')
+
+        # Changing the view in place should be seen by the integer state of the register
+        register._state[0] = 1
+        self.assertEqual(register.value, 0xa345)
+        register._state = bitarray('0' * 16)
+        self.assertEqual(register.value, 0)
+
+    def test_decode_cache(self):
+        """ Tests that self-modifying writes into the program memory invalidate the decoded instructions """
+        cpu = CPU("risc3", "neumann", "special", self.risc3_alphabet)
+        for _ in range(10):
+            cpu.web_next_instruction()
+        self.assertEqual(str(cpu.ports_dictionary["1"]), "                   A")
+        self.assertEqual(len(cpu.decode_cache), 8)
+
+        # Overwriting the 'out' instruction of the loop with 'nop', so nothing is printed anymore
+        cpu.program_memory.write_data((512 + 10) * 8, bitarray('1000110000000000'))
+        self.assertEqual(len(cpu.decode_cache), 7)
+
+        # Writes outside of the program do not affect the decoded instructions
+        cpu.data_memory.write_data(0, bitarray('1' * 16))
+        self.assertEqual(len(cpu.decode_cache), 7)
+
+        for _ in range(100):
+            cpu.web_next_instruction()
+        self.assertEqual(str(cpu.ports_dictionary["1"]), "                   A")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+import os
+import tempfile
+import unittest
+
+from modules.processor import CPU
+from modules.assembler import Assembler
+from website.sessions import SessionStore
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        """ Creates the directory for the saved sessions """
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = self.temporary_directory.name
+        self.program = Assembler("cisc", "mov %R00, $5\nmov %R01, $7\nhalt\n").binary_code
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def saved_files(self):
+        """ Lists the files in the directory of the saved sessions """
+        return sorted(os.listdir(self.directory))
+
+    def test_eviction(self):
+        """ Tests letting go of the least recently used sessions """
+        store = SessionStore(max_sessions=2)
+        store["a"], store["b"] = {"code": "a"}, {"code": "b"}
+        self.assertEqual(store["a"]["code"], "a")
+        store["c"] = {"code": "c"}
+
+        # 'b' was used least recently, and without the directory it is forgotten
+        self.assertEqual(len(store), 2)
+        self.assertNotIn("b", store)
+        self.assertIsNone(store.get("b"))
+        with self.assertRaises(KeyError):
+            store["b"]
+        self.assertEqual((store["a"]["code"], store["c"]["code"]), ("a", "c"))
+
+    def test_expiry(self):
+        """ Tests letting go of the sessions nobody used for too long, and deleting the saved ones """
+        store = SessionStore(idle_timeout=0, directory=self.directory, spill_timeout=3600)
+        store["a"] = {"code": "a"}
+        store.expire()
+        self.assertEqual((len(store), len(self.saved_files())), (0, 1))
+
+        # Nobody came back to the saved session either
+        store.spill_timeout = 0
+        store.expire()
+        self.assertEqual(self.saved_files(), [])
+        self.assertNotIn("a", store)
+
+    def test_spill(self):
+        """ Tests saving the sessions let go of, and resuming them with the CPU restored from its snapshot """
+        store = SessionStore(max_sessions=1, directory=self.directory)
+        cpu = CPU("cisc", "neumann", "special", self.program)
+        cpu.run(max_steps=2)
+        store["a"] = {"cpu": cpu, "code": "mov", "memory-cpu": "memory"}
+        store["b"] = {"code": "b"}
+        self.assertEqual((len(store), len(self.saved_files())), (1, 1))
+
+        # Coming back to it brings it into memory, letting go of the other one
+        session = store["a"]
+        self.assertEqual(session["code"], "mov")
+        self.assertNotIn("memory-cpu", session)
+        self.assertIsInstance(session["cpu"], CPU)
+        self.assertEqual((session["cpu"].registers["R00"].value, session["cpu"].registers["R01"].value), (5, 7))
+        self.assertEqual(session["cpu"].run().halt_reason, "halt")
+        self.assertEqual(len(self.saved_files()), 1)
+        self.assertEqual(store["b"]["code"], "b")
+
+        # Damaged sessions are started anew
+        for name in self.saved_files():
+            with open(os.path.join(self.directory, name), "wb") as file:
+                file.write(b"damaged")
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(self.saved_files(), [])
+
+    def test_delete(self):
+        """ Tests deleting the sessions, in memory and saved """
+        store = SessionStore(max_sessions=1, directory=self.directory)
+        store["a"], store["b"] = {"code": "a"}, {"code": "b"}
+        del store["a"]
+        self.assertEqual(self.saved_files(), [])
+        self.assertNotIn("a", store)
+        del store["b"]
+        self.assertEqual(len(store), 0)
+        with self.assertRaises(KeyError):
+            del store["b"]
+
+
+if __name__ == '__main__':
+    unittest.main()
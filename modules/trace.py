@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Tracing of the program execution in the CPU
+#
+# Trace levels:
+# TRACE_OFF - nothing is recorded, and the CPU does not spend any time on it
+# TRACE_SUMMARY - one TraceRecord per executed instruction is passed to the trace sink
+# TRACE_FULL - the records are passed to the sink (if there is one), and the details of the fetching,
+#   decoding and executing of every instruction are logged with the 'processor' logger
+#
+# A trace sink is any callable taking a TraceRecord, e.g. list.append or a TraceBuffer,
+# which keeps only the last records in a fixed amount of memory
+
+import struct
+from collections import namedtuple
+
+TRACE_OFF = 0
+TRACE_SUMMARY = 1
+TRACE_FULL = 2
+
+
+class TraceRecord(namedtuple("TraceRecord", ["step", "ip", "opcode", "registers"])):
+    """
+    Record of one executed instruction
+    step - number of the instruction executed since the tracing started, ip - value of the Instruction Pointer
+    before the execution, opcode - int value of the opcode, registers - tuple of the values of the registers after it
+    """
+    __slots__ = ()
+
+
+class TraceBuffer:
+    """
+    Ring buffer of the last trace records, stored packed in a bytearray of a fixed size
+    """
+
+    def __init__(self, capacity):
+        """
+        Creates a new trace buffer
+        :param capacity: int - the number of the last records to keep
+        :return: NoneType
+        """
+        if capacity <= 0:
+            raise ValueError("Trace buffer capacity should be positive")
+        self.capacity = capacity
+        self.count = 0
+
+        # The layout of the records depends on the number of registers, so it is known with the first record
+        self.record_struct = None
+        self.data = None
+
+    def __call__(self, record):
+        """
+        Adds the record to the buffer, overwriting the oldest one if the buffer is full
+        :param record: TraceRecord
+        """
+        if self.record_struct is None:
+            self.record_struct = struct.Struct(f"<IHH{len(record.registers)}H")
+            self.data = bytearray(self.record_struct.size * self.capacity)
+
+        offset = (self.count % self.capacity) * self.record_struct.size
+        self.record_struct.pack_into(self.data, offset, record.step & 0xFFFFFFFF, record.ip, record.opcode,
+                                     *record.registers)
+        self.count += 1
+
+    def records(self):
+        """
+        Unpacks the records kept in the buffer
+        :return: list of TraceRecord, from the oldest to the newest
+        """
+        records = []
+        for index in range(max(self.count - self.capacity, 0), self.count):
+            step, ip, opcode, *registers = self.record_struct.unpack_from(
+                self.data, (index % self.capacity) * self.record_struct.size)
+            records.append(TraceRecord(step, ip, opcode, tuple(registers)))
+        return records
+
+    def __len__(self):
+        return min(self.count, self.capacity)
@@ -10,9 +10,9 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 from bitarray.util import ba2hex, hex2ba, int2ba, ba2int
 from bitarray import bitarray
-from copy import deepcopy
 import uuid
 import dash_table
 from flask import Flask, render_template, make_response, session
@@ -22,19 +22,31 @@ import time
 
 # Imports from the project
 from modules.processor import CPU
-from modules.assembler import Assembler, AssemblerError
+from modules.assembler import AssemblerError, assembler_cache
+from modules.isa import ISA_TABLES
 from website.color_palette_and_layout import table_header, table, button, assembly, background_color, title_color, \
     text_color, not_working, style_header, style_cell, tab_style, tab_selected_style, \
     dropdown_style1, dropdown_style2, table_main_color, table_main_font_color, table_header_color, help_color, \
     help_font_color, style_memory_header, memory_font, memory_tab_style, memory_selected_tab_style, \
     memory_selected_tab_style2
 from website.example_programs import examples
+from website.sessions import SessionStore, MAX_SESSIONS, SESSION_TIMEOUT
 
-# CPU DICTIONARY ( key=user.id, value=dict(cpu, intervals) )
-user_dict = dict()
+# Directory to save the sessions the server lets go of to, so that the users can come back to them later
+# (None - the sessions are forgotten)
+sessions_directory = None
+# CPU DICTIONARY ( key=user.id, value=dict(cpu, intervals) ), keeps only the sessions used recently in memory
+user_dict = SessionStore(max_sessions=MAX_SESSIONS, idle_timeout=SESSION_TIMEOUT, directory=sessions_directory)
 # Numbers of buttons (used to change type of isa during cpu creation, are same for every session and user)
 buttons = {0: 'risc1', 1: 'risc2', 2: 'risc3', 3: 'cisc'}
 isas = {'risc1': 0, 'risc2': 1, 'risc3': 2, 'cisc': 3}
+# Maximum number of instructions executed by one 'run to end' click, so that an endless loop can't hold the server
+run_steps_limit = 100000
+# Instructions the 'step back' button goes back over one by one, and the checkpoints to go back further from,
+# they bound the memory the history of every session takes
+history_size = 1000
+history_checkpoint_interval = 1000
+history_checkpoints = 10
 # Empty memoty cells
 base_headers = ['Addr   :  ', '00 01 02 03', '04 05 06 07', '08 09 0a 0b', '0c 0d 0e 0f', '10 11 12 13', '14 15 16 17',
                 '18 19 1a 1b', '1c 1d 1e 1f']
@@ -285,6 +297,21 @@ app.layout = html.Div([
                                              style_cell=style_cell,
                                              editable=True),
 
+                    ],
+                        style={'display': 'inline-block', 'margin-right': 10}),
+
+                    # Settings of the 'run to end' button: number of steps (empty - until halt) and breakpoints
+                    html.Div
+                        ([
+
+                        dash_table.DataTable(id='run-settings',
+                                             columns=([{'id': 'steps', 'name': 'STEPS'},
+                                                       {'id': 'breakpoints', 'name': 'BREAKPOINTS (hex)'}]),
+                                             data=([{'steps': '', 'breakpoints': ''}]),
+                                             style_header=style_header,
+                                             style_cell=style_cell,
+                                             editable=True),
+
                     ],
                         style={'display': 'inline-block'}),
 
@@ -305,6 +332,10 @@ app.layout = html.Div([
                                   style={"color": button['font'], 'font-family': 'custom',
                                          "background-color": button['background'],
                                          'width': 200, 'display': 'inline-block', 'font-size': 13, 'margin-right': 17}),
+                      html.Button('STEP BACK', id='step-back', n_clicks=0,
+                                  style={"color": button['font'], 'font-family': 'custom', 'width': 150,
+                                         "background-color": button['background'], 'display': 'inline-block',
+                                         'font-size': 13, 'margin-right': 17}),
 
                       html.Div(id='run-until-finished-button',
                                children=html.Button('RUN', id='run-until-finished', n_clicks=0,
@@ -312,11 +343,16 @@ app.layout = html.Div([
                                                            "background-color": button['background'],
                                                            'width': 200,
                                                            'font-size': 13}), style={'display': 'inline-block'}),
+                      html.Button('RUN TO END', id='run-to-end', n_clicks=0,
+                                  style={"color": button['font'], 'font-family': 'custom', 'width': 150,
+                                         "background-color": button['background'], 'display': 'inline-block',
+                                         'font-size': 13,
+                                         'margin-left': 17}),
                       html.Button('RESET COMPUTER', id='reset', n_clicks=0,
                                   style={"color": button['font'], 'font-family': 'custom', 'width': 150,
                                          "background-color": button['background'], 'display': 'inline-block',
                                          'font-size': 13,
-                                         'margin-left': 255}),
+                                         'margin-left': 17}),
                       ],
                      style={'display': 'block'}),
 
@@ -360,9 +396,8 @@ app.layout = html.Div([
 
     # Instruction storage
     html.Div(id='instruction-storage', children='0' * 16, style={'display': 'none'}),
-    # Memory storage (in a list, because Harvard architecture has two separate memories)
-    html.Div(id='memory-storage', children=['\n'.join(['\t'.join(['00 00 00 00'] * 32)] * 8), ''],
-             style={'display': 'none'}),
+    # Memory storage (changed cells of both memories, because Harvard architecture has two separate memories)
+    html.Div(id='memory-storage', children={'full': False, 'data': [], 'program': []}, style={'display': 'none'}),
     # Registers storage (first element –– registers, second –– their values )
     html.Div(id='registers-storage',
              children=[' '.join(['SP', 'IP', 'LR', 'FR', 'R00', 'R01', 'R02', 'R03']), ' '.join(['0000'] * 8)],
@@ -398,6 +433,8 @@ app.layout = html.Div([
     html.Div(id='registers-placeholder', style={'display': 'none'}),
     html.Div(id='flags-placeholder', style={'display': 'none'}),
     html.Div(id='memory-placeholder', style={'display': 'none'}),
+    # Cell of the memory table edited by the user
+    html.Div(id='memory-edit', style={'display': 'none'}),
 
 ], id="wrapper", )
 
@@ -422,6 +459,29 @@ def get_id(value):
     return user_id
 
 
+def create_cpu(user_id, isa, architecture, io, binary_program='', ip=512):
+    """
+    Gives the user the cpu with the program loaded. The cpu the user already has is reset and reused,
+    if it is of the same isa, architecture and I/O mode, so nothing has to be created anew.
+
+    :param user_id: id of the session/user
+    :param isa: chosen isa
+    :param architecture: chosen architecture
+    :param io: chosen I/O mode
+    :param binary_program: binary code of the program (text or ObjectFile)
+    :param ip: instruction pointer for cpu creation
+    :return: cpu instance
+    """
+    cpu = user_dict.get(user_id, dict()).get('cpu')
+    if cpu is None or (cpu.isa, cpu.architecture, cpu.io_arch) != (isa, architecture, io):
+        return CPU(isa, architecture, io, binary_program, ip)
+
+    cpu.reset(binary_program, ip)
+    # The whole memory table has to be drawn again
+    user_dict[user_id].pop('memory-cpu', None)
+    return cpu
+
+
 # Save binary and hexadecimal code
 @app.callback([Output('code', 'children'),
                Output('next', 'n_clicks')],
@@ -452,12 +512,15 @@ def assemble(n_clicks, user_id, reset_clicks, info, assembly_code, ip, next_clic
     if not n_clicks and user_id in user_dict:
 
         if reset_clicks > user_dict[user_id]['reset']:
+            cpu = create_cpu(user_id, isa, architecture, io)
             user_dict[user_id] = dict()
-            user_dict[user_id]['cpu'] = CPU(isa, architecture, io, '')
+            user_dict[user_id]['cpu'] = cpu
             user_dict[user_id]['code'] = ''
             user_dict[user_id]['binhex'] = ['', '']
             user_dict[user_id]['flags-changed'] = False
             user_dict[user_id]['intervals'] = 0
+            user_dict[user_id]['run-to-end'] = 0
+            user_dict[user_id]['step-back'] = 0
             user_dict[user_id]['reset'] = reset_clicks
             user_dict[user_id]['reset-code'] = 0
             assembly_code = "input assembly code here"
@@ -493,6 +556,8 @@ def assemble(n_clicks, user_id, reset_clicks, info, assembly_code, ip, next_clic
             user_dict[user_id]['binhex'] = ['', '']
             user_dict[user_id]['flags-changed'] = False
             user_dict[user_id]['intervals'] = 0
+            user_dict[user_id]['run-to-end'] = 0
+            user_dict[user_id]['step-back'] = 0
             user_dict[user_id]['reset'] = reset_clicks
             user_dict[user_id]['reset-code'] = reset_clicks
 
@@ -505,12 +570,15 @@ def assemble(n_clicks, user_id, reset_clicks, info, assembly_code, ip, next_clic
             user_dict[user_id]['example'] = 'none'
 
         elif reset_clicks > user_dict[user_id]['reset']:
+            cpu = create_cpu(user_id, isa, architecture, io)
             user_dict[user_id] = dict()
-            user_dict[user_id]['cpu'] = CPU(isa, architecture, io, '')
+            user_dict[user_id]['cpu'] = cpu
             user_dict[user_id]['code'] = ''
             user_dict[user_id]['binhex'] = ['', '']
             user_dict[user_id]['flags-changed'] = False
             user_dict[user_id]['intervals'] = 0
+            user_dict[user_id]['run-to-end'] = 0
+            user_dict[user_id]['step-back'] = 0
             user_dict[user_id]['reset'] = reset_clicks
             user_dict[user_id]['reset-code'] = 0
             assembly_code = "input assembly code here"
@@ -528,7 +596,7 @@ def assemble(n_clicks, user_id, reset_clicks, info, assembly_code, ip, next_clic
         if not assembly_code or assembly_code in ["input assembly code here", "loading...", '']:
             binary_program = hex_program = ''
             if not user_dict[user_id]['code']:
-                user_dict[user_id]['cpu'] = CPU(isa, architecture, io, binary_program, ip)
+                user_dict[user_id]['cpu'] = create_cpu(user_id, isa, architecture, io, binary_program, ip)
                 user_dict[user_id]['code'] = assembly_code
                 user_dict[user_id]['binhex'] = [binary_program, hex_program]
         else:
@@ -544,14 +612,18 @@ def assemble(n_clicks, user_id, reset_clicks, info, assembly_code, ip, next_clic
                 file.write('\n\n============================================\n\n')
 
             try:
-                binary_program = Assembler(isa, assembly_code).binary_code
-                user_dict[user_id]['cpu'] = CPU(isa, architecture, io, binary_program, ip)
+                # The same programs (like the examples) are assembled by many users, so they are assembled only once
+                program = assembler_cache.assemble(isa, assembly_code)
+                binary_program = program.text()
+
+                # The CPU loads the object file, so the text of the program is not parsed once again
+                user_dict[user_id]['cpu'] = create_cpu(user_id, isa, architecture, io, program, ip)
                 hex_program = '\n'.join(
                     list(map(lambda x: hex(int(x, 2))[2:], [x for x in binary_program.split('\n') if x])))
 
             except AssemblerError as err:
                 binary_program = hex_program = f'{err.args[0]}'
-                user_dict[user_id]['cpu'] = CPU(isa, architecture, io, '', ip)
+                user_dict[user_id]['cpu'] = create_cpu(user_id, isa, architecture, io, '', ip)
             user_dict[user_id]['code'] = assembly_code
             user_dict[user_id]['binhex'] = [binary_program, hex_program]
 
@@ -935,13 +1007,11 @@ def get_io(data, editable, user_id):
 
 
 @app.callback(Output('memory-div', 'children'),
-              [Input('next', 'n_clicks')],
-              [State('info', 'children')])
-def change_memory_tabs(n_clicks, info):
+              [Input('info', 'children')])
+def change_memory_tabs(info):
     """
     Return memory according;y to a chosen architecture.
 
-    :param n_clicks: n_clicks of 'next' button
     :param info: isa, architecture and I/O mode
     """
     arch = info.split()[1]
@@ -964,105 +1034,98 @@ def change_memory_tabs(n_clicks, info):
               [Input('memory-tabs', 'value'),
                Input('memory-storage', 'children')],
               [State('id-storage', 'children')])
-def create_memory(tab, value, user_id):
+def create_memory(tab, changes, user_id):
     """
     Create a table with memory of the cpu.
+    Only happens when the tab is chosen or the cpu is replaced,
+    the rest of the changes are applied to the table in the browser.
 
     :param tab: chosen tab
-    :param value: current memory in the div
+    :param changes: changes of the memory (see update_memory)
     :param user_id: id of the session/user
     :return: dash table
     """
-    if tab == 'data_memory':
-        headers = ["Addr   :  "]
-        for i in range(0, 32, 4):
-            headers.append(f"{hex(i)[2:].rjust(2, '0')} {hex(i + 1)[2:].rjust(2, '0')} "
-                           f"{hex(i + 2)[2:].rjust(2, '0')} {hex(i + 3)[2:].rjust(2, '0')}")
-
-        rows = []
-        for i in range(0, 1024, 32):
-            rows.append(hex(i)[2:].rjust(8, "0"))
-
-        temp_lst1 = value[0].split('\n')
-        memory_data = []
-        for i in temp_lst1:
-            memory_data.append(i.split('\t'))
-
-        rows = [rows] + memory_data
-
-        data_lst = []
-        for y in range(len(rows[0])):
-            data_lst.append([])
-            for x in range(len(rows)):
-                data_lst[y].append(rows[x][y])
-
-        # Create a list of dictionaries (key -- column name)
-        data = []
-        for x in range(len(rows[0])):
-            data.append(dict())
-            for y in range(len(rows)):
-                data[x][headers[y]] = data_lst[x][y]
-        if user_id in user_dict:
-            user_dict[user_id]['completed-changes'][4] = '1'
-        return dash_table.DataTable(id='mem', columns=([{'id': i, 'name': i} for i in headers]),
-                                    data=data,
-                                    style_header=style_memory_header,
-                                    style_cell=style_cell,
-                                    style_cell_conditional=[
-                                        {
-                                            'if': {'column_id': headers[0]},
-                                            'color': memory_font
-                                        }
-                                    ],
-                                    fixed_rows={'headers': True},
-                                    style_table={'height': '300px', 'overflowY': 'auto'},
-                                    editable=True
-                                    )
-    else:
-        headers = ["Addr   :  "]
-        for i in range(0, 32, 4):
-            headers.append(f"{hex(i)[2:].rjust(2, '0')} {hex(i + 1)[2:].rjust(2, '0')} "
-                           f"{hex(i + 2)[2:].rjust(2, '0')} {hex(i + 3)[2:].rjust(2, '0')}")
-
-        rows = []
-        for i in range(0, 1024, 32):
-            rows.append(hex(i)[2:].rjust(8, "0"))
-
-        temp_lst1 = value[1].split('\n')
-        memory_data = []
-        for i in temp_lst1:
-            memory_data.append(i.split('\t'))
-
-        rows = [rows] + memory_data
-
-        data_lst = []
-        for y in range(len(rows[0])):
-            data_lst.append([])
-            for x in range(len(rows)):
-                data_lst[y].append(rows[x][y])
-
-        # Create a list of dictionaries (key -- column name)
-        data = []
-        for x in range(len(rows[0])):
-            data.append(dict())
-            for y in range(len(rows)):
-                data[x][headers[y]] = data_lst[x][y]
-        if user_id in user_dict:
-            user_dict[user_id]['completed-changes'][4] = '1'
-        return dash_table.DataTable(id='mem', columns=([{'id': i, 'name': i} for i in headers]),
-                                    data=data,
-                                    style_header=style_memory_header,
-                                    style_cell=style_cell,
-                                    style_cell_conditional=[
-                                        {
-                                            'if': {'column_id': headers[0]},
-                                            'color': memory_font
-                                        }
-                                    ],
-                                    fixed_rows={'headers': True},
-                                    style_table={'height': '300px', 'overflowY': 'auto'},
-                                    editable=True
-                                    )
+    if user_id not in user_dict:
+        return empty_memory
+    if dash.callback_context.triggered[0]['prop_id'] == 'memory-storage.children' and not changes['full']:
+        raise PreventUpdate
+
+    cpu = user_dict[user_id]['cpu']
+    memory = cpu.data_memory if tab == 'data_memory' else cpu.program_memory
+    return dash_table.DataTable(id='mem', columns=([{'id': i, 'name': i} for i in base_headers]),
+                                data=memory_table_data(memory),
+                                style_header=style_memory_header,
+                                style_cell=style_cell,
+                                style_cell_conditional=[
+                                    {
+                                        'if': {'column_id': base_headers[0]},
+                                        'color': memory_font
+                                    }
+                                ],
+                                fixed_rows={'headers': True},
+                                style_table={'height': '300px', 'overflowY': 'auto'},
+                                editable=True
+                                )
+
+
+def memory_table_data(memory):
+    """
+    Helper function, turns the memory into the rows of the memory table.
+    (each row holds 32 bytes, each cell -- 4 of them)
+
+    :param memory: memory of the cpu
+    :return: list of dictionaries (key -- column name)
+    """
+    data = []
+    for address in range(0, memory.size, 32):
+        row = {base_headers[0]: hex(address)[2:].rjust(8, "0")}
+        for cell in range(8):
+            row[base_headers[cell + 1]] = memory.view(address + 4 * cell, address + 4 * cell + 4).hex(' ')
+        data.append(row)
+    return data
+
+
+def memory_table_cells(memory, ranges):
+    """
+    Helper function, finds the cells of the memory table in the changed ranges of the memory.
+
+    :param memory: memory of the cpu
+    :param ranges: list of changed byte ranges (start, end)
+    :return: list of cells [row, column name, new value]
+    """
+    cells = []
+    for start, end in ranges:
+        for cell in range(start // 4, (min(end, memory.size) + 3) // 4):
+            cells.append([cell // 8, base_headers[cell % 8 + 1], memory.view(4 * cell, 4 * cell + 4).hex(' ')])
+    return cells
+
+
+# Apply changes of the memory to the table in the browser, without sending the whole table
+app.clientside_callback(
+    """
+    function(changes, tab, data) {
+        if (!data || changes.full) {
+            return window.dash_clientside.no_update;
+        }
+        var cells = tab === 'data_memory' ? changes.data : changes.program;
+        if (!cells.length) {
+            return window.dash_clientside.no_update;
+        }
+        var new_data = data.slice();
+        cells.forEach(function(cell) {
+            if (cell[0] < new_data.length) {
+                new_data[cell[0]] = Object.assign({}, new_data[cell[0]]);
+                new_data[cell[0]][cell[1]] = cell[2];
+            }
+        });
+        return new_data;
+    }
+    """,
+    Output('mem', 'data'),
+    [Input('memory-storage', 'children')],
+    [State('memory-tabs', 'value'),
+     State('mem', 'data')]
+)
 
 
 # UPDATE HIDDEN INFO FOR PROCESSOR
@@ -1070,23 +1133,53 @@ def create_memory(tab, value, user_id):
               [Input('next', 'n_clicks'),
                Input('id-storage', 'children'),
                Input('interval', 'n_intervals'),
-               Input('reset', 'n_clicks')],
-              [State('next-storage', 'children')])
-def update_next(n_clicks, user_id, interval, reset, current_situation):
+               Input('reset', 'n_clicks'),
+               Input('run-to-end', 'n_clicks'),
+               Input('step-back', 'n_clicks')],
+              [State('next-storage', 'children'),
+               State('run-settings', 'data')])
+def update_next(n_clicks, user_id, interval, reset, run_clicks, back_clicks, current_situation, run_settings):
     """
     Return n_clicks for the 'next instruction' button,
     so it changes hidden div, on which graphic elements of
     the processor will react.
     Executes next instruction in the cpu if page was completly reloaded after previous execution.
+    On the 'run to end' button executes the program in one go, so that only the final state is displayed.
+    On the 'step back' button goes back to the state before the previous instruction.
 
     :param n_clicks: n_clicks for the 'next instruction' button
     :param user_id: id of the session/user
     :param interval: intervals (in case of pressing 'run' button)
     :param reset:  n_clicks of 'reset' button
+    :param run_clicks: n_clicks of 'run to end' button
+    :param back_clicks: n_clicks of 'step back' button
     :param current_situation: current children of next storage
+    :param run_settings: data from the table with settings of the 'run to end' button
     :return: same n_clicks/interval
     """
     if user_id in user_dict:
+        # The cpu records the executed instructions to step back over them (the resumed sessions start anew)
+        if user_dict[user_id]['cpu'].history is None:
+            user_dict[user_id]['cpu'].start_history(history_size, history_checkpoint_interval, history_checkpoints)
+
+        if back_clicks > user_dict[user_id]['step-back']:
+            user_dict[user_id]['step-back'] = back_clicks
+            if user_dict[user_id]['cpu'].step_back():
+                user_dict[user_id]['completed-changes'] = ['0', '0', '0', '0', '0']
+                user_dict[user_id]['manual-changes'] = ['0', '0', '0']
+            return f"back {back_clicks}"
+
+        if run_clicks > user_dict[user_id]['run-to-end']:
+            user_dict[user_id]['run-to-end'] = run_clicks
+            max_steps, breakpoints = read_run_settings(run_settings)
+
+            # Runs without the interface until halt, input, breakpoint or the limit of steps
+            result = user_dict[user_id]['cpu'].run(max_steps=max_steps, breakpoints=breakpoints)
+            if result.steps:
+                user_dict[user_id]['completed-changes'] = ['0', '0', '0', '0', '0']
+                user_dict[user_id]['manual-changes'] = ['0', '0', '0']
+            return f"run {run_clicks}"
+
         if not user_dict[user_id]['cpu'].is_input_active:
 
             if (interval > 0 and user_dict[user_id]['completed-changes'] == ['1', '1', '1', '1', '1']) or interval == 1:
@@ -1109,6 +1202,29 @@ def update_next(n_clicks, user_id, interval, reset, current_situation):
         return current_situation
 
 
+def read_run_settings(data):
+    """
+    Read users settings for the 'run to end' button.
+    Steps are limited by run_steps_limit, breakpoints are hexadecimal addresses
+    separated by commas or spaces, the ones which can't be read are ignored.
+
+    :param data: data from the table
+    :return: number of steps, list of breakpoints
+    """
+    try:
+        max_steps = min(max(int(data[0]['steps']), 0), run_steps_limit)
+    except (ValueError, TypeError):
+        max_steps = run_steps_limit
+
+    breakpoints = []
+    for address in str(data[0]['breakpoints'] or '').replace(',', ' ').split():
+        try:
+            breakpoints.append(int(address, 16))
+        except ValueError:
+            continue
+    return max_steps, breakpoints
+
+
 # Work with intervals
 @app.callback(
     Output("interval", "disabled"),
@@ -1134,10 +1250,8 @@ def run_interval(n, user_id, instruction, current_state):
         user_dict[user_id]['intervals'] = 0
     elif user_id in user_dict:
         if instruction == '0' * len(instruction):
-            copied_cpu = deepcopy(user_dict[user_id]['cpu'])
-            copied_cpu.web_next_instruction()
             user_dict[user_id]['intervals'] = n
-            if copied_cpu.instruction.to01() == instruction:
+            if user_dict[user_id]['cpu'].peek_next().to01() == instruction:
                 return True
             else:
                 return not current_state
@@ -1301,7 +1415,7 @@ def update_registers(value_not_used, user_id, ip_changes, reset, if_input, info,
     if user_id in user_dict:
         user_dict[user_id]['next-registers'] = n_clicks
 
-        items = [(value.name, value._state.tobytes().hex()) for key, value in
+        items = [(value.name, f"{value.value:04x}") for key, value in
                  user_dict[user_id]['cpu'].registers.items()]
         values = []
         for i in range(len(items)):
@@ -1367,41 +1481,35 @@ def update_output(value, user_id, reset):
 def update_memory(value, user_id, reset, n_clicks):
     """
     Reacts on changes in the memory div.
+    Sends only the cells of the memory tables written since the previous update,
+    or asks to create the tables anew, if the cpu was replaced.
 
     :param value: is not used (is here by default)
     :param user_id: id of the session/user
     :param reset: n_clicks of 'reset' button
     :param n_clicks: n_clicks of 'next' button
-    :return: list with data and program memories
+    :return: dictionary with changed cells of data and program memories
     """
     if user_id in user_dict:
         user_dict[user_id]['next-memory'] = n_clicks
-        memory_data = [[], [], [], [], [], [], [], []]
-        for i in range(0, len(user_dict[user_id]['cpu'].data_memory.slots), 32 * 8):
-            string = ba2hex(user_dict[user_id]['cpu'].data_memory.slots[i:i + 32 * 8])
-            for x in range(8):
-                memory_data[x].append(" ".join([string[8 * x:8 * x + 8][y:y + 2] for y in range(0, 8, 2)]))
-        lst = []
-        for i in memory_data:
-            lst.append('\t'.join(i))
-        if user_dict[user_id]['cpu'].architecture in ["neumann", "harvardm"]:
-
-            return ['\n'.join(lst), '']
-        else:
-            memory_program = [[], [], [], [], [], [], [], []]
-            for i in range(0, len(user_dict[user_id]['cpu'].program_memory.slots), 32 * 8):
-                string = ba2hex(user_dict[user_id]['cpu'].program_memory.slots[i:i + 32 * 8])
-                for x in range(8):
-                    memory_program[x].append(" ".join([string[8 * x:8 * x + 8][y:y + 2] for y in range(0, 8, 2)]))
-            lst_program = []
-            for i in memory_program:
-                lst_program.append('\t'.join(i))
+        cpu = user_dict[user_id]['cpu']
+        changes = cpu.take_memory_changes()
+
+        # Memory is shown through the table in the browser, so its manual changes and drawing are completed here
+        user_dict[user_id]['completed-changes'][4] = '1'
+        user_dict[user_id]['manual-changes'][2] = '1'
 
-            return ['\n'.join(lst), '\n'.join(lst_program)]
+        if user_dict[user_id].get('memory-cpu') is not cpu:
+            user_dict[user_id]['memory-cpu'] = cpu
+            return {'full': True, 'data': [], 'program': []}
 
-    lst1 = '\t'.join(['00 00 00 00'] * 32)
-    lst2 = '\n'.join([lst1] * 8)
-    return [lst2, '']
+        data_cells = memory_table_cells(cpu.data_memory, changes['data'])
+        if cpu.program_memory is cpu.data_memory:
+            return {'full': False, 'data': data_cells, 'program': data_cells}
+        return {'full': False, 'data': data_cells,
+                'program': memory_table_cells(cpu.program_memory, changes['program'])}
+
+    return {'full': False, 'data': [], 'program': []}
 
 
 # Update reset-storage
@@ -1508,7 +1616,7 @@ def manually_change_registers(data, user_id, n_clicks):
                 time.time() - user_dict[user_id]['time']) > 3:
             user_dict[user_id]['time'] = time.time()
 
-            items = [(value.name, value._state.tobytes().hex()) for key, value in
+            items = [(value.name, f"{value.value:04x}") for key, value in
                      user_dict[user_id]['cpu'].registers.items()]
             cpu_registers = []
             for i in range(len(items)):
@@ -1525,55 +1633,66 @@ def manually_change_registers(data, user_id, n_clicks):
 
                 if user_dict[user_id]['flags-changed']:
                     user_dict[user_id]['flags-changed'] = False
-                    new_reg_dict['FR:'] = ba2hex(user_dict[user_id]['cpu'].registers['FR']._state)
+                    new_reg_dict['FR:'] = f"{user_dict[user_id]['cpu'].registers['FR'].value:04x}"
 
                 for key, value in new_reg_dict.items():
-                    user_dict[user_id]['cpu'].registers[key[:-1]]._state = bitarray(hex2ba(value).to01().rjust(16, '0'))
+                    user_dict[user_id]['cpu'].registers[key[:-1]].write_data(hex2ba(value))
+
+                # The user could have moved the IP, so the jumps have to be counted from the new instruction
+                user_dict[user_id]['cpu'].sync_program_pointer()
         user_dict[user_id]['time'] = time.time()
         user_dict[user_id]['manual-changes'][1] = '1'
     return 0
 
 
+# Find the cell of the memory table edited by the user, so that the whole table is not sent to the server
+app.clientside_callback(
+    """
+    function(timestamp, active_cell, data, tab) {
+        if (!timestamp || !active_cell || !data) {
+            return window.dash_clientside.no_update;
+        }
+        return [tab, active_cell.row, active_cell.column_id, data[active_cell.row][active_cell.column_id]];
+    }
+    """,
+    Output('memory-edit', 'children'),
+    [Input('mem', 'data_timestamp')],
+    [State('mem', 'active_cell'),
+     State('mem', 'data'),
+     State('memory-tabs', 'value')]
+)
+
+
 @app.callback(Output('memory-placeholder', 'children'),
-              [Input('mem', 'data')],
-              [State('id-storage', 'children'),
-               State('next', 'n_clicks'),
-               State('memory-tabs', 'value')])
-def manually_change_memory(data, user_id, n_clicks, chosen_tab):
+              [Input('memory-edit', 'children')],
+              [State('id-storage', 'children')])
+def manually_change_memory(edit, user_id):
     """
-    Applies manual changes in the memory to the cpu (or skips, if there were no changes),
+    Applies manual changes in the memory to the cpu,
     if page was completely loaded and user could have already made that changes.
-    (checks time for that situation)
+    (the table only reports the cells edited by the user)
 
-    :param data: data from the memory table
+    :param edit: chosen tab, row, column and new value of the edited cell
     :param user_id: id of the session/user
-    :param n_clicks: n_clicks of 'next' button
-    :param chosen_tab: determines, with which memory we work (data/program/both)
     :return: does not matter, updates placeholder
     """
-    if user_id in user_dict:
-        if user_dict[user_id]['completed-changes'] == ['1', '1', '1', '1', '1'] and (
-                time.time() - user_dict[user_id]['time']) > 3:
-            user_dict[user_id]['time'] = time.time()
-
-            # Callback was provoked, but 'next' ('run') button was not pressed...
-            if n_clicks == user_dict[user_id]['next-memory']:
+    if user_id in user_dict and edit:
+        chosen_tab, row, column, value = edit
+        if user_dict[user_id]['completed-changes'] == ['1', '1', '1', '1', '1'] and column in base_headers[1:]:
+            cpu = user_dict[user_id]['cpu']
+            memory = cpu.data_memory if chosen_tab == 'data_memory' else cpu.program_memory
+            address = row * 32 + (base_headers.index(column) - 1) * 4
 
-                new_data = bitarray('')
-                try:
-                    for dictionary in data:
-                        for key in dictionary:
-                            if key != 'Addr   :  ':
-                                new_data += hex2ba(dictionary[key].replace(" ", "").rjust(8, '0'))
-                except ValueError:
-                    new_data = user_dict[user_id]['cpu'].data_memory.slots
-
-                if chosen_tab == 'data_memory':
-                    if new_data != user_dict[user_id]['cpu'].data_memory.slots:
-                        user_dict[user_id]['cpu'].data_memory.slots = new_data
-                else:
-                    if new_data != user_dict[user_id]['cpu'].program_memory.slots:
-                        user_dict[user_id]['cpu'].program_memory.slots = new_data
+            try:
+                new_value = bytes.fromhex(value.replace(" ", "").rjust(8, '0'))
+            except (ValueError, AttributeError):
+                new_value = b''
+            # Wrong values are replaced with the actual contents of the memory on the next update
+            if len(new_value) != 4:
+                new_value = memory.read_bytes(address, address + 4)
+
+            # Writing through the memory, so that the cpu would know about the changes (e.g. in the program)
+            memory.write_bytes(address, new_value)
         user_dict[user_id]['time'] = time.time()
         user_dict[user_id]['manual-changes'][2] = '1'
     return 0
@@ -1601,8 +1720,7 @@ def help(isa):
     """
     with open("docs/help.json", "r") as file:
         help_dict = json.load(file)[isa]
-    with open("modules/registers.json", "r") as file:
-        register_dict = json.load(file)[isa]
+    register_dict = ISA_TABLES[isa].registers
 
     p_style = "color: #FFFFFF; padding-left: 12%; width: 75%"
     return render_template('help.html', items=help_dict, p_style=p_style, reg_dict=register_dict)
@@ -1,6 +1,7 @@
 import flask
 import json
 from website.app import app as dash_app
+from modules.isa import ISA_TABLES
 
 server = flask.Flask(__name__)
 
@@ -14,8 +15,7 @@ def index():
 def dash_help():
     with open("docs/help.json", "r") as file:
         help_dict = json.load(file)
-    with open("modules/registers.json", "r") as file:
-        register_dict = json.load(file)["risc3"]
+    register_dict = ISA_TABLES["risc3"].registers
 
     p_style = "color: #FFFFFF; padding-left: 12%; width: 75%"
     return flask.render_template('help.html', items=help_dict, p_style=p_style, reg_dict=register_dict)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Assembly Simulator project 2020
+# GNU General Public License v3.0
+
+# Sessions of the website users: the CPU, the code and the state of the interface of every user
+#
+# The server keeps only a limited number of sessions in memory:
+#   * sessions nobody used for idle_timeout seconds are let go of
+#   * if there are more than max_sessions sessions, the ones used least recently are let go of
+# If the store has a directory, the sessions let go of are saved there (pickled, with the CPU saved as its snapshot -
+# see CPU.snapshot) instead of being forgotten, and are brought back when the user returns, unless they were not
+# used for spill_timeout seconds
+#
+# The store is shared by the callbacks of all the users, so it only holds its lock to change the dictionaries:
+# the sessions let go of are written into the directory after it is released (and taken back from the ones
+# being written, if the user returns meanwhile)
+
+import os
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, deque
+
+from modules.processor import CPU, SimulatorError
+from modules.snapshot import is_snapshot, SnapshotError
+
+# Number of the sessions kept in memory
+MAX_SESSIONS = 500
+
+# Seconds after which the unused sessions are let go of, and after which the saved ones are deleted
+SESSION_TIMEOUT = 2 * 60 * 60
+SPILL_TIMEOUT = 7 * 24 * 60 * 60
+
+# Seconds between the checks for the unused sessions
+EXPIRE_INTERVAL = 60
+
+
+class SessionStore:
+    """
+    Sessions of the users by their ids, used like a dictionary
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_TIMEOUT, directory=None,
+                 spill_timeout=SPILL_TIMEOUT):
+        """
+        Creates a new session store
+        :param max_sessions: int - the number of the sessions to keep in memory
+        :param idle_timeout: float - seconds after which the unused sessions are let go of
+        :param directory: str - directory to save the sessions let go of to, or None to forget them
+        :param spill_timeout: float - seconds after which the saved sessions are deleted
+        :return: NoneType
+        """
+        if max_sessions <= 0:
+            raise ValueError("Maximum number of the sessions should be positive")
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.spill_timeout = spill_timeout
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        # Sessions with the time they were last used, from the least to the most recently used
+        self.sessions = OrderedDict()
+        self.last_expired = time.monotonic()
+
+        # Sessions let go of which are not written into the directory yet: (session, the session to save)
+        # by the ids of their users, and the order to write them in
+        self.spilling = dict()
+        self.spill_queue = deque()
+
+        # Callbacks of the different users are run in different threads
+        self.lock = threading.RLock()
+
+    def __contains__(self, user_id):
+        return self.__find(user_id) is not None
+
+    def __getitem__(self, user_id):
+        if (session := self.__find(user_id)) is None:
+            raise KeyError(user_id)
+        return session
+
+    def get(self, user_id, default=None):
+        if (session := self.__find(user_id)) is None:
+            return default
+        return session
+
+    def __setitem__(self, user_id, session):
+        with self.lock:
+            self.__store(user_id, session)
+        self.__write_spilled()
+
+    def __delitem__(self, user_id):
+        with self.lock:
+            deleted = self.sessions.pop(user_id, None) is not None
+            deleted = self.spilling.pop(user_id, None) is not None or deleted
+            if self.directory is not None and isinstance(user_id, str):
+                try:
+                    os.remove(self.__path(user_id))
+                    deleted = True
+                except FileNotFoundError:
+                    pass
+            if not deleted:
+                raise KeyError(user_id)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __find(self, user_id):
+        """
+        Finds the session of the user, in memory or in the directory, and marks it as just used
+        :param user_id: str - id of the user
+        :return: dict - the session, or None if there is none
+        """
+        if time.monotonic() - self.last_expired >= EXPIRE_INTERVAL:
+            self.expire()
+
+        with self.lock:
+            if (entry := self.sessions.get(user_id)) is not None:
+                session = entry[0]
+                self.sessions[user_id] = (session, time.monotonic())
+                self.sessions.move_to_end(user_id)
+            elif (entry := self.spilling.pop(user_id, None)) is not None:
+                session = entry[0]
+                self.__store(user_id, session)
+            elif (session := self.__load(user_id)) is not None:
+                self.__store(user_id, session)
+        self.__write_spilled()
+        return session
+
+    def expire(self):
+        """
+        Lets go of the sessions nobody used for too long, and deletes the saved sessions nobody came back to
+        """
+        with self.lock:
+            now = self.last_expired = time.monotonic()
+            while self.sessions:
+                user_id, (session, last_used) = next(iter(self.sessions.items()))
+                if now - last_used < self.idle_timeout:
+                    break
+                del self.sessions[user_id]
+                self.__spill(user_id, session)
+        self.__write_spilled()
+
+        if self.directory is not None:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".session") and time.time() - entry.stat().st_mtime >= self.spill_timeout:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        # The user came back to it meanwhile
+                        pass
+
+    def __store(self, user_id, session):
+        """
+        Keeps the session in memory as the most recently used one, letting go of the least recently used ones
+        if there are too many of them (the lock has to be held)
+        :param user_id: str - id of the user
+        :param session: dict - the session
+        """
+        self.sessions[user_id] = (session, time.monotonic())
+        self.sessions.move_to_end(user_id)
+        while len(self.sessions) > self.max_sessions:
+            spilled_id, (spilled_session, _) = self.sessions.popitem(last=False)
+            self.__spill(spilled_id, spilled_session)
+
+    def __path(self, user_id):
+        """
+        The file of the saved session, named by the hash of the id, so that any id makes a valid file name
+        :param user_id: str - id of the user
+        :return: str
+        """
+        return os.path.join(self.directory, hashlib.sha256(user_id.encode("utf-8")).hexdigest() + ".session")
+
+    def __spill(self, user_id, session):
+        """
+        Prepares the session let go of to be saved into the directory, if there is one (the lock has to be held,
+        the session is written by __write_spilled after it is released)
+        :param user_id: str - id of the user
+        :param session: dict - the session
+        """
+        if self.directory is None:
+            return
+        saved_session = dict(session)
+
+        # The interface draws the whole memory again for the resumed CPU anyway
+        saved_session.pop('memory-cpu', None)
+        if isinstance(saved_session.get('cpu'), CPU):
+            saved_session['cpu'] = saved_session['cpu'].snapshot()
+
+        self.spilling[user_id] = (session, saved_session)
+        self.spill_queue.append(user_id)
+
+    def __write_spilled(self):
+        """
+        Writes the sessions let go of into the directory, without holding the lock (but the one taken back
+        or deleted meanwhile is not saved)
+        """
+        while True:
+            with self.lock:
+                if not self.spill_queue:
+                    return
+                user_id = self.spill_queue.popleft()
+                if (entry := self.spilling.get(user_id)) is None:
+                    continue
+
+            handle, temporary_path = tempfile.mkstemp(suffix=".part", dir=self.directory)
+            try:
+                with os.fdopen(handle, "wb") as file:
+                    pickle.dump(entry[1], file, protocol=pickle.HIGHEST_PROTOCOL)
+                with self.lock:
+                    if self.spilling.get(user_id) is entry:
+                        os.replace(temporary_path, self.__path(user_id))
+            finally:
+                with self.lock:
+                    if self.spilling.get(user_id) is entry:
+                        del self.spilling[user_id]
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+
+    def __load(self, user_id):
+        """
+        Reads the saved session of the user from the directory and deletes the file, the session is in memory again
+        :param user_id: str - id of the user
+        :return: dict - the session, or None if it was not saved (or can not be read)
+        """
+        if self.directory is None or not isinstance(user_id, str) or not os.path.exists(path := self.__path(user_id)):
+            return None
+        try:
+            with open(path, "rb") as file:
+                session = pickle.load(file)
+            if isinstance(session.get('cpu'), bytes) and is_snapshot(session['cpu']):
+                session['cpu'] = CPU.from_snapshot(session['cpu'])
+        except (pickle.UnpicklingError, EOFError, SnapshotError, SimulatorError, OSError):
+            # The session was saved by another version of the simulator (or damaged), the user starts anew
+            session = None
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Deleted as too old meanwhile
+            pass
+        return session